@@ -0,0 +1,55 @@
+"""
+Batch vs. synchronous page extraction against the local OpenAI stand-in.
+
+Usage: python -m benchmarks.batch_extraction [pages] [latency_seconds]
+"""
+import sys
+import time
+
+import openai
+
+import src.batch as batch
+from benchmarks.fake_openai import start_fake_openai
+from src.llm import extract_structured_data
+
+
+def synthetic_pages(n: int) -> list[dict]:
+    pages = []
+    for i in range(n):
+        if i % 3 == 0:
+            html = "<div>" + "".join(f"<p>Yoga {h}:00 - {h + 1}:00</p>" for h in range(7, 12)) + "</div>"
+        else:
+            html = f"<div><h2>Planes</h2><p>Plan mensual S/ {200 + i}</p><p>Plan anual S/ {1500 + i}</p></div>"
+        pages.append({"gym_name": f"gym{i % 5}", "page_url": f"https://gym{i % 5}.pe/page-{i}", "url_type": "iframe_content",
+                      "html_content": html, "lastmod": None, "freq": None})
+    return pages
+
+
+def main():
+    n_pages = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.2
+    server = start_fake_openai(latency=latency, batch_delay=latency)
+    client = openai.OpenAI(base_url=server.base_url, api_key="fake")
+    batch.BATCH_POLL_INTERVAL = 0.05
+    pages = synthetic_pages(n_pages)
+
+    start = time.perf_counter()
+    sync_results = [extract_structured_data(client, p["page_url"], p["url_type"], p["html_content"], p["gym_name"],
+                                            p["lastmod"], p["freq"]) for p in pages]
+    sync_time = time.perf_counter() - start
+    sync_calls = server.state["requests"]["chat"]
+
+    start = time.perf_counter()
+    batch_results = batch.batch_extract_pages(client, pages)
+    batch_time = time.perf_counter() - start
+
+    assert batch_results == sync_results, "batch and sync extraction differ"
+    print(f"{n_pages} pages, {latency}s simulated latency per call")
+    print(f"sync   {sync_time:7.2f} s  ({sync_calls} chat calls)")
+    print(f"batch  {batch_time:7.2f} s  ({server.state['requests']['batches']} batch jobs, "
+          f"{server.state['requests']['chat'] - sync_calls} chat calls)")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
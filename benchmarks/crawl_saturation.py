@@ -0,0 +1,86 @@
+"""
+Crawl budget and fact saturation: simulated gyms whose categorized URLs repeat the same facts (every
+class page embeds the same schedule widget, every studio page the same price table), crawled in full vs
+with order_gym_urls, CrawlBudget and FactSaturation in the windows crawl_and_extract_gym uses. Reports
+URLs crawled, extraction tokens spent and the share of the unique facts still found. Extraction is
+simulated (nothing is fetched or sent to the model); the policy under test is the real one.
+
+Usage: python -m benchmarks.crawl_saturation [gyms]
+"""
+import logging
+import random
+import sys
+
+from src.budget import CrawlBudget, FactSaturation, SATURATION_WINDOW, order_gym_urls
+from src.db_utils import FACT_TABLES, key_hash
+
+TOKENS_PER_URL = 6_000
+# categoría -> (URLs, tabla de sus hechos, hechos distintos en el sitio, hechos por página)
+CATEGORIES = {
+    "schedules": (24, "horarios", 60, 25),
+    "pricing": (6, "precios", 8, 6),
+    "locations": (18, "ubicaciones", 4, 2),
+    "disciplines": (30, "disciplinas", 12, 3),
+    "homepage": (1, "disciplinas", 12, 6),
+}
+
+
+def fake_gym(n: int, rng: random.Random) -> tuple[dict[str, list[dict]], dict[str, list[dict]]]:
+    """Categorized URLs of a gym and the facts each one yields (by loc)."""
+    categorized, facts_by_loc = {}, {}
+    for category, (n_urls, table, distinct, per_page) in CATEGORIES.items():
+        # Unas pocas páginas (las de más prioridad en el sitemap) tienen casi todo; el resto repite
+        pool = [{"sede": f"sede {n}", "nombre_clase": f"clase {i}", "hora_inicio": f"{i % 14 + 6}:00",
+                 "nombre": f"disciplina {i}", "descripcion_plan": f"plan {i}", "direccion_completa": f"calle {i}"}
+                for i in range(distinct)]
+        urls = []
+        for i in range(n_urls):
+            loc = f"https://gym{n}.example/{category}/{i}"
+            urls.append({"loc": loc, "lastmod": f"2026-{rng.randint(1, 9):02d}-01", "changefreq": "weekly",
+                         "priority": "0.8" if i < 2 else rng.choice(["0.5", "0.4", None])})
+            sample = rng.sample(pool, max(per_page, int(distinct * 0.6)) if i < 2 else min(per_page, distinct))
+            facts_by_loc[loc] = [{table: sample}]
+        rng.shuffle(urls)
+        categorized[category] = urls
+    return categorized, facts_by_loc
+
+
+def crawl(categorized: dict, facts_by_loc: dict, saturation: FactSaturation | None, budget: CrawlBudget | None) -> dict:
+    planned = order_gym_urls(categorized)
+    by_category = {}
+    for category, url in planned:
+        by_category.setdefault(category, []).append((category, url))
+    tracker = saturation or FactSaturation(patience=0)
+    for category, items in by_category.items():
+        position = 0
+        while position < len(items) and not (budget and budget.exhausted):
+            if tracker.saturated(category):
+                tracker.close(category, len(items) - position)
+                break
+            window = items[position:position + (SATURATION_WINDOW if tracker.patience else len(items))]
+            position += len(window)
+            for _, url in window:
+                if budget and not budget.spend():
+                    break
+                tracker.observe(category, facts_by_loc[url["loc"]])
+    return {"urls": tracker.stats["urls"], "facts": len(tracker.seen)}
+
+
+def main():
+    logging.disable(logging.INFO)
+    n_gyms = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    rng = random.Random(7)
+    gyms = [fake_gym(n, rng) for n in range(n_gyms)]
+    all_facts = sum(len({(t, key_hash(t, f)) for facts in by_loc.values() for page in facts for t, fs in page.items()
+                         if t in FACT_TABLES for f in fs}) for _, by_loc in gyms)
+    full = [crawl(c, f, None, None) for c, f in gyms]
+    budgeted = [crawl(c, f, FactSaturation(), CrawlBudget()) for c, f in gyms]
+    print(f"{n_gyms} gyms x {sum(n for n, *_ in CATEGORIES.values())} categorized URLs, {TOKENS_PER_URL:,} tokens per URL")
+    for label, runs in [("full crawl", full), ("budget + saturation", budgeted)]:
+        urls, facts = sum(r["urls"] for r in runs), sum(r["facts"] for r in runs)
+        print(f"{label:>20}: {urls} URLs, {urls * TOKENS_PER_URL / 1e6:.1f}M tokens, "
+              f"{facts}/{all_facts} unique facts ({facts / all_facts:.1%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Benchmark: legacy per-call connection + execute_batch inserts vs. pooled COPY/diff loader.
+Needs the local Postgres from docker-compose (PGHOST, PGUSER, ... as for the scraper).
+
+Usage: python -m benchmarks.db_load [gyms] [schedule_rows_per_gym]
+"""
+import random
+import sys
+import time
+
+from psycopg2.extras import execute_batch
+
+from benchmarks.excel_export import synthetic_gym_data
+from src.db_utils import bulk_insert, close_pool, get_connection, get_or_create_gym_id, init_db, pooled_connection
+
+
+def legacy_bulk_insert(conn, gym_name: str, merged_data: dict):
+    """Reproduction of the previous row-by-row execute_batch loader."""
+    gym_id = get_or_create_gym_id(conn, gym_name)
+    with conn.cursor() as cur:
+        execute_batch(cur, """
+            INSERT INTO ubicaciones (gym_id, content_para_busqueda, direccion_completa, distrito, horario_atencion)
+            VALUES (%s, %s, %s, %s, %s) ON CONFLICT DO NOTHING;
+        """, [(gym_id, u.get("content_para_busqueda"), u.get("direccion_completa"), u.get("distrito"), u.get("horario_atencion"))
+              for u in merged_data.get("ubicaciones", [])])
+        execute_batch(cur, """
+            INSERT INTO precios (gym_id, content_para_busqueda, sede, descripcion_plan, valor, moneda, recurrencia)
+            VALUES (%s, %s, %s, %s, %s, %s, %s) ON CONFLICT DO NOTHING;
+        """, [(gym_id, p.get("content_para_busqueda"), p.get("sede"), p.get("descripcion_plan"), p.get("valor"), p.get("moneda"), p.get("recurrencia"))
+              for p in merged_data.get("precios", [])])
+        execute_batch(cur, """
+            INSERT INTO horarios (gym_id, sede, nombre_clase, instructor, fecha, dia_semana, hora_inicio, hora_fin)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s) ON CONFLICT DO NOTHING;
+        """, [(gym_id, h.get("sede"), h.get("nombre_clase"), h.get("instructor"), h.get("fecha"), h.get("dia_semana"), h.get("hora_inicio"), h.get("hora_fin"))
+              for h in merged_data.get("horarios", [])])
+        execute_batch(cur, """
+            INSERT INTO disciplinas (gym_id, nombre, descripcion) VALUES (%s, %s, %s) ON CONFLICT DO NOTHING;
+        """, [(gym_id, d.get("nombre"), d.get("descripcion")) for d in merged_data.get("disciplinas", [])])
+    conn.commit()
+
+
+def cleanup(prefix: str):
+    with pooled_connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT id FROM gimnasios WHERE gym_name LIKE %s", (prefix + "%",))
+        ids = [r[0] for r in cur.fetchall()]
+        if ids:
+            for table in ["ubicaciones", "precios", "horarios", "disciplinas"]:
+                cur.execute(f"DELETE FROM {table} WHERE gym_id = ANY(%s)", (ids,))
+                cur.execute(f"DELETE FROM {table}_history WHERE gym_id = ANY(%s)", (ids,))
+            cur.execute("DELETE FROM gimnasios WHERE id = ANY(%s)", (ids,))
+        conn.commit()
+
+
+def main():
+    n_gyms = int(sys.argv[1]) if len(sys.argv) > 1 else 18
+    schedule_rows = int(sys.argv[2]) if len(sys.argv) > 2 else 5_000
+    rng = random.Random(42)
+    gyms = [(f"bench-{i}", synthetic_gym_data(i, schedule_rows, rng)) for i in range(n_gyms)]
+    with pooled_connection() as conn:
+        init_db(conn)
+    cleanup("bench-")
+
+    start = time.perf_counter()
+    for gym_name, data in gyms:
+        conn = get_connection()
+        legacy_bulk_insert(conn, "bench-legacy-" + gym_name, data)
+        conn.close()
+    legacy = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for gym_name, data in gyms:
+        with pooled_connection() as conn:
+            bulk_insert(conn, "bench-copy-" + gym_name, data)
+    copy = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for gym_name, data in gyms:
+        with pooled_connection() as conn:
+            bulk_insert(conn, "bench-copy-" + gym_name, data)
+    rerun = time.perf_counter() - start
+
+    cleanup("bench-")
+    close_pool()
+    print(f"{n_gyms} gyms x {schedule_rows} schedule rows")
+    print(f"legacy execute_batch  {legacy:8.2f} s")
+    print(f"pooled COPY, 1st load {copy:8.2f} s")
+    print(f"rerun, no changes     {rerun:8.2f} s")
+
+
+if __name__ == "__main__":
+    main()
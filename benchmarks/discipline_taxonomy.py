@@ -0,0 +1,76 @@
+"""
+Discipline taxonomy: per-name lookup latency of the nearest-neighbour index, share of names resolved
+without the LLM, and how learned aliases remove the LLM call on the next run. The local OpenAI stand-in
+answers every unmatched name with a new id of its own, so the id count is an upper bound.
+
+Usage: python -m benchmarks.discipline_taxonomy [gyms] [classes_per_gym]
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+import openai
+
+from benchmarks.fake_openai import start_fake_openai
+from src.taxonomy import DisciplineTaxonomy
+
+# Cómo llaman los estudios a sus clases: variantes, niveles, horas y alguna disciplina fuera del catálogo
+VARIANTS = ["Vinyasa Flow", "Yoga Vinyasa", "Power Yoga", "Hatha Yoga", "Yin", "Reformer", "Pilates Máquina",
+            "Mat Pilates", "Pilates Reformer", "Barre", "Barre Fit", "Indoor Cycling", "Spinning", "Funcional",
+            "Entrenamiento Funcional", "HIIT", "TRX", "Zumba", "Stretching", "Meditación", "Aerial Yoga", "Kundalini Yoga",
+            "Aqua Gym", "Pole Dance"]
+LEVELS = ["", " Intermedio", " Avanzado", " Principiantes", " 45'", " 7am", " Express"]
+
+
+def synthetic_extractions(n_gyms: int, per_gym: int, rng: random.Random) -> list[dict]:
+    return [{
+        "disciplinas": [{"nombre": name} for name in rng.sample(VARIANTS, 8)],
+        "horarios": [{"nombre_clase": rng.choice(VARIANTS) + rng.choice(LEVELS)} for _ in range(per_gym)],
+    } for _ in range(n_gyms)]
+
+
+def main():
+    n_gyms = int(sys.argv[1]) if len(sys.argv) > 1 else 18
+    per_gym = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    extractions = synthetic_extractions(n_gyms, per_gym, random.Random(11))
+    names = [fact.get("nombre") or fact["nombre_clase"] for e in extractions for facts in e.values() for fact in facts]
+    server = start_fake_openai()
+    client = openai.OpenAI(base_url=server.base_url, api_key="fake")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "aliases.json")
+        taxonomy = DisciplineTaxonomy(path)
+        cold = []
+        for name in dict.fromkeys(names):
+            start = time.perf_counter()
+            taxonomy.match(name)
+            cold.append((time.perf_counter() - start) * 1e6)
+        start = time.perf_counter()
+        for name in names:
+            taxonomy.match(name)
+        warm = (time.perf_counter() - start) * 1e6 / len(names)
+
+        taxonomy.stats.clear()
+        taxonomy.tag(extractions, client)
+        first = taxonomy.report()
+        llm_calls = server.state["requests"]["chat"]
+
+        rerun = DisciplineTaxonomy(path)
+        rerun.tag(synthetic_extractions(n_gyms, per_gym, random.Random(11)), client)
+        second = rerun.report()
+
+    print(f"{len(names):,} names ({len(cold)} distinct) from {n_gyms} gyms")
+    print(f"lookup: {statistics.median(cold):.0f} µs median for an unseen name, {warm:.2f} µs per name with the cache")
+    ids = {fact["disciplina_id"] for e in extractions for facts in e.values() for fact in facts}
+    print(f"run 1: {first['local_match_rate']:.0%} matched locally, {first.get('llm_names', 0)} distinct names to the LLM "
+          f"in {llm_calls} call(s), {len(ids)} canonical ids")
+    print(f"run 2: {second['local_match_rate']:.0%} matched locally, {second.get('llm_names', 0)} names to the LLM "
+          f"({second['learned_aliases']} learned aliases)")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
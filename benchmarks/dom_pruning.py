@@ -0,0 +1,60 @@
+"""
+In-browser vs Python pruning: bytes that cross the CDP boundary and Python CPU per page. Pages are the
+synthetic renders of benchmarks.page_archive (large shared shell around a small <main>). With Chromium
+installed, PRUNE_SCRIPT runs on each page and its output is compared with prune_html_for_llm; without it
+only the Python side is measured (what in-browser pruning removes from the process).
+
+Usage: python -m benchmarks.dom_pruning [pages]
+"""
+import random
+import statistics
+import sys
+import time
+
+from benchmarks.page_archive import render, shell
+from src.scrape import PRUNE_SCRIPT, prune_html_for_llm
+
+
+def text_of(html: str) -> list[str]:
+    return sorted(prune_html_for_llm(f"<main>{html}</main>").replace("<", " <").split())
+
+
+def main():
+    n_pages = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    rng = random.Random(3)
+    head, tail = shell("gym", rng)
+    pages = [render(head, tail, "gym", i, 0, random.Random(i)) for i in range(n_pages)]
+
+    python_ms, pruned = [], []
+    for html in pages:
+        start = time.process_time()
+        pruned.append(prune_html_for_llm(html))
+        python_ms.append((time.process_time() - start) * 1e3)
+    raw_kb = statistics.mean(len(html.encode("utf-8")) for html in pages) / 1e3
+    pruned_kb = statistics.mean(len(html.encode("utf-8")) for html in pruned) / 1e3
+    print(f"{n_pages} pages: outerHTML {raw_kb:.0f} KB -> pruned {pruned_kb:.1f} KB per page "
+          f"(x{raw_kb / pruned_kb:.0f} less over CDP)")
+    print(f"python pruning: {statistics.median(python_ms):.1f} ms CPU per page, removed by in-browser pruning")
+
+    try:
+        from playwright.sync_api import sync_playwright
+        with sync_playwright() as p:
+            browser = p.chromium.launch(headless=True)
+            page = browser.new_page()
+            browser_ms, matches = [], 0
+            for html, expected in zip(pages, pruned):
+                page.set_content(html)
+                start = time.perf_counter()
+                result = page.evaluate(PRUNE_SCRIPT)
+                browser_ms.append((time.perf_counter() - start) * 1e3)
+                matches += text_of(result) == text_of(expected)
+            browser.close()
+    except Exception as e:
+        print(f"in-browser pruning not measured (no Chromium: {str(e).splitlines()[0]})")
+        return
+    print(f"in-browser pruning: {statistics.median(browser_ms):.1f} ms per page round trip, "
+          f"{matches}/{n_pages} pages with the same content as the Python pruner")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Resumable Drive upload against a local stand-in server.
+
+The stand-in implements the subset of the Drive resumable protocol used by src.drive_uploader
+(session POST, chunk PUT with Content-Range, 308 + Range, status query) and can inject faults:
+every Nth chunk is either dropped with a 503 or only partially persisted.
+
+Usage: python -m benchmarks.drive_upload [size_mb] [fail_every]
+"""
+import hashlib
+import sys
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import src.drive_uploader as drive_uploader
+from src.drive_uploader import upload_file
+
+
+class FakeDriveHandler(BaseHTTPRequestHandler):
+    sessions: dict = {}
+    fail_every = 0
+    requests_seen = 0
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status: int, headers: dict | None = None, body: bytes = b""):
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        session_id = str(len(self.sessions))
+        self.sessions[session_id] = {"hash": hashlib.sha256(), "received": 0}
+        host, port = self.server.server_address
+        self._reply(200, {"Location": f"http://{host}:{port}/session/{session_id}"})
+
+    def do_PUT(self):
+        state = self.sessions[self.path.rsplit("/", 1)[1]]
+        data = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        kind, _, spec = self.headers["Content-Range"].partition(" ")
+        span, _, total = spec.partition("/")
+        cls = type(self)
+        cls.requests_seen += 1
+
+        if span != "*":
+            start = int(span.split("-")[0])
+            if cls.fail_every and cls.requests_seen % cls.fail_every == 0:
+                if cls.requests_seen % (2 * cls.fail_every) == 0:
+                    return self._reply(503)
+                data = data[:len(data) // 2]  # persist only half of the chunk
+            data = data[state["received"] - start:]
+            state["hash"].update(data)
+            state["received"] += len(data)
+
+        if total != "*" and state["received"] == int(total):
+            body = f'{{"id": "fake", "size": {state["received"]}, "sha256": "{state["hash"].hexdigest()}"}}'
+            return self._reply(200, {"Content-Type": "application/json"}, body.encode())
+        headers = {"Range": f"bytes=0-{state['received'] - 1}"} if state["received"] else {}
+        self._reply(308, headers)
+
+
+def start_fake_drive(fail_every: int = 0) -> ThreadingHTTPServer:
+    FakeDriveHandler.sessions = {}
+    FakeDriveHandler.fail_every = fail_every
+    FakeDriveHandler.requests_seen = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeDriveHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def generated_blocks(size: int, block: int = 1024 * 1024):
+    pattern = bytes(range(256)) * (block // 256)
+    for offset in range(0, size, block):
+        yield pattern[:min(block, size - offset)]
+
+
+def main():
+    size = int(float(sys.argv[1]) * 1024 * 1024) if len(sys.argv) > 1 else 256 * 1024 * 1024
+    fail_every = int(sys.argv[2]) if len(sys.argv) > 2 else 7
+    expected = hashlib.sha256()
+    for block in generated_blocks(size):
+        expected.update(block)
+
+    server = start_fake_drive(fail_every)
+    host, port = server.server_address
+    drive_uploader.RETRY_BACKOFF = 0  # no backoff against the local server
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    res = upload_file(generated_blocks(size), "bench.bin", "application/octet-stream", "folder",
+                      upload_url=f"http://{host}:{port}/upload", creds=SimpleNamespace(token="fake"))
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    server.shutdown()
+
+    assert res["size"] == size and res["sha256"] == expected.hexdigest(), res
+    print(f"Uploaded {size / 1024 / 1024:.0f} MiB in {elapsed:.2f} s, {FakeDriveHandler.requests_seen} chunk requests, "
+          f"peak {peak / 1024 / 1024:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,366 @@
+"""
+Offline end-to-end benchmark: replays recorded studio sites through a local HTTP server and Playwright
+routing, with the OpenAI client pointed at the local stand-in, and runs the production crawl and
+extraction path (collect_gym_pages + extract_gym) for every site. Reports end-to-end throughput,
+per-stage latency and tokens from the run's telemetry, and can fail on a regression against a baseline.
+
+A snapshot is one directory per gym (default data/snapshots/<gym>/):
+    site.json   {"gym": ..., "origin": "https://www.bioritmo.com.pe", "site_url": "https://www.bioritmo.com.pe/"}
+    site.har    every response of the recorded crawl: robots.txt, sitemaps, pages, iframes and assets
+
+The site's own origin is served by a local HTTP server (httpx fetches robots.txt and sitemaps from it,
+the browser loads its pages), and other origins (booking widgets in iframes, CDNs) are fulfilled from
+the HAR by Playwright routing; anything not recorded is aborted, so a replay never touches the network.
+
+Usage:
+    python -m benchmarks.e2e record [gym ...]       live crawl of pages_to_scrape into data/snapshots
+    python -m benchmarks.e2e synth [gyms] [pages]   synthetic snapshots, for runs without recordings
+    python -m benchmarks.e2e run [--latency S] [--save-baseline FILE] [--baseline FILE] [--tolerance 0.2]
+"""
+import argparse
+import base64
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+os.environ.setdefault("TAXONOMY_ALIASES_PATH", "")  # learned aliases would leak between runs
+
+import httpx
+import openai
+from playwright.sync_api import sync_playwright
+
+import src.scrape as scrape
+from benchmarks.fake_openai import start_fake_openai
+from src.dataframes import init_row_buffers
+from src.telemetry import finish_telemetry, span, start_telemetry
+
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "data/snapshots")
+TEXT_TYPES = ("text/", "application/xml", "application/json", "application/javascript")
+
+
+def har_entry(url: str, status: int, content_type: str, body: bytes, location: str | None = None) -> dict:
+    headers = [{"name": "Content-Type", "value": content_type}] + ([{"name": "Location", "value": location}] if location else [])
+    return {"request": {"method": "GET", "url": url, "headers": []},
+            "response": {"status": status, "headers": headers, "redirectURL": location or "",
+                         "content": {"mimeType": content_type, "size": len(body), "encoding": "base64",
+                                     "text": base64.b64encode(body).decode("ascii")}}}
+
+
+class SnapshotSite:
+    """Recorded responses of one site, by URL (fragment-free)."""
+
+    def __init__(self, directory: str):
+        with open(os.path.join(directory, "site.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        self.gym = meta["gym"]
+        self.origin = meta["origin"].rstrip("/")
+        self.site_url = meta["site_url"]
+        with open(os.path.join(directory, "site.har"), encoding="utf-8") as f:
+            entries = json.load(f)["log"]["entries"]
+        self.responses = {}
+        for entry in entries:
+            if entry["request"]["method"] != "GET":
+                continue
+            response = entry["response"]
+            content = response.get("content") or {}
+            text = content.get("text") or ""
+            body = base64.b64decode(text) if content.get("encoding") == "base64" else text.encode("utf-8")
+            headers = {h["name"].lower(): h["value"] for h in response.get("headers", [])}
+            # La primera respuesta de una URL es la de la navegación; las repeticiones suelen venir de caché
+            self.responses.setdefault(entry["request"]["url"].split("#")[0], (
+                response["status"], headers.get("content-type") or content.get("mimeType") or "text/html",
+                body, headers.get("location") or response.get("redirectURL") or None))
+
+    def lookup(self, url: str):
+        url = url.split("#")[0]
+        for candidate in (url, url.rstrip("/"), url + "/"):
+            if candidate in self.responses:
+                return self.responses[candidate]
+        return None
+
+
+def localize(body: bytes, content_type: str, origin: str, local_origin: str) -> bytes:
+    """Rewrites absolute links to the recorded origin so they point at the local server."""
+    if not content_type.startswith(TEXT_TYPES):
+        return body
+    host = urlparse(origin).netloc
+    text = body.decode("utf-8", errors="replace")
+    for form in (origin, f"http://{host}", f"https://{host}", f"//{host}"):
+        text = text.replace(form, local_origin)
+    return text.encode("utf-8")
+
+
+@contextmanager
+def serve_site(site: SnapshotSite):
+    """Serves the site's own origin on 127.0.0.1; yields the local origin ("http://127.0.0.1:<port>")."""
+
+    class SiteHandler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            found = site.lookup(site.origin + self.path)
+            if found is None:
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            status, content_type, body, location = found
+            body = localize(body, content_type, site.origin, local_origin)
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            if location:
+                self.send_header("Location", location.replace(site.origin, local_origin))
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SiteHandler)
+    local_origin = f"http://127.0.0.1:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        yield local_origin
+    finally:
+        server.shutdown()
+
+
+def replay_router(site: SnapshotSite, local_origin: str):
+    """Playwright route handler: the local origin goes to the local server, other origins come from the HAR."""
+
+    def route(route, request):
+        if request.url.startswith(local_origin):
+            return route.continue_()
+        found = site.lookup(request.url)
+        if found is None:
+            return route.abort()
+        status, content_type, body, location = found
+        headers = {"content-type": content_type} | ({"location": location} if location else {})
+        route.fulfill(status=status, headers=headers, body=localize(body, content_type, site.origin, local_origin))
+
+    return route
+
+
+def load_sites(directory: str) -> list[SnapshotSite]:
+    return [SnapshotSite(os.path.join(directory, name)) for name in sorted(os.listdir(directory))
+            if os.path.exists(os.path.join(directory, name, "site.json"))]
+
+
+def write_snapshot(directory: str, gym: str, site_url: str, entries: list[dict]):
+    os.makedirs(directory, exist_ok=True)
+    parsed = urlparse(site_url)
+    with open(os.path.join(directory, "site.json"), "w", encoding="utf-8") as f:
+        json.dump({"gym": gym, "origin": f"{parsed.scheme}://{parsed.netloc}", "site_url": site_url}, f, indent=2)
+    with open(os.path.join(directory, "site.har"), "w", encoding="utf-8") as f:
+        json.dump({"log": {"version": "1.2", "creator": {"name": "benchmarks.e2e", "version": "1"}, "entries": entries}}, f)
+
+
+@contextmanager
+def capture_httpx(entries: list[dict]):
+    """Records every response fetched through httpx.Client (robots.txt and sitemaps) as HAR entries."""
+    send = httpx.Client.send
+
+    def recording_send(self, request, *args, **kwargs):
+        response = send(self, request, *args, **kwargs)
+        for hop in [*response.history, response]:
+            entries.append(har_entry(str(hop.url), hop.status_code, hop.headers.get("content-type", "text/plain"),
+                                     hop.content, hop.headers.get("location")))
+        return response
+
+    httpx.Client.send = recording_send
+    try:
+        yield entries
+    finally:
+        httpx.Client.send = send
+
+
+def record(gyms: list[str], directory: str):
+    """Live crawl through the production path, recording robots/sitemaps (httpx) and the browser (HAR)."""
+    client = openai.OpenAI() if os.getenv("OPENAI_API_KEY") else None
+    fake = None
+    if client is None:
+        fake = start_fake_openai()  # categorización por palabras clave de la URL
+        client = openai.OpenAI(base_url=fake.base_url, api_key="fake")
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=True)
+        for gym in gyms or list(scrape.pages_to_scrape):
+            site_url = scrape.pages_to_scrape[gym]
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                har_path = os.path.join(tmp_dir, "browser.har")
+                context = browser.new_context(record_har_path=har_path, record_har_content="embed")
+                entries = []
+                with capture_httpx(entries):
+                    urls = scrape.get_filtered_sitemap_urls(site_url)
+                    pages = scrape.collect_gym_pages(client, context, gym, site_url)
+                context.close()  # escribe el HAR
+                with open(har_path, encoding="utf-8") as f:
+                    entries += json.load(f)["log"]["entries"]
+            write_snapshot(os.path.join(directory, gym), gym, site_url, entries)
+            print(f"{gym}: {len(urls)} sitemap URLs, {len(pages)} pages, {len(entries)} responses recorded")
+        browser.close()
+    if fake:
+        fake.shutdown()
+
+
+def synthetic_site(gym: str, n_pages: int, rng: random.Random) -> tuple[str, list[dict]]:
+    """A studio site with locations, prices, disciplines and a timetable embedded from a booking widget."""
+    origin = f"https://www.{gym}.example"
+    widget = f"https://booking.example/{gym}/horarios"
+    classes = ["Vinyasa Flow", "Pilates Reformer", "Barre", "Hatha Yoga", "Indoor Cycling", "Mat Pilates"]
+    days = ["Lunes", "Martes", "Miércoles", "Jueves", "Viernes", "Sábado"]
+    pages = {
+        "/": f"<html><body><main><h1>{gym}</h1><p>Estudio boutique en Lima.</p></main></body></html>",
+        "/horarios/": f'<html><body><main><h1>Horarios</h1><iframe src="{widget}"></iframe></main></body></html>',
+    }
+    kinds = ["sedes", "precios", "disciplinas"]
+    for i in range(max(n_pages - 2, 0)):
+        kind = kinds[i % len(kinds)]
+        if kind == "sedes":
+            district = rng.choice(["Miraflores", "San Isidro", "Barranco", "Surco"])
+            body = f"<h1>Sede {district}</h1><p>Av. Larco {100 + i}, {district}, Lima</p><p>Lunes a sábado de 6:00 a 21:00</p>"
+        elif kind == "precios":
+            body = "<h1>Planes</h1>" + "".join(f"<p>{plan} S/ {price}</p>" for plan, price in
+                                               [("Clase suelta", 60 + i), ("Paquete 10 clases", 450 + i), ("Mensual ilimitado", 520 + i)])
+        else:
+            name = rng.choice(classes)
+            body = f"<h1>{name}</h1>" + f"<p>{name} combina respiración, fuerza y movilidad.</p>" * rng.randint(2, 6)
+        pages[f"/{kind}/{kind}-{i}/"] = f"<html><body><main>{body}</main></body></html>"
+    timetable = "".join(f"<tr><td>{day}</td><td>{c}</td><td>{h}:00 - {h + 1}:00</td></tr>"
+                        for day in days for h, c in zip(range(7, 12), rng.sample(classes, 5)))
+    sitemap = "".join(f"<url><loc>{origin}{path}</loc><lastmod>2026-01-0{1 + n % 9}</lastmod></url>"
+                      for n, path in enumerate(pages))
+    entries = [
+        har_entry(f"{origin}/robots.txt", 200, "text/plain", f"User-agent: *\nSitemap: {origin}/sitemap.xml\n".encode()),
+        har_entry(f"{origin}/sitemap.xml", 200, "application/xml",
+                  f'<?xml version="1.0" encoding="UTF-8"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{sitemap}</urlset>'.encode()),
+        har_entry(widget, 200, "text/html", f"<html><body><table>{timetable}</table></body></html>".encode()),
+    ]
+    entries += [har_entry(origin + path, 200, "text/html; charset=utf-8", html.encode()) for path, html in pages.items()]
+    return f"{origin}/", entries
+
+
+def synth(n_gyms: int, n_pages: int, directory: str):
+    rng = random.Random(13)
+    for n in range(n_gyms):
+        gym = f"studio{n:02d}"
+        site_url, entries = synthetic_site(gym, n_pages, rng)
+        write_snapshot(os.path.join(directory, gym), gym, site_url, entries)
+    print(f"{n_gyms} synthetic sites with {n_pages} pages each in {directory}")
+
+
+def run(directory: str, latency: float, chunk_delay: float, real_waits: bool) -> dict:
+    sites = load_sites(directory)
+    if not sites:
+        sys.exit(f"No snapshots in {directory}; record some or create synthetic ones with `synth`")
+    if not real_waits:
+        # Los snapshots son estáticos: sin hidratación que esperar ni contenido que aparezca con el scroll
+        scrape.MAX_SCROLLS, scrape.SCROLL_WAIT_MS, scrape.HYDRATION_WAIT_MS = 4, 50, 200
+    fake = start_fake_openai(latency=latency, chunk_delay=chunk_delay)
+    client = openai.OpenAI(base_url=fake.base_url, api_key="fake")
+    start_telemetry()
+    row_buffers = init_row_buffers()
+    n_pages = 0
+    start = time.perf_counter()
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=True)
+        for site in sites:
+            with serve_site(site) as local_origin:
+                context = browser.new_context()
+                context.route("**/*", replay_router(site, local_origin))
+                site_url = site.site_url.replace(site.origin, local_origin)
+                with span("gym", gym=site.gym):
+                    gym_pages = scrape.collect_gym_pages(client, context, site.gym, site_url)
+                    scrape.extract_gym(client, site.gym, gym_pages, row_buffers, None)
+                n_pages += len(gym_pages)
+                context.close()
+        browser.close()
+    wall = time.perf_counter() - start
+    report = finish_telemetry()
+    fake.shutdown()
+    return {
+        "gyms": len(sites),
+        "pages": n_pages,
+        "facts": sum(len(rows) for rows in row_buffers.values()),
+        "wall_s": round(wall, 2),
+        "pages_per_min": round(n_pages / wall * 60, 1),
+        "llm_requests": fake.state["requests"]["chat"],
+        "stages": report["stages"],
+        "tokens": report["tokens"],
+        "browser_s": report["browser_s"],
+        "llm_s": report["llm_s"],
+    }
+
+
+def regressions(result: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Throughput drops, slower stage p95s and token growth beyond `tolerance` (relative)."""
+    found = []
+    if result["pages_per_min"] < baseline["pages_per_min"] * (1 - tolerance):
+        found.append(f"throughput {baseline['pages_per_min']} -> {result['pages_per_min']} pages/min")
+    for stage, stats in result["stages"].items():
+        before = baseline["stages"].get(stage)
+        if before and stats["p95_s"] > max(before["p95_s"] * (1 + tolerance), before["p95_s"] + 0.05):
+            found.append(f"{stage} p95 {before['p95_s']}s -> {stats['p95_s']}s")
+    for model, tokens in result["tokens"].items():
+        before = baseline["tokens"].get(model, {"in": 0, "out": 0})
+        total, total_before = tokens["in"] + tokens["out"], before["in"] + before["out"]
+        if total > total_before * (1 + tolerance):
+            found.append(f"{model} tokens {total_before:,} -> {total:,}")
+    return found
+
+
+def print_result(result: dict):
+    print(f"{result['gyms']} gyms, {result['pages']} pages, {result['facts']} facts in {result['wall_s']}s "
+          f"({result['pages_per_min']} pages/min), {result['llm_requests']} LLM requests")
+    print(f"browser {result['browser_s']:.1f}s, LLM {result['llm_s']:.1f}s")
+    print(f"{'stage':<16}{'spans':>7}{'total s':>10}{'p50 s':>9}{'p95 s':>9}")
+    for stage, stats in sorted(result["stages"].items(), key=lambda item: -item[1]["total_s"]):
+        print(f"{stage:<16}{stats['count']:>7}{stats['total_s']:>10.2f}{stats['p50_s']:>9.3f}{stats['p95_s']:>9.3f}")
+    for model, tokens in sorted(result["tokens"].items()):
+        print(f"{model}: {tokens['in']:,} tokens in / {tokens['out']:,} out")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--snapshots", default=SNAPSHOT_DIR)
+    commands = parser.add_subparsers(dest="command", required=True)
+    record_cmd = commands.add_parser("record")
+    record_cmd.add_argument("gyms", nargs="*")
+    synth_cmd = commands.add_parser("synth")
+    synth_cmd.add_argument("n_gyms", nargs="?", type=int, default=18)
+    synth_cmd.add_argument("n_pages", nargs="?", type=int, default=12)
+    run_cmd = commands.add_parser("run")
+    run_cmd.add_argument("--latency", type=float, default=0.3, help="seconds per LLM request")
+    run_cmd.add_argument("--chunk-delay", type=float, default=0.0, help="seconds between streamed chunks")
+    run_cmd.add_argument("--real-waits", action="store_true", help="keep the production scroll/hydration waits")
+    run_cmd.add_argument("--save-baseline")
+    run_cmd.add_argument("--baseline")
+    run_cmd.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    if args.command == "record":
+        return record(args.gyms, args.snapshots)
+    if args.command == "synth":
+        return synth(args.n_gyms, args.n_pages, args.snapshots)
+    result = run(args.snapshots, args.latency, args.chunk_delay, args.real_waits)
+    print_result(result)
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            found = regressions(result, json.load(f), args.tolerance)
+        for line in found:
+            print(f"REGRESSION {line}")
+        if found:
+            sys.exit(1)
+        print(f"no regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Benchmark: legacy pd.concat + autofit export vs. buffered write-only export.
+
+Usage: python -m benchmarks.excel_export [schedule_rows] [gyms] [--memory]
+--memory also reports peak Python allocations (tracemalloc slows both paths down considerably).
+"""
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from io import BytesIO
+
+import pandas as pd
+from openpyxl.styles import Alignment
+from openpyxl.utils import get_column_letter
+
+from src.dataframes import SHEETS, init_row_buffers, append_scraped_data, write_excel
+
+DAYS = ["Lunes", "Martes", "Miércoles", "Jueves", "Viernes", "Sábado", "Domingo"]
+CLASSES = ["Vinyasa Flow", "Reformer", "Pilates Mat", "Hatha Yoga", "Barre", "Funcional", "Yin Yoga", "Spinning"]
+SEDES = ["Miraflores", "San Isidro", "Surco", "La Molina", "Barranco"]
+
+
+def synthetic_gym_data(gym_idx: int, schedule_rows: int, rng: random.Random) -> dict:
+    fuente = f"https://gym{gym_idx}.pe/horarios"
+    horarios = []
+    for i in range(schedule_rows):
+        start = rng.randint(6, 21)
+        clase = rng.choice(CLASSES)
+        horarios.append({
+            "content_para_busqueda": f"Clase de {clase} el {DAYS[i % 7].lower()} a las {start}:00 en la sede {SEDES[i % 5]}.",
+            "sede": SEDES[i % 5], "nombre_clase": clase, "instructor": f"Instructor {i % 40}",
+            "fecha": f"{(i % 28) + 1:02d}-10-2026", "dia_semana": DAYS[i % 7],
+            "hora_inicio": f"{start:02d}:00", "hora_fin": f"{start + 1:02d}:00", "fuente": fuente,
+        })
+    return {
+        "ubicaciones": [{"direccion_completa": f"Av. Larco {100 + s}, {sede}, Lima", "distrito": sede,
+                         "horario_atencion": "Lunes a Viernes 6am - 10pm", "fuente": fuente} for s, sede in enumerate(SEDES)],
+        "disciplinas": [{"nombre": c, "sede": "Todas", "descripcion": f"{c}: " + "descripción larga " * 6, "fuente": fuente} for c in CLASSES],
+        "precios": [{"sede": "Todas", "descripcion_plan": f"Plan {n}", "valor": 100.0 * n, "moneda": "PEN",
+                     "recurrencia": "mensual", "fuente": fuente} for n in range(1, 6)],
+        "horarios": horarios,
+    }
+
+
+def legacy_export(gyms: list[tuple[str, dict]]) -> bytes:
+    """Reproduction of the previous concat-per-gym + autofit-over-cells export path."""
+    dfs = {category: pd.DataFrame(columns=columns) for category, (_, columns) in SHEETS.items()}
+    for gym_name, scraped in gyms:
+        for category in dfs:
+            if category in scraped:
+                temp = pd.DataFrame(scraped[category])
+                temp["nombre_gym"] = gym_name
+                dfs[category] = pd.concat([dfs[category], temp], ignore_index=True)
+
+    output = BytesIO()
+    with pd.ExcelWriter(output, engine="openpyxl") as writer:
+        for category, (sheet_name, _) in SHEETS.items():
+            dfs[category].to_excel(writer, sheet_name=sheet_name, index=False)
+        for _, (sheet_name, _) in SHEETS.items():
+            ws = writer.book[sheet_name]
+            for col_idx, col in enumerate(ws.columns, 1):
+                max_length = max((len(str(cell.value)) for cell in col if cell.value), default=0)
+                ws.column_dimensions[get_column_letter(col_idx)].width = min(max_length + 2, 50)
+            for row in ws.iter_rows():
+                for cell in row:
+                    cell.alignment = Alignment(wrap_text=True)
+    output.seek(0)
+    return output.getvalue()
+
+
+def buffered_export(gyms: list[tuple[str, dict]]) -> None:
+    buffers = init_row_buffers()
+    for gym_name, scraped in gyms:
+        append_scraped_data(buffers, gym_name, scraped)
+    with tempfile.TemporaryFile() as f:
+        write_excel(buffers, f)
+
+
+def measure(label: str, fn, *args, memory: bool = False) -> None:
+    start = time.perf_counter()
+    fn(*args)
+    line = f"{label:<10} {time.perf_counter() - start:8.2f} s"
+    if memory:
+        tracemalloc.start()
+        fn(*args)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        line += f"   peak {peak / 1024 / 1024:8.1f} MiB"
+    print(line)
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    memory = "--memory" in sys.argv
+    schedule_rows = int(args[0]) if len(args) > 0 else 100_000
+    n_gyms = int(args[1]) if len(args) > 1 else 18
+    rng = random.Random(42)
+    gyms = [(f"gym{i}", synthetic_gym_data(i, schedule_rows // n_gyms, rng)) for i in range(n_gyms)]
+    print(f"Exporting {schedule_rows} schedule rows across {n_gyms} gyms")
+    measure("buffered", buffered_export, gyms, memory=memory)
+    measure("legacy", legacy_export, gyms, memory=memory)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+"""
+Local stand-in for the OpenAI endpoints used by the scraper: chat completions, files and batches.
+
+Responses come from a `responder(body) -> str` function; the default one answers the schedule
+classifier with SI/NO based on the HTML and returns canned extraction JSON built from simple
+patterns in the page, so runs are deterministic and need no network.
+
+Chat completions can be streamed (`stream=True`, one SSE chunk per `stream_chunk_chars` characters,
+`chunk_delay` seconds apart) and cut at `max_output_chars` with finish_reason "length"; a continuation
+request (the previous output as an assistant message) gets the rest of the same answer. A final usage
+chunk is sent when the request asks for it with `stream_options={"include_usage": True}`. Usage reports
+`prompt_tokens_details.cached_tokens` from a provider-style prefix cache (PrefixCache).
+
+    server = start_fake_openai()
+    client = openai.OpenAI(base_url=server.base_url, api_key="fake")
+"""
+import email.parser
+import hashlib
+import json
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CACHE_MIN_TOKENS = 1_024  # como el proveedor: prefijos de al menos 1024 tokens, en pasos de 128
+CACHE_STEP_TOKENS = 128
+TIME_PATTERN = re.compile(r"(\d{1,2}:\d{2})")
+PRICE_PATTERN = re.compile(r"S/\s?(\d+(?:[.,]\d+)?)")
+
+
+def default_responder(body: dict) -> str:
+    prompt = body["messages"][-1]["content"]
+    html = prompt.rsplit("html_content", 1)[-1] if "html_content" in prompt else prompt
+    if 'Responde únicamente con "SI" o "NO"' in prompt:
+        html = prompt.rsplit("Ahora clasifica el siguiente HTML:", 1)[-1]
+        return "SI" if len(TIME_PATTERN.findall(html)) >= 3 else "NO"
+    if "URLs" in prompt and "categorize" in prompt:
+        urls = json.loads(prompt.rsplit("**Input URLs:**", 1)[-1].split("**Your Output:**")[0])
+        result = {"locations": [], "pricing": [], "schedules": [], "disciplines": []}
+        for url in urls:
+            for key, words in [("locations", ["sede", "contact", "local"]), ("pricing", ["precio", "plan", "tarifa"]),
+                               ("schedules", ["horario", "schedule", "clase"]), ("disciplines", ["disciplina", "yoga", "pilates"])]:
+                if any(w in url.lower() for w in words):
+                    result[key].append(url)
+        return json.dumps(result)
+    if "clasifica nombres de clases y disciplinas" in prompt:  # discipline taxonomy
+        names = json.loads(prompt.rsplit("**Nombres:**", 1)[-1].split("**Tu Salida:**")[0])
+        return json.dumps({name: {"id": re.sub(r"\W+", "-", name.lower()).strip("-"), "nombre": name.title()}
+                           for name in names}, ensure_ascii=False)
+    if "Datos de entrada" in prompt:  # merge
+        merged = {"ubicaciones": [], "precios": [], "disciplinas": []}
+        for block in re.findall(r"```json\n(.*?)\n```", prompt, flags=re.S):
+            try:
+                data = json.loads(block)
+            except json.JSONDecodeError:
+                continue
+            for key in merged:
+                merged[key].extend(data.get(key, []))
+        return json.dumps(merged, ensure_ascii=False)
+    if "=== PÁGINA P1 ===" in prompt:  # packed extraction
+        pages = re.findall(r"=== PÁGINA (P\d+) ===(.*?)=== FIN PÁGINA \1 ===", prompt, flags=re.S)
+        return json.dumps({page_id: canned_extraction(block) for page_id, block in pages}, ensure_ascii=False)
+    return json.dumps(canned_extraction(html), ensure_ascii=False)
+
+
+def canned_extraction(html: str) -> dict:
+    times = TIME_PATTERN.findall(html)
+    return {
+        "ubicaciones": [],
+        "precios": [{"content_para_busqueda": f"Plan por S/ {p}", "sede": "Todas", "descripcion_plan": f"Plan {i + 1}",
+                     "valor": float(p.replace(",", "")), "moneda": "PEN", "recurrencia": "mensual"}
+                    for i, p in enumerate(PRICE_PATTERN.findall(html))],
+        "horarios": [{"content_para_busqueda": f"Clase a las {t}", "sede": "Todas", "nombre_clase": "Clase",
+                      "instructor": "", "fecha": "", "dia_semana": "Lunes", "hora_inicio": t, "hora_fin": ""}
+                     for t in times[::2]],
+        "disciplinas": [],
+    }
+
+
+class PrefixCache:
+    """
+    Provider-style prompt cache: a request is served the longest prefix of its messages (same model) seen in
+    an earlier request, if it is at least CACHE_MIN_TOKENS long, in CACHE_STEP_TOKENS steps (4 chars per token).
+    """
+
+    def __init__(self):
+        self.seen = set()
+        self.lock = threading.Lock()
+
+    def lookup(self, body: dict) -> int:
+        """Cached prompt tokens of `body`; its prefixes are cached from now on."""
+        text = "".join(f"{m['role']}\x1f{m['content']}\x1e" for m in body["messages"]).encode("utf-8")
+        step = CACHE_STEP_TOKENS * 4
+        digest = hashlib.sha256(str(body.get("model")).encode())
+        prefixes = []
+        for end in range(step, len(text) + 1, step):
+            digest.update(text[end - step:end])
+            if end >= CACHE_MIN_TOKENS * 4:
+                prefixes.append((end, digest.copy().digest()))
+        with self.lock:
+            cached = max((end for end, key in prefixes if key in self.seen), default=0)
+            self.seen.update(key for _, key in prefixes)
+        return cached // 4
+
+
+def completion_body(body: dict, content: str, finish_reason: str = "stop", cached_tokens: int = 0) -> dict:
+    prompt_tokens = sum(len(m["content"]) for m in body["messages"]) // 4
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model"),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": finish_reason}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(content) // 4,
+                  "total_tokens": prompt_tokens + len(content) // 4,
+                  "prompt_tokens_details": {"cached_tokens": min(cached_tokens, prompt_tokens)}},
+    }
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def handle(self):
+        try:
+            super().handle()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client stopped reading a stream early
+
+    @property
+    def state(self):
+        return self.server.state
+
+    def _json(self, payload: dict, status: int = 200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def do_POST(self):
+        path = self.path.split("?")[0]
+        raw = self._body()
+        if path.endswith("/chat/completions"):
+            body = json.loads(raw)
+            self.state["requests"]["chat"] += 1
+            time.sleep(self.server.latency)
+            cached_tokens = self.server.prompt_cache.lookup(body)
+            content, finish_reason = self._answer(body)
+            if body.get("stream"):
+                return self._stream(body, content, finish_reason, cached_tokens)
+            return self._json(completion_body(body, content, finish_reason, cached_tokens))
+        if path.endswith("/files"):
+            message = email.parser.BytesParser().parsebytes(
+                b"Content-Type: " + self.headers["Content-Type"].encode() + b"\r\n\r\n" + raw)
+            content = next(part.get_payload(decode=True) for part in message.get_payload()
+                           if part.get_param("name", header="content-disposition") == "file")
+            file_id = f"file-{uuid.uuid4().hex[:12]}"
+            self.state["files"][file_id] = content
+            return self._json({"id": file_id, "object": "file", "bytes": len(content), "created_at": int(time.time()),
+                               "filename": "batch.jsonl", "purpose": "batch", "status": "processed"})
+        if path.endswith("/batches"):
+            body = json.loads(raw)
+            batch_id = f"batch_{uuid.uuid4().hex[:12]}"
+            batch = {"id": batch_id, "object": "batch", "endpoint": body["endpoint"], "input_file_id": body["input_file_id"],
+                     "completion_window": body["completion_window"], "status": "in_progress", "created_at": int(time.time()),
+                     "output_file_id": None, "error_file_id": None, "errors": None,
+                     "request_counts": {"total": 0, "completed": 0, "failed": 0}}
+            self.state["batches"][batch_id] = batch
+            self.state["requests"]["batches"] += 1
+            threading.Thread(target=self._process_batch, args=(batch,), daemon=True).start()
+            return self._json(batch)
+        if path.endswith("/cancel"):
+            batch = self.state["batches"][path.split("/")[-2]]
+            batch["status"] = "cancelled"
+            return self._json(batch)
+        self._json({"error": {"message": f"unknown path {path}"}}, 404)
+
+    def _answer(self, body: dict) -> tuple[str, str]:
+        """Responder output, continued after earlier assistant output and cut at `max_output_chars`."""
+        messages = body["messages"]
+        done = ""
+        if messages[-1]["role"] == "user" and len(messages) > 2 and messages[-2]["role"] == "assistant":
+            done = messages[-2]["content"]
+            self.state["requests"]["continuations"] += 1
+            body = {**body, "messages": messages[:-2]}
+        content = self.server.responder(body)[len(done):]
+        limit = self.server.max_output_chars
+        if limit and len(content) > limit:
+            return content[:limit], "length"
+        return content, "stop"
+
+    def _stream(self, body: dict, content: str, finish_reason: str, cached_tokens: int = 0):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        chunk_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        step = self.server.stream_chunk_chars
+        pieces = [{"role": "assistant", "content": content[i:i + step]} for i in range(0, len(content), step)]
+        for n, delta in enumerate(pieces + [{}]):
+            if n:
+                time.sleep(self.server.chunk_delay)
+            chunk = {"id": chunk_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": body.get("model"),
+                     "choices": [{"index": 0, "delta": delta, "finish_reason": None if delta else finish_reason}]}
+            self._write_chunk(f"data: {json.dumps(chunk)}\n\n")
+        if (body.get("stream_options") or {}).get("include_usage"):
+            usage = {"id": chunk_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": body.get("model"),
+                     "choices": [], "usage": completion_body(body, content, cached_tokens=cached_tokens)["usage"]}
+            self._write_chunk(f"data: {json.dumps(usage)}\n\n")
+        self._write_chunk("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, text: str):
+        data = text.encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path.endswith("/content"):
+            content = self.state["files"][path.split("/")[-2]]
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            return self.wfile.write(content)
+        if "/batches/" in path:
+            return self._json(self.state["batches"][path.split("/")[-1]])
+        self._json({"error": {"message": f"unknown path {path}"}}, 404)
+
+    def _process_batch(self, batch: dict):
+        time.sleep(self.server.batch_delay)
+        lines = self.state["files"][batch["input_file_id"]].decode("utf-8").splitlines()
+        output = []
+        for line in filter(None, lines):
+            item = json.loads(line)
+            response = completion_body(item["body"], self.server.responder(item["body"]),
+                                       cached_tokens=self.server.prompt_cache.lookup(item["body"]))
+            output.append(json.dumps({"id": f"batch_req_{uuid.uuid4().hex[:8]}", "custom_id": item["custom_id"],
+                                      "response": {"status_code": 200, "body": response}, "error": None}))
+        output_id = f"file-{uuid.uuid4().hex[:12]}"
+        self.state["files"][output_id] = ("\n".join(output) + "\n").encode("utf-8")
+        batch.update(status="completed", output_file_id=output_id,
+                     request_counts={"total": len(output), "completed": len(output), "failed": 0})
+
+
+def start_fake_openai(responder=default_responder, latency: float = 0.0, batch_delay: float = 0.0,
+                      max_output_chars: int | None = None, stream_chunk_chars: int = 40,
+                      chunk_delay: float = 0.0) -> ThreadingHTTPServer:
+    """Starts the stand-in on a free local port; `server.base_url` is ready for openai.OpenAI(base_url=...)."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeOpenAIHandler)
+    server.responder = responder
+    server.latency = latency
+    server.batch_delay = batch_delay
+    server.max_output_chars = max_output_chars
+    server.stream_chunk_chars = stream_chunk_chars
+    server.chunk_delay = chunk_delay
+    server.prompt_cache = PrefixCache()
+    server.state = {"files": {}, "batches": {}, "requests": {"chat": 0, "batches": 0, "continuations": 0}}
+    server.base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
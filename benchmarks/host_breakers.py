@@ -0,0 +1,68 @@
+"""
+Per-host circuit breakers and adaptive timeouts: simulated crawl time of a run where some studio sites
+are healthy, some slow with occasional stalls and some dead, with the fixed 180 s / 45 s navigation
+timeouts vs HostTracker. Navigation latencies are drawn per host (nothing is slept), the policy under
+test is the real HostTracker.
+
+Usage: python -m benchmarks.host_breakers [urls_per_host]
+"""
+import random
+import sys
+
+from src.hosts import HostTracker
+
+# host -> (mediana de carga en s, probabilidad de colgarse, muerto)
+PROFILES = {
+    "fast-{}.example": (1.5, 0.0, False),
+    "wix-{}.example": (6.0, 0.05, False),
+    "slow-{}.example": (12.0, 0.15, False),
+    "dead-{}.example": (0.0, 1.0, True),
+}
+
+
+class NavigationTimeout(Exception):
+    pass
+
+
+def crawl(hosts: dict[str, tuple], urls_per_host: int, tracker: HostTracker | None, rng: random.Random) -> dict:
+    spent, skipped, failed = 0.0, 0, 0
+    for host, (median, stall, dead) in hosts.items():
+        for i in range(urls_per_host):
+            url = f"https://{host}/page-{i}/"
+            default_ms = 180_000 if i == 0 else 45_000  # URL principal y luego frames/sub-URLs
+            if tracker is not None and not tracker.allow(url):
+                skipped += 1
+                continue
+            timeout = (tracker.timeout_ms(url, default_ms) if tracker else default_ms) / 1000
+            latency = float("inf") if dead or rng.random() < stall else rng.lognormvariate(0, 0.4) * median
+            if latency > timeout:
+                spent += timeout
+                failed += 1
+                if tracker:
+                    tracker.record(url, timeout, NavigationTimeout())
+            else:
+                spent += latency
+                if tracker:
+                    tracker.record(url, latency)
+    return {"spent_s": spent, "skipped": skipped, "failed": failed}
+
+
+def main():
+    urls_per_host = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    hosts = {template.format(n): profile for template, profile in PROFILES.items() for n in range(4)}
+    fixed = crawl(hosts, urls_per_host, None, random.Random(1))
+    tracker = HostTracker()
+    adaptive = crawl(hosts, urls_per_host, tracker, random.Random(1))
+    report = tracker.report()
+    print(f"{len(hosts)} hosts x {urls_per_host} URLs (4 healthy, 4 Wix-like, 4 slow with stalls, 4 dead)")
+    print(f"fixed timeouts: {fixed['spent_s'] / 60:.0f} min of navigation, {fixed['failed']} failed loads")
+    print(f"host tracker:   {adaptive['spent_s'] / 60:.0f} min of navigation, {adaptive['failed']} failed loads, "
+          f"{adaptive['skipped']} URLs skipped by open circuits")
+    for kind in ("fast-0.example", "wix-0.example", "slow-0.example", "dead-0.example"):
+        stats = report[kind]
+        print(f"  {kind:<16} {stats['state']:<9} timeout {stats['timeout_s'] or '-'}s, p95 {stats['p95_s'] or '-'}s, "
+              f"{stats['failures']} failures, {stats['trips']} trips")
+
+
+if __name__ == "__main__":
+    main()
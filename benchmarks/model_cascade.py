@@ -0,0 +1,122 @@
+"""
+Validation-driven model cascade vs. the old detect-then-pick-model flow, against the local OpenAI stand-in.
+The stand-in's cheapest model gets some timetable pages wrong (classes without a name) so the
+cascade has something to escalate. Reports calls and prompt tokens per model and per-site escalation rates.
+
+Usage: python -m benchmarks.model_cascade [pages] [nano_error_rate]
+"""
+import json
+import random
+import sys
+from collections import Counter
+
+import openai
+
+import src.llm as llm
+from benchmarks.fake_openai import default_responder, start_fake_openai
+from benchmarks.request_packing import synthetic_pages
+from src.packing import count_tokens, extract_pages
+from src.prompts import PromptTemplate
+
+
+def sloppy_responder(error_rate: float, usage: Counter):
+    rng = random.Random(3)
+
+    def respond(body: dict) -> str:
+        model = body.get("model")
+        usage[f"{model} calls"] += 1
+        usage[f"{model} tokens"] += count_tokens(body["messages"][-1]["content"])
+        content = default_responder(body)
+        if model != llm.EXTRACTION_CASCADE[0] or not content.startswith("{") or rng.random() >= error_rate:
+            return content
+        data = json.loads(content)
+        for page in (data.values() if "P1" in data else [data]):
+            for fact in page.get("horarios", []):
+                fact["nombre_clase"] = ""
+        return json.dumps(data, ensure_ascii=False)
+
+    return respond
+
+
+# SI/NO classifier the old flow called before every extraction (replaced by src.validation.looks_like_schedule)
+SCHEDULE_DETECTION_PROMPT = PromptTemplate("schedule_detection", 1, prefix="""
+    Eres un clasificador de contenido HTML. 
+    Tu tarea es determinar si el siguiente HTML contiene una **tabla de horarios de clases de entrenamiento o ejercicios**, NO un horario de atención general.
+
+    Reglas:
+    1. **Responde únicamente con "SI" o "NO"** (sin explicación).
+    2. Solo responde "SI" si ves **múltiples repeticiones de horas o días junto con nombres de clases o instructores** (por ejemplo: yoga 7am, spinning 8am, pilates 9am, etc).
+    3. Responde "NO" si:
+       - El texto solo menciona "horario de atención", "lunes a viernes 8am–10pm", o similares.
+       - Solo hay direcciones, teléfonos o información general del gimnasio.
+       - No aparecen nombres de clases, actividades o instructores.
+    4. Ignora palabras sueltas como "horario", "entrenamiento" o "gimnasio"; no implican una tabla de clases por sí mismas.
+
+    Ejemplos:
+    ---
+    HTML: "<p>Horarios de entrenamiento: Lunes a Viernes 5am a 11pm</p>"
+    Respuesta: NO
+
+    HTML: "<div>Yoga - 7:00am<br>Spinning - 8:00am<br>Pilates - 9:00am</div>"
+    Respuesta: SI
+
+    HTML: "<p>Elige tu plan. Lunes a jueves 5am a 11pm</p>"
+    Respuesta: NO
+
+    HTML: "<div><p>Clase: CrossFit</p><p>Hora: 6am</p><p>Instructor: Juan</p></div>"
+    Respuesta: SI
+    ---
+
+    Ahora clasifica el siguiente HTML:
+""", suffix="""    {html_text}
+    """)
+
+
+def detect_schedule(client: openai.OpenAI, html_text: str) -> bool:
+    request = SCHEDULE_DETECTION_PROMPT.request("gpt-5-nano", html_text=html_text)
+    completion = client.chat.completions.create(**request)
+    return "si" in (completion.choices[0].message.content or "").lower()
+
+
+def legacy_extract(client: openai.OpenAI, page: dict) -> dict:
+    """Previous flow: SI/NO schedule detection call, then mini for schedules and nano for the rest."""
+    has_schedule_info = detect_schedule(client, page["html_content"])
+    request = llm.extraction_request(page["page_url"], page["url_type"], page["html_content"], page["gym_name"],
+                                     page["lastmod"], page["freq"], has_schedule_info)
+    completion = client.chat.completions.create(**request)
+    return llm.parse_extraction_response(completion.choices[0].message.content, page["page_url"])
+
+
+def main():
+    n_pages = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    error_rate = float(sys.argv[2]) if len(sys.argv) > 2 else 0.5
+    usage = Counter()
+    server = start_fake_openai(responder=sloppy_responder(error_rate, usage), latency=0)
+    client = openai.OpenAI(base_url=server.base_url, api_key="fake")
+    pages = synthetic_pages(n_pages, random.Random(7))
+
+    for page in pages:
+        legacy_extract(client, page)
+    legacy_usage = usage.copy()
+    usage.clear()
+
+    llm.reset_cascade_stats()
+    extract_pages(client, pages)
+    report = llm.cascade_report()
+
+    print(f"{n_pages} pages, cheapest model wrong on {error_rate:.0%} of its answers")
+    for label, stats in [("legacy", legacy_usage), ("cascade", usage)]:
+        models = sorted({key.split()[0] for key in stats})
+        print(f"{label:8} " + "  ".join(f"{m}: {stats[f'{m} calls']} calls / {stats[f'{m} tokens']:,} tokens" for m in models))
+    finished = Counter()
+    for gym_name, gym_report in sorted(report.items()):
+        finished.update(gym_report["models"])
+        print(f"  {gym_name}: {gym_report['escalated']}/{gym_report['pages']} escalated "
+              f"({gym_report['escalation_rate']:.0%}), reasons {gym_report['reasons']}")
+    total = sum(finished.values())
+    print("finished on " + ", ".join(f"{m} {n / total:.0%}" for m, n in finished.most_common()))
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Bulk fact normalization: one vectorized pass over a whole run vs. normalizing page by page.
+
+Usage: python -m benchmarks.normalization [pages]
+"""
+import copy
+import random
+import sys
+import time
+
+from src.normalize import normalize_facts
+
+HOURS = ["7am", "7:30 p.m.", "19:00", "7.30pm", "19h30", "8 hrs", "06:00"]
+DATES = ["12-03-2026", "2026-03-12", "12/03/26", "05-11", ""]
+PRICES = [("S/ 1,500.00", "soles"), ("1.500", ""), ("99,90", "S/"), (250, "PEN"), ("US$ 99", ""), (120.0, "dólares")]
+PLACES = ["Av. Larco 123, Miraflores, Lima", "Av. Primavera 264, Surco", "Calle Las Begonias 415, San Isidro", "SJL", "Cercado"]
+
+
+def synthetic_extractions(n_pages: int, rng: random.Random) -> list[dict]:
+    pages = []
+    for _ in range(n_pages):
+        pages.append({
+            "horarios": [{"sede": rng.choice(PLACES), "nombre_clase": "Yoga", "instructor": "", "fecha": rng.choice(DATES),
+                          "dia_semana": rng.choice(["lunes", "MIÉRCOLES", ""]), "hora_inicio": rng.choice(HOURS),
+                          "hora_fin": rng.choice(HOURS)} for _ in range(rng.randint(0, 30))],
+            "precios": [{"sede": "Todas", "descripcion_plan": "Plan", "valor": valor, "moneda": moneda}
+                        for valor, moneda in rng.sample(PRICES, 3)],
+            "ubicaciones": [{"direccion_completa": rng.choice(PLACES), "distrito": ""}],
+            "disciplinas": [],
+        })
+    return pages
+
+
+def main():
+    n_pages = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    pages = synthetic_extractions(n_pages, random.Random(5))
+    n_facts = sum(len(facts) for page in pages for facts in page.values())
+
+    per_page = copy.deepcopy(pages)
+    start = time.perf_counter()
+    for page in per_page:
+        normalize_facts([page])
+    per_page_time = time.perf_counter() - start
+
+    bulk = copy.deepcopy(pages)
+    start = time.perf_counter()
+    normalize_facts(bulk)
+    bulk_time = time.perf_counter() - start
+
+    assert bulk == per_page, "bulk and per-page normalization differ"
+    print(f"{n_pages} pages, {n_facts:,} facts")
+    print(f"per page  {per_page_time:7.2f} s")
+    print(f"bulk      {bulk_time:7.2f} s  ({n_facts / bulk_time:,.0f} facts/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Raw page archive: on-disk size of several crawls of the same sites (zstd plus content-addressed dedup, so
+unchanged pages between runs are free), write/read throughput, and the cost of `reextract` for a run —
+reprune the archived HTML and extract it through the local OpenAI stand-in, with no browser.
+
+Pages are synthetic renders shaped like the real ones: a large shared shell (inline scripts and styles,
+nav, footer, SVG icons) around a small page-specific <main>. Between runs a fraction of pages change.
+
+Usage: python -m benchmarks.page_archive [gyms] [pages_per_gym] [runs] [changed_fraction]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("TAXONOMY_ALIASES_PATH", "")  # learned aliases would leak between runs
+
+import openai
+
+from benchmarks.fake_openai import start_fake_openai
+from src.archive import PageArchive
+from src.dataframes import init_row_buffers
+from src.scrape import archived_gym_pages, extract_gym
+from src.telemetry import finish_telemetry, start_telemetry
+
+
+def shell(gym: str, rng: random.Random) -> tuple[str, str]:
+    """Head and chrome shared by every page of a site."""
+    script = "".join(f"function f{i}(a,b){{return a.map(x=>x*{i}+b).filter(Boolean)}};" for i in range(400))
+    style = "".join(f".c{i}{{margin:{i % 7}px;padding:{i % 5}px;color:#{rng.randrange(16 ** 6):06x}}}" for i in range(600))
+    icons = "".join(f'<svg viewBox="0 0 24 24"><path d="M{i} {i}L{24 - i} 12Z"/></svg>' for i in range(12))
+    head = (f"<html><head><title>{gym}</title><style>{style}</style><script>{script}</script></head><body>"
+            f'<header class="c1">{icons}<nav>' + "".join(f'<a class="c{i}" href="/p{i}/">Link {i}</a>' for i in range(40))
+            + "</nav></header>")
+    tail = f'<footer class="c2">{icons}<p>© {gym}</p></footer><script>window.__DATA__={{"v":1}}</script></body></html>'
+    return head, tail
+
+
+def render(head: str, tail: str, gym: str, i: int, version: int, rng: random.Random) -> str:
+    body = "".join(f'<div class="c{j}"><div><p>{gym} página {i}: plan {j} S/ {50 + j * 10 + version}</p></div></div>'
+                   for j in range(rng.randint(5, 30)))
+    return f'{head}<main data-v="{version}">{body}</main>{tail}'
+
+
+def crawl(archive: PageArchive, sites: dict, versions: dict, run_id: str):
+    archive.start_run(run_id)
+    for gym, (head, tail, n_pages) in sites.items():
+        for i in range(n_pages):
+            url = {"loc": f"https://www.{gym}.example/p{i}/", "lastmod": None, "changefreq": None}
+            raw_html = render(head, tail, gym, i, versions[gym, i], random.Random(i))
+            archive.store_page(gym, "precios", url, url["loc"], raw_html, f"<main>{gym} {i} {versions[gym, i]}</main>")
+
+
+def main():
+    n_gyms = int(sys.argv[1]) if len(sys.argv) > 1 else 18
+    n_pages = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    n_runs = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+    changed = float(sys.argv[4]) if len(sys.argv) > 4 else 0.1
+    rng = random.Random(5)
+    sites = {f"gym{g}": (*shell(f"gym{g}", rng), n_pages) for g in range(n_gyms)}
+    versions = {(gym, i): 0 for gym in sites for i in range(n_pages)}
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        archive = PageArchive(tmp_dir)
+        start = time.perf_counter()
+        for run in range(n_runs):
+            for key in rng.sample(sorted(versions), int(len(versions) * changed)) if run else []:
+                versions[key] += 1
+            crawl(archive, sites, versions, f"run{run}")
+        write_s = time.perf_counter() - start
+        report = archive.report()
+        on_disk = sum(os.path.getsize(os.path.join(root, name))
+                      for root, _, names in os.walk(tmp_dir) for name in names)
+
+        start = time.perf_counter()
+        loaded = [archive.load_pages(f"run{n_runs - 1}", gym) for gym in sites]
+        read_s = time.perf_counter() - start
+        raw_mb = sum(len(page["raw_html"]) for pages in loaded for page in pages) / 1e6
+
+        fake = start_fake_openai()
+        client = openai.OpenAI(base_url=fake.base_url, api_key="fake")
+        start_telemetry()
+        row_buffers = init_row_buffers()
+        start = time.perf_counter()
+        for gym in archive.gyms(f"run{n_runs - 1}"):
+            gym_pages = archived_gym_pages(archive, f"run{n_runs - 1}", gym)
+            extract_gym(client, gym, gym_pages, row_buffers, None)
+        reextract_s = time.perf_counter() - start
+        stages = finish_telemetry()["stages"]
+        fake.shutdown()
+        archive.close()
+
+    pages = n_gyms * n_pages
+    print(f"{n_runs} runs of {pages} pages ({n_gyms} gyms), {changed:.0%} of pages changed per run")
+    print(f"archive: {report['html_bytes'] / 1e6:.1f} MB of HTML -> {on_disk / 1e6:.2f} MB on disk "
+          f"(x{report['html_bytes'] / on_disk:.0f}; {report['blobs']} blobs for {report['pages']} pages)")
+    print(f"write: {write_s / (pages * n_runs) * 1e3:.2f} ms per page; read: {raw_mb:.1f} MB of a run in {read_s:.2f}s")
+    print(f"reextract of one run: {reextract_s:.1f}s for {pages} pages "
+          f"(prune {stages['prune']['total_s']:.1f}s, extract {stages['extract']['total_s']:.1f}s, "
+          f"merge {stages['merge']['total_s']:.1f}s), no browser")
+
+
+if __name__ == "__main__":
+    main()
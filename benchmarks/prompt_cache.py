@@ -0,0 +1,69 @@
+"""
+Prompt templates: CPU to build and count one extraction prompt with the old per-call
+`(EXTRACTION_INSTRUCTIONS + EXTRACTION_TASK_TEMPLATE).format(...)` plus a full token count vs the compiled
+PromptTemplate (prefix rendered once, only the per-call part formatted and encoded), and the cached-token
+ratio per prompt template of an extraction + merge run against the local OpenAI stand-in, whose
+PrefixCache serves repeated prefixes like the provider's prompt cache.
+
+Usage: python -m benchmarks.prompt_cache [pages]
+"""
+import datetime
+import logging
+import random
+import sys
+import time
+
+import openai
+
+from benchmarks.fake_openai import start_fake_openai
+from benchmarks.request_packing import synthetic_pages
+from src.llm import (EXTRACTION_INSTRUCTIONS, EXTRACTION_PROMPT, EXTRACTION_TASK_TEMPLATE, count_prompt_tokens, count_tokens,
+                     extraction_request, merge_gym_data_with_llm)
+from src.packing import extract_pages
+from src.telemetry import start_telemetry, get_telemetry
+
+
+def old_request(page: dict, model: str) -> int:
+    prompt = (EXTRACTION_INSTRUCTIONS + EXTRACTION_TASK_TEMPLATE).format(
+        gym_name=page["gym_name"], page_url=page["page_url"], url_type=page["url_type"], html_content=page["html_content"],
+        last_mod=page["lastmod"], changefreq=page["freq"], date=datetime.date.today().strftime("%A, %d-%m-%Y").capitalize())
+    return count_tokens(prompt, model)
+
+
+def new_request(page: dict, model: str) -> int:
+    request = extraction_request(page["page_url"], page["url_type"], page["html_content"], page["gym_name"],
+                                 page["lastmod"], page["freq"], False, model, html_tokens=0)
+    return count_prompt_tokens(EXTRACTION_PROMPT.name, request["messages"][-1]["content"], model)
+
+
+def main():
+    n_pages = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    pages = synthetic_pages(n_pages, random.Random(7))
+    model = "gpt-5-nano"
+    old_request(pages[0], model), new_request(pages[0], model)  # warm up: encoder y prefijo ya cacheados
+    print(f"{n_pages} pages")
+    for label, build in [("format + full count", old_request), ("compiled template", new_request)]:
+        start = time.perf_counter()
+        tokens = sum(build(page, model) for page in pages)
+        elapsed = time.perf_counter() - start
+        print(f"{label:>20}: {elapsed / n_pages * 1e3:.2f} ms per prompt, {tokens / n_pages:,.0f} tokens per prompt")
+
+    logging.disable(logging.INFO)
+    server = start_fake_openai()
+    client = openai.OpenAI(base_url=server.base_url, api_key="fake")
+    start_telemetry(metrics_port=0)
+    extracted = extract_pages(client, pages)
+    by_gym = {}
+    for page, data in zip(pages, extracted):
+        by_gym.setdefault(page["gym_name"], {})[page["page_url"]] = data
+    for gym_name, url_to_json in by_gym.items():
+        merge_gym_data_with_llm(gym_name, url_to_json, client)
+    report = get_telemetry().report()
+    server.shutdown()
+    print(f"{server.state['requests']['chat']} calls against the simulated prefix cache")
+    for prompt, stats in report["prompt_cache"].items():
+        print(f"{prompt:>22}: {stats['cached']:,}/{stats['tokens_in']:,} prompt tokens cached ({stats['cached_ratio']:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Packed vs. one-call-per-page extraction against the local OpenAI stand-in.
+Reports calls, prompt tokens per page (tiktoken) and wall time, and checks both give the same facts.
+
+Usage: python -m benchmarks.request_packing [pages] [latency_seconds]
+"""
+import random
+import sys
+import time
+from collections import Counter
+
+import openai
+
+from benchmarks.fake_openai import default_responder, start_fake_openai
+from src.llm import extract_structured_data
+from src.packing import count_tokens, extract_pages
+
+DISCIPLINES = ["Yoga", "Pilates Reformer", "Barre", "Funcional", "Spinning", "Hatha Yoga", "Mat Pilates"]
+
+
+def synthetic_pages(n: int, rng: random.Random) -> list[dict]:
+    """Mostly short contact/discipline/pricing pages, with a timetable every tenth page."""
+    pages = []
+    for i in range(n):
+        kind = i % 10
+        if kind == 0:
+            html = "<table>" + "".join(f"<tr><td>{d}</td><td>{h}:00 - {h + 1}:00</td></tr>"
+                                       for d in DISCIPLINES for h in range(7, 12)) + "</table>"
+        elif kind < 4:
+            html = (f"<div><h2>Contacto</h2><p>Av. Larco {100 + i}, Miraflores</p><p>Teléfono 01 {rng.randint(4000000, 4999999)}</p>"
+                    f"<p>Escríbenos a hola@gym{i % 5}.pe</p>" + "<p>Síguenos en redes sociales.</p>" * rng.randint(2, 8) + "</div>")
+        elif kind < 7:
+            name = rng.choice(DISCIPLINES)
+            html = f"<div><h1>{name}</h1>" + f"<p>{name} combina respiración, fuerza y movilidad en sesiones guiadas.</p>" * rng.randint(3, 15) + "</div>"
+        else:
+            html = f"<div><h2>Planes</h2><p>Plan mensual S/ {200 + i}</p><p>Plan trimestral S/ {540 + i}</p><p>Plan anual S/ {1500 + i}</p></div>"
+        pages.append({"gym_name": f"gym{i % 5}", "page_url": f"https://gym{i % 5}.pe/page-{i}", "url_type": "iframe_content",
+                      "html_content": html, "lastmod": None, "freq": None})
+    return pages
+
+
+def main():
+    n_pages = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.2
+    usage = Counter()
+
+    def counting_responder(body: dict) -> str:
+        usage["calls"] += 1
+        usage["prompt_tokens"] += count_tokens(body["messages"][-1]["content"])
+        return default_responder(body)
+
+    server = start_fake_openai(responder=counting_responder, latency=latency)
+    client = openai.OpenAI(base_url=server.base_url, api_key="fake")
+    pages = synthetic_pages(n_pages, random.Random(7))
+
+    start = time.perf_counter()
+    single_results = [extract_structured_data(client, p["page_url"], p["url_type"], p["html_content"], p["gym_name"],
+                                              p["lastmod"], p["freq"]) for p in pages]
+    single_time = time.perf_counter() - start
+    single_usage = usage.copy()
+    usage.clear()
+
+    start = time.perf_counter()
+    packed_results = extract_pages(client, pages)
+    packed_time = time.perf_counter() - start
+
+    assert packed_results == single_results, "packed and per-page extraction differ"
+    print(f"{n_pages} pages, {latency}s simulated latency per call")
+    for label, stats, elapsed in [("per-page", single_usage, single_time), ("packed", usage, packed_time)]:
+        print(f"{label:8} {stats['calls']:4} calls  {stats['prompt_tokens']:9,} prompt tokens  "
+              f"{stats['prompt_tokens'] / n_pages:8,.0f} tokens/page  {elapsed:6.2f} s")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
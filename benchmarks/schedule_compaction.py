@@ -0,0 +1,74 @@
+"""
+Schedule compaction on a synthetic timetable: the same weekly classes scraped as dated rows from
+several frames, with some cancelled weeks. Checks that expanding the weekly rules gives back every
+original (slot, date) occurrence and reports the row counts for the export and the DB load.
+
+Usage: python -m benchmarks.schedule_compaction [weeks] [frames]
+"""
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+from src.db_utils import _fact_rows
+from src.normalize import DIAS_SEMANA, normalize_facts
+from src.schedules import compact_schedules, schedule_key
+
+CLASSES = ["Yoga Flow", "Pilates Reformer", "Barre", "Spinning", "Hatha Yoga"]
+SEDES = ["Miraflores", "San Isidro", "Surco"]
+
+
+def synthetic_schedules(weeks: int, frames: int, rng: random.Random) -> list[dict]:
+    start = date(2026, 10, 5)  # lunes
+    slots = [(sede, clase, f"Instructor {i}", day, f"{hour}:00 pm" if hour < 12 else f"{hour}:00")
+             for i, (sede, clase) in enumerate((s, c) for s in SEDES for c in CLASSES)
+             for day, hour in [(rng.randrange(7), rng.choice([7, 9, 18, 19]))]]
+    cancelled = {(slot, week) for slot in range(len(slots)) for week in range(weeks) if rng.random() < 0.1}
+    rows = []
+    for frame in range(frames):
+        for slot, (sede, clase, instructor, day, hora) in enumerate(slots):
+            for week in range(weeks):
+                if (slot, week) in cancelled:
+                    continue
+                fecha = start + timedelta(days=day, weeks=week)
+                rows.append({"sede": sede, "nombre_clase": clase, "instructor": instructor, "fecha": fecha.strftime("%d-%m-%Y"),
+                             "dia_semana": "", "hora_inicio": hora, "hora_fin": "",
+                             "fuente": f"https://gym.pe/horarios?frame={frame}"})
+    return rows
+
+
+def expand(rows: list[dict]) -> set[tuple]:
+    occurrences = set()
+    for row in rows:
+        if row.get("recurrencia") != "semanal":
+            occurrences.add((schedule_key(row), row["fecha"]))
+            continue
+        skipped = set((row.get("excepciones") or "").split(", "))
+        day = date.fromisoformat(row["fecha_inicio"])
+        while day <= date.fromisoformat(row["fecha_fin"]):
+            if day.isoformat() not in skipped:
+                occurrences.add((schedule_key(row), day.isoformat()))
+            day += timedelta(weeks=1)
+    return occurrences
+
+
+def main():
+    weeks = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    frames = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    rows = synthetic_schedules(weeks, frames, random.Random(11))
+    normalize_facts([{"horarios": rows}])
+
+    start = time.perf_counter()
+    compacted, stats = compact_schedules(rows)
+    elapsed = time.perf_counter() - start
+
+    assert expand(compacted) == expand(rows), "compaction lost or invented occurrences"
+    assert all(row["dia_semana"] in DIAS_SEMANA for row in compacted)
+    print(f"{weeks} weeks, {frames} frames: {stats['input_rows']} rows -> {stats['output_rows']} "
+          f"(x{stats['compression_ratio']}, {stats['duplicates']} duplicates, {stats['weekly_rules']} weekly rules) "
+          f"in {elapsed * 1000:.1f} ms")
+    print(f"DB rows: {len(_fact_rows('horarios', rows))} -> {len(_fact_rows('horarios', compacted))}")
+
+
+if __name__ == "__main__":
+    main()
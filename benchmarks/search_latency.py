@@ -0,0 +1,96 @@
+"""
+Latency benchmark for src.search.FactSearch over a synthetic multi-gym dataset, with a recall check: every
+query's result count is compared against the exact plan (FactSearch(exact=True)), so a fast plan that
+drops matching rows shows up. Needs the local Postgres from docker-compose; uses the offline hashing embedder.
+
+Usage: python -m benchmarks.search_latency [gyms] [schedule_rows_per_gym] [queries]
+"""
+import random
+import statistics
+import sys
+import time
+
+from benchmarks.excel_export import CLASSES, DAYS, SEDES, synthetic_gym_data
+from benchmarks.db_load import cleanup
+from src.db_utils import bulk_insert, close_pool, get_connection, init_db, pooled_connection
+from src.embeddings import HashingEmbedder, embed_pending, init_vector_schema
+from src.search import FactSearch, ensure_search_indexes
+
+QUERIES = ["yoga suave por la mañana", "pilates reformer", "plan mensual ilimitado", "sede cerca al parque",
+           "clase de barre con instructor", "spinning intenso de noche"]
+
+
+def random_search(rng: random.Random) -> tuple[str, str, dict]:
+    category = rng.choice(["horarios", "horarios", "precios", "disciplinas", "ubicaciones"])
+    filters = {}
+    if category == "horarios":
+        filters = {"distrito": rng.choice(SEDES), "dia_semana": rng.choice(DAYS)}
+        if rng.random() < 0.5:
+            start = rng.randint(6, 18)
+            filters.update(hora_desde=f"{start:02d}:00", hora_hasta=f"{start + 3:02d}:00")
+        if rng.random() < 0.5:
+            filters["disciplina"] = rng.choice(CLASSES).split()[0]
+    elif category == "precios":
+        filters = {"precio_min": rng.choice([0, 100, 200]), "precio_max": rng.choice([300, 500])}
+    elif category == "disciplinas":
+        filters = {"disciplina": rng.choice(CLASSES).split()[0]}
+    else:
+        filters = {"distrito": rng.choice(SEDES)}
+    return category, rng.choice(QUERIES), filters
+
+
+def percentiles(samples: list[float]) -> str:
+    q = statistics.quantiles(samples, n=100)
+    return f"p50 {q[49] * 1000:7.2f} ms   p95 {q[94] * 1000:7.2f} ms"
+
+
+def main():
+    n_gyms = int(sys.argv[1]) if len(sys.argv) > 1 else 18
+    schedule_rows = int(sys.argv[2]) if len(sys.argv) > 2 else 2_000
+    n_queries = int(sys.argv[3]) if len(sys.argv) > 3 else 500
+    rng = random.Random(7)
+    embedder = HashingEmbedder()
+
+    with pooled_connection() as conn:
+        init_db(conn)
+        init_vector_schema(conn, embedder.dimensions)
+        ensure_search_indexes(conn)
+    cleanup("bench-")
+    for i in range(n_gyms):
+        with pooled_connection() as conn:
+            bulk_insert(conn, f"bench-{i}", synthetic_gym_data(i, schedule_rows, rng))
+    with pooled_connection() as conn:
+        embed_pending(conn, embedder)
+        with conn.cursor() as cur:
+            cur.execute("ANALYZE;")
+        conn.commit()
+
+    searches = [random_search(rng) for _ in range(n_queries)]
+    search = FactSearch(get_connection(), embedder, cache_size=0)
+    for label, cache_size in [("cold (no cache)", 0), ("warm cache", 4096)]:
+        search.cache_size = cache_size
+        timings = []
+        for category, query, filters in searches + searches:
+            start = time.perf_counter()
+            search.search(category, query, limit=10, **filters)
+            timings.append(time.perf_counter() - start)
+        print(f"{label:<16} {percentiles(timings)}")
+    print(f"cache stats: {search.stats}")
+
+    exact = FactSearch(get_connection(), embedder, cache_size=0, exact=True)
+    search.cache_size, short, empty = 0, 0, 0
+    for category, query, filters in searches:
+        got = len(search.search(category, query, limit=10, **filters))
+        expected = len(exact.search(category, query, limit=10, **filters))
+        short += got < expected
+        empty += got == 0
+    print(f"recall vs exact plan: {short}/{len(searches)} queries returned fewer rows, {empty} returned none")
+
+    exact.conn.close()
+    search.conn.close()
+    cleanup("bench-")
+    close_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Streaming merge against the local OpenAI stand-in: time to first fact vs. full completion, and
+continuation stitching when the output is cut at a length limit.
+
+Usage: python -m benchmarks.streaming_merge [pages] [max_output_chars]
+"""
+import random
+import sys
+import time
+
+import openai
+
+from benchmarks.fake_openai import start_fake_openai
+from benchmarks.request_packing import synthetic_pages
+from src.llm import merge_gym_data_with_llm
+from src.packing import extract_pages
+
+
+def timed_merge(client: openai.OpenAI, chunked_data: dict) -> tuple[dict, float | None, float]:
+    start = time.perf_counter()
+    first_fact = []
+    merged = merge_gym_data_with_llm("gym0", chunked_data, client,
+                                     on_fact=lambda path, fact: first_fact or first_fact.append(time.perf_counter() - start))
+    return merged, (first_fact or [None])[0], time.perf_counter() - start
+
+
+def main():
+    n_pages = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    max_output_chars = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    pages = synthetic_pages(n_pages, random.Random(7))
+
+    server = start_fake_openai(chunk_delay=0.02)
+    client = openai.OpenAI(base_url=server.base_url, api_key="fake")
+    chunked_data = {page["page_url"]: data for page, data in zip(pages, extract_pages(client, pages))}
+    merged, first_fact, total = timed_merge(client, chunked_data)
+    facts = sum(len(v) for v in merged.values() if isinstance(v, list))
+    print(f"merge of {len(chunked_data)} pages: {facts} facts, first fact after {first_fact:.2f}s, "
+          f"complete after {total:.2f}s")
+    server.shutdown()
+
+    server = start_fake_openai(chunk_delay=0.02, max_output_chars=max_output_chars)
+    client = openai.OpenAI(base_url=server.base_url, api_key="fake")
+    truncated, _, total = timed_merge(client, chunked_data)
+    assert truncated == merged, "stitched output differs from the untruncated merge"
+    print(f"cut at {max_output_chars} chars: {server.state['requests']['continuations']} continuations stitched, "
+          f"same {facts} facts, {total:.2f}s")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Token ledger and budgets: a sync-shaped run (CrawlBudget-gated pages per gym, cascade extraction, merge)
+against the local OpenAI stand-in, whose cheapest model gets some timetables wrong so the cascade
+escalates, without budgets vs with a per-gym token budget. Reports tokens, pages and models per gym
+and the degradations the ledger applied.
+
+Usage: python -m benchmarks.token_budget [pages_per_gym] [gym_token_budget]
+"""
+import logging
+import random
+import sys
+from collections import Counter
+
+import openai
+
+from benchmarks.fake_openai import start_fake_openai
+from benchmarks.model_cascade import sloppy_responder
+from benchmarks.request_packing import synthetic_pages
+from src.budget import CrawlBudget
+from src.ledger import reset_ledger
+from src.llm import extract_structured_data, merge_gym_data_with_llm
+from src.telemetry import span, start_telemetry
+
+
+def run(client: openai.OpenAI, gyms: dict[str, list[dict]], gym_budget: int) -> tuple[dict, Counter]:
+    ledger = reset_ledger(run_budget=0, gym_budget=gym_budget)
+    start_telemetry(metrics_port=0)
+    pages_done = Counter()
+    for gym_name, pages in gyms.items():
+        with span("gym", gym=gym_name):
+            budget = CrawlBudget(max_pages=len(pages), gym=gym_name)
+            extracted = {}
+            for page in pages:
+                if not budget.spend():
+                    break
+                extracted[page["page_url"]] = extract_structured_data(
+                    client, page["page_url"], page["url_type"], page["html_content"], gym_name, page["lastmod"], page["freq"])
+                pages_done[gym_name] += 1
+            with span("merge"):
+                merge_gym_data_with_llm(gym_name, extracted, client)
+    return ledger.report(), pages_done
+
+
+def main():
+    pages_per_gym = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    gym_budget = int(sys.argv[2]) if len(sys.argv) > 2 else 60_000
+    logging.disable(logging.WARNING)
+    server = start_fake_openai(responder=sloppy_responder(0.5, Counter()))
+    client = openai.OpenAI(base_url=server.base_url, api_key="fake")
+    pages = synthetic_pages(pages_per_gym * 3, random.Random(7))
+    gyms = {f"gym{g}": [{**page, "gym_name": f"gym{g}"} for page in pages[g::3]] for g in range(3)}
+    print(f"{len(gyms)} gyms x {pages_per_gym} pages, cheapest model wrong on 50% of its answers")
+    for label, budget in [("no budget", 0), (f"{gym_budget:,} tokens/gym", gym_budget)]:
+        report, pages_done = run(client, gyms, budget)
+        run_tokens = report["run"]["prompt_tokens"] + report["run"]["completion_tokens"]
+        calls = ", ".join(f"{model} {stats['calls']}" for model, stats in report["by_model"].items())
+        print(f"{label}: {run_tokens:,} tokens in {report['run']['calls']} calls ({calls})")
+        for gym_name, stats in report["by_gym"].items():
+            print(f"  {gym_name}: {stats['prompt_tokens'] + stats['completion_tokens']:,} tokens, "
+                  f"{pages_done[gym_name]} pages, {stats['level']}, degraded {sum(stats['degradations'].values())}x "
+                  f"({', '.join(sorted(stats['degradations'])) or '-'})")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+CPU pool overlap: a crawl-shaped loop (browser wait per page, then Python pruning and token counting)
+run with the work inline on the main thread vs submitted to the worker pool, as collect_gym_pages and
+extract_pages do. Reports wall time, main-thread time blocked on results and pool utilization.
+
+Usage: python -m benchmarks.worker_pool [pages] [browser_wait_ms] [processes]
+"""
+import os
+import random
+import sys
+import time
+
+from benchmarks.page_archive import render, shell
+from src.llm import count_tokens
+from src.scrape import prune_html_for_llm
+from src.workers import CpuPool
+
+
+def crawl(pool: CpuPool, pages: list[str], browser_wait: float) -> tuple[float, int]:
+    start = time.perf_counter()
+    futures = []
+    for html in pages:
+        time.sleep(browser_wait)  # goto + hidratación: el hilo principal espera al navegador
+        futures.append(pool.submit(prune_html_for_llm, html))
+    pruned = [pool.result(future) for future in futures]
+    tokens = sum(pool.map(count_tokens, pruned))
+    return time.perf_counter() - start, tokens
+
+
+def main():
+    n_pages = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    browser_wait = (float(sys.argv[2]) if len(sys.argv) > 2 else 5) / 1e3
+    processes = int(sys.argv[3]) if len(sys.argv) > 3 else max((os.cpu_count() or 2) - 1, 1)
+    rng = random.Random(3)
+    head, tail = shell("gym", rng)
+    pages = [render(head, tail, "gym", i, 0, random.Random(i)) * 4 for i in range(n_pages)]  # ~200 KB, como un SPA
+
+    count_tokens("warm up")
+    print(f"{n_pages} pages of {len(pages[0]) / 1e3:.0f} KB, {browser_wait * 1e3:.0f} ms of browser wait each")
+    for label, pool in [("inline", CpuPool(0)), (f"{processes} workers", CpuPool(processes))]:
+        if pool.processes:
+            pool.map(count_tokens, ["warm up"] * processes)  # arranque de los procesos fuera de la medición
+            pool.tasks, pool.busy_s, pool.wait_s, pool.started = 0, 0.0, 0.0, time.time()
+        wall, tokens = crawl(pool, pages, browser_wait)
+        report = pool.report()
+        pool.shutdown()
+        print(f"{label:>10}: {wall:.2f}s wall, main thread blocked {report['wait_s']:.2f}s, "
+              f"{report['busy_s']:.2f}s of CPU work ({report['overlapped_s']:.2f}s off the main loop), {tokens:,} tokens")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+import hashlib
+import logging
+import os
+import sqlite3
+from datetime import datetime
+
+import zstandard
+
+from src.telemetry import count
+
+# Opcional (p. ej. data/archive): guardar el HTML crudo obliga a traerlo entero por CDP en cada frame,
+# además de la poda en el navegador. Sin archivo no hay `reextract`
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "")
+ARCHIVE_ZSTD_LEVEL = int(os.getenv("ARCHIVE_ZSTD_LEVEL", 10))
+
+ARCHIVE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    started_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS blobs (
+    sha256 TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    stored_size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pages (
+    run_id TEXT NOT NULL REFERENCES runs (run_id),
+    gym TEXT NOT NULL,
+    page_type TEXT,
+    url TEXT NOT NULL,
+    frame_url TEXT NOT NULL,
+    lastmod TEXT,
+    changefreq TEXT,
+    raw_sha256 TEXT NOT NULL REFERENCES blobs (sha256),
+    pruned_sha256 TEXT REFERENCES blobs (sha256),
+    fetched_at TEXT NOT NULL,
+    PRIMARY KEY (run_id, gym, url, frame_url)
+);
+CREATE INDEX IF NOT EXISTS pages_frame_url_idx ON pages (frame_url, run_id);
+CREATE INDEX IF NOT EXISTS pages_url_idx ON pages (url, run_id);
+"""
+
+
+class PageArchive:
+    """
+    Content-addressed archive of the rendered HTML of every fetched frame, raw and pruned.
+    Blobs are zstd-compressed under blobs/<sha256[:2]>/<sha256>.zst and written once per distinct content,
+    so a page that did not change between runs costs one index row. The SQLite index maps
+    (run, gym, url, frame) to the blob hashes, which is what `reextract` replays without a browser.
+    """
+
+    def __init__(self, directory: str = ARCHIVE_DIR, level: int = ARCHIVE_ZSTD_LEVEL):
+        self.directory = directory
+        os.makedirs(os.path.join(directory, "blobs"), exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(directory, "index.db"), check_same_thread=False)
+        self.conn.executescript(ARCHIVE_SCHEMA)
+        self._compressor = zstandard.ZstdCompressor(level=level)
+        self._decompressor = zstandard.ZstdDecompressor()
+        self.run_id = None
+
+    def start_run(self, run_id: str | None = None) -> str:
+        """Registers a new crawl; the pages stored from now on belong to it."""
+        self.run_id = run_id or datetime.now().strftime("%Y%m%dT%H%M%S")
+        with self.conn:
+            self.conn.execute("INSERT OR IGNORE INTO runs (run_id, started_at) VALUES (?, ?)",
+                              (self.run_id, datetime.now().isoformat(timespec="seconds")))
+        logging.info(f"🗄️ Archiving pages of run {self.run_id} in {self.directory}")
+        return self.run_id
+
+    def _blob_path(self, sha256: str) -> str:
+        return os.path.join(self.directory, "blobs", sha256[:2], f"{sha256}.zst")
+
+    def put(self, content: str) -> str:
+        """Stores a blob (once per distinct content) and returns its sha256."""
+        data = content.encode("utf-8")
+        sha256 = hashlib.sha256(data).hexdigest()
+        if self.conn.execute("SELECT 1 FROM blobs WHERE sha256 = ?", (sha256,)).fetchone():
+            count("archive_dedup_total")
+            return sha256
+        compressed = self._compressor.compress(data)
+        path = self._blob_path(sha256)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(compressed)
+        os.replace(tmp_path, path)
+        with self.conn:
+            self.conn.execute("INSERT OR IGNORE INTO blobs (sha256, size, stored_size) VALUES (?, ?, ?)",
+                              (sha256, len(data), len(compressed)))
+        count("archive_bytes_total", len(compressed))
+        return sha256
+
+    def get(self, sha256: str) -> str:
+        with open(self._blob_path(sha256), "rb") as f:
+            return self._decompressor.decompress(f.read()).decode("utf-8")
+
+    def store_page(self, gym: str, page_type: str, url: dict, frame_url: str, raw_html: str, pruned_html: str | None):
+        """Archives one fetched frame of `url` (a sitemap entry) in the current run."""
+        if self.run_id is None:
+            self.start_run()
+        raw_sha256 = self.put(raw_html)
+        pruned_sha256 = self.put(pruned_html) if pruned_html else None
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO pages (run_id, gym, page_type, url, frame_url, lastmod, changefreq, raw_sha256,"
+                " pruned_sha256, fetched_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (self.run_id, gym, page_type, url["loc"], frame_url, url.get("lastmod"), url.get("changefreq"),
+                 raw_sha256, pruned_sha256, datetime.now().isoformat(timespec="seconds")),
+            )
+
+    def latest_run(self) -> str | None:
+        row = self.conn.execute("SELECT run_id FROM runs ORDER BY started_at DESC, run_id DESC LIMIT 1").fetchone()
+        return row[0] if row else None
+
+    def gyms(self, run_id: str) -> list[str]:
+        """Gimnasios del run en el orden en que se descargaron."""
+        rows = self.conn.execute("SELECT gym FROM pages WHERE run_id = ? GROUP BY gym ORDER BY MIN(rowid)", (run_id,))
+        return [gym for gym, in rows]
+
+    def load_pages(self, run_id: str, gym: str) -> list[dict]:
+        """Páginas archivadas de un gimnasio con su HTML crudo, en el orden original."""
+        rows = self.conn.execute(
+            "SELECT page_type, url, frame_url, lastmod, changefreq, raw_sha256 FROM pages"
+            " WHERE run_id = ? AND gym = ? ORDER BY rowid",
+            (run_id, gym),
+        ).fetchall()
+        return [{"page_type": page_type, "url": url, "frame_url": frame_url, "lastmod": lastmod,
+                 "changefreq": changefreq, "raw_html": self.get(raw_sha256)}
+                for page_type, url, frame_url, lastmod, changefreq, raw_sha256 in rows]
+
+    def history(self, frame_url: str) -> list[dict]:
+        """Versiones archivadas de una página (run, hashes) de la más antigua a la más reciente."""
+        rows = self.conn.execute(
+            "SELECT run_id, gym, url, raw_sha256, pruned_sha256, fetched_at FROM pages WHERE frame_url = ? ORDER BY run_id",
+            (frame_url,),
+        )
+        return [dict(zip(("run_id", "gym", "url", "raw_sha256", "pruned_sha256", "fetched_at"), row)) for row in rows]
+
+    def report(self) -> dict[str, float]:
+        pages, runs = self.conn.execute("SELECT COUNT(*), COUNT(DISTINCT run_id) FROM pages").fetchone()
+        blobs, size, stored_size = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(stored_size), 0) FROM blobs").fetchone()
+        referenced = self.conn.execute(
+            "SELECT COALESCE(SUM(b.size), 0) FROM pages p JOIN blobs b ON b.sha256 IN (p.raw_sha256, p.pruned_sha256)"
+        ).fetchone()[0]
+        return {"runs": runs, "pages": pages, "blobs": blobs, "html_bytes": referenced, "unique_bytes": size,
+                "stored_bytes": stored_size, "ratio": round(referenced / stored_size, 1) if stored_size else 0.0}
+
+    def close(self):
+        self.conn.close()
+
+
+def open_archive() -> PageArchive | None:
+    """El archivo configurado por ARCHIVE_DIR, o None si está desactivado."""
+    return PageArchive(ARCHIVE_DIR) if ARCHIVE_DIR else None
@@ -0,0 +1,213 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+
+import openai
+
+from src.llm import (
+    EXTRACTION_CASCADE,
+    empty_extraction,
+    extract_structured_data,
+    extraction_request,
+    parse_extraction_response,
+    record_extraction,
+)
+from src.ledger import get_ledger
+from src.packing import packed_extraction_request, page_token_counts, plan_packs, split_packed_response
+from src.telemetry import record_usage, span
+from src.validation import extraction_problems, looks_like_schedule
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+MAX_REQUESTS_PER_BATCH = 50_000
+BATCH_POLL_INTERVAL = float(os.getenv("BATCH_POLL_INTERVAL", 60))
+BATCH_TIMEOUT = float(os.getenv("BATCH_TIMEOUT", 24 * 3600))
+FINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+def write_batch_file(requests: dict[str, dict], path: str) -> None:
+    """One JSONL line per request, as expected by the Batch API."""
+    with open(path, "w", encoding="utf-8") as f:
+        for custom_id, body in requests.items():
+            line = {"custom_id": custom_id, "method": "POST", "url": BATCH_ENDPOINT, "body": body}
+            f.write(json.dumps(line, ensure_ascii=False) + "\n")
+
+
+def submit_batch(client: openai.OpenAI, path: str, description: str = "") -> str:
+    with open(path, "rb") as f:
+        input_file = client.files.create(file=f, purpose="batch")
+    batch = client.batches.create(
+        input_file_id=input_file.id,
+        endpoint=BATCH_ENDPOINT,
+        completion_window="24h",
+        metadata={"description": description} if description else None,
+    )
+    logging.info(f"📦 Submitted batch {batch.id} ({description})")
+    return batch.id
+
+
+def wait_for_batch(client: openai.OpenAI, batch_id: str, poll_interval: float | None = None,
+                   timeout: float | None = None):
+    poll_interval = poll_interval or BATCH_POLL_INTERVAL
+    timeout = timeout or BATCH_TIMEOUT
+    deadline = time.monotonic() + timeout
+    while True:
+        batch = client.batches.retrieve(batch_id)
+        if batch.status in FINAL_STATUSES:
+            logging.info(f"📦 Batch {batch_id} finished with status '{batch.status}': {batch.request_counts}")
+            return batch
+        if time.monotonic() > deadline:
+            logging.warning(f"⚠️ Batch {batch_id} still '{batch.status}' after {timeout}s, cancelling")
+            client.batches.cancel(batch_id)
+            return client.batches.retrieve(batch_id)
+        time.sleep(poll_interval)
+
+
+def read_batch_results(client: openai.OpenAI, batch, gyms: dict[str, str] | None = None) -> dict[str, str | None]:
+    """
+    custom_id -> message content, for every request that completed successfully.
+    `gyms` (custom_id -> gym) attributes the usage of each request in the token ledger.
+    """
+    results = {}
+    if not batch.output_file_id:
+        return results
+    for line in client.files.content(batch.output_file_id).text.splitlines():
+        if not line.strip():
+            continue
+        item = json.loads(line)
+        response = item.get("response") or {}
+        if item.get("error") or response.get("status_code") != 200:
+            logging.warning(f"⚠️ Batch request {item.get('custom_id')} failed: {item.get('error') or response.get('body')}")
+            continue
+        record_usage(response["body"].get("model"), response["body"].get("usage"),
+                     gym=(gyms or {}).get(item["custom_id"]), stage="batch_extract")
+        results[item["custom_id"]] = response["body"]["choices"][0]["message"]["content"]
+    return results
+
+
+def run_batch(client: openai.OpenAI, requests: dict[str, dict], description: str = "",
+              gyms: dict[str, str] | None = None) -> dict[str, str | None]:
+    """
+    Submits `requests` (custom_id -> chat.completions body) as one or more batch jobs, waits for all of them
+    and returns custom_id -> content. Requests that failed or did not finish are missing from the result.
+    `gyms` (custom_id -> gym) is passed on to read_batch_results.
+    """
+    if not requests:
+        return {}
+    items = list(requests.items())
+    batch_ids = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for part, start in enumerate(range(0, len(items), MAX_REQUESTS_PER_BATCH)):
+            path = os.path.join(tmp_dir, f"batch-{part}.jsonl")
+            write_batch_file(dict(items[start:start + MAX_REQUESTS_PER_BATCH]), path)
+            batch_ids.append(submit_batch(client, path, description))
+    results = {}
+    for batch_id in batch_ids:
+        with span("batch_wait", batch=batch_id):
+            batch = wait_for_batch(client, batch_id)
+        if batch.status == "failed":
+            logging.error(f"❌ Batch {batch_id} failed: {batch.errors}")
+        results |= read_batch_results(client, batch, gyms)
+    return results
+
+
+def _complete_missing(client: openai.OpenAI, requests: dict[str, dict], results: dict[str, str | None],
+                      gyms: dict[str, str] | None = None) -> None:
+    """Synchronous fallback for the requests a batch did not answer."""
+    missing = [custom_id for custom_id in requests if custom_id not in results]
+    if missing:
+        logging.warning(f"⚠️ {len(missing)} batch requests missing, completing them synchronously")
+    for custom_id in missing:
+        try:
+            with span("llm", model=requests[custom_id]["model"]):
+                completion = client.chat.completions.create(**requests[custom_id])
+                record_usage(requests[custom_id]["model"], completion.usage, requests[custom_id].get("prompt_cache_key"),
+                             gym=(gyms or {}).get(custom_id), stage="batch_extract")
+            results[custom_id] = completion.choices[0].message.content
+        except Exception as e:
+            logging.error(f"     ❌ An error occurred calling OpenAI: {e}")
+            results[custom_id] = None
+
+
+def batch_extract_pages(client: openai.OpenAI, pages: list[dict]) -> list[dict]:
+    """
+    Batch counterpart of extract_structured_data for a whole run.
+    `pages` are dicts with gym_name, page_url, url_type, html_content, lastmod and freq.
+    Runs one batch job per level of EXTRACTION_CASCADE: everything on the cheapest model first, then
+    only the pages whose output failed validation on the next one.
+    Identical pages (same iframe reached from several URLs) are sent once, and small pages are
+    packed several per request in the first job (see src.packing). Pages of gyms over their token
+    budget are not escalated.
+    Returns the extracted data for each page, in the same order.
+    """
+    page_keys = [hashlib.md5(json.dumps(page, sort_keys=True).encode("utf-8")).hexdigest() for page in pages]
+    unique = dict(zip(page_keys, pages))
+    keys = list(unique)
+    page_tokens = dict(zip(keys, page_token_counts(list(unique.values()))))
+    packs, singles = plan_packs(list(unique.values()), page_tokens=list(page_tokens.values()))
+    logging.info(f"📦 Batch extraction for {len(pages)} pages ({len(unique)} unique, "
+                 f"{sum(len(pack) for pack in packs)} packed into {len(packs)} requests)")
+
+    def page_request(key: str, model: str) -> dict:
+        page = unique[key]
+        return extraction_request(page["page_url"], page["url_type"], page["html_content"], page["gym_name"],
+                                  page["lastmod"], page["freq"], looks_like_schedule(page["html_content"]), model,
+                                  page_tokens[key])
+
+    extracted: dict[str, dict | None] = {}
+    problems: dict[str, list[str]] = {}  # key -> failures of the attempts that led to escalation
+    final_model = {}
+    pending = [keys[i] for i in singles]
+    pack_pages = {f"pack-{n}": [unique[keys[i]] for i in pack] for n, pack in enumerate(packs)}
+    gyms = {key: page["gym_name"] for key, page in unique.items()} | {
+        pack_id: group[0]["gym_name"] for pack_id, group in pack_pages.items()}
+    held = set()  # páginas que fallaron la validación pero no escalan por el presupuesto de tokens
+    for level, model in enumerate(EXTRACTION_CASCADE):
+        requests = {key: page_request(key, model) for key in pending}
+        if level == 0:
+            requests |= {pack_id: packed_extraction_request(group) for pack_id, group in pack_pages.items()}
+        if not requests:
+            break
+        contents = run_batch(client, requests, f"extraction ({model})", gyms)
+        _complete_missing(client, requests, contents, gyms)
+
+        for key in pending:
+            try:
+                extracted[key] = parse_extraction_response(contents.get(key), unique[key]["page_url"])
+            except Exception as e:
+                logging.error(f"     ❌ Invalid extraction output for {unique[key]['page_url']}: {e}")
+                extracted[key] = None
+            final_model[key] = model
+        if level == 0:
+            for (pack_id, group), pack in zip(pack_pages.items(), packs):
+                try:
+                    split = split_packed_response(contents.get(pack_id), group)
+                except Exception as e:
+                    logging.error(f"     ❌ Invalid packed extraction output for {pack_id}: {e}")
+                    split = [None] * len(group)
+                for i, page_data in zip(pack, split):
+                    extracted[keys[i]] = page_data
+                    final_model[keys[i]] = model
+                    pending.append(keys[i])
+
+        failed = {key: extraction_problems(extracted[key], unique[key]["html_content"]) for key in pending}
+        pending = [key for key, key_problems in failed.items() if key_problems]
+        if level + 1 < len(EXTRACTION_CASCADE):
+            held |= {key for key in pending if not get_ledger().allow_escalation(unique[key]["gym_name"])}
+            pending = [key for key in pending if key not in held]
+            for key in pending:
+                problems.setdefault(key, []).extend(failed[key])
+            if pending:
+                logging.info(f"⬆️ Escalating {len(pending)} pages to {EXTRACTION_CASCADE[level + 1]}")
+
+    for key in keys:
+        page = unique[key]
+        if extracted[key] is None:
+            # Sin respuesta utilizable ni en el último nivel: extracción síncrona (registra su propio resultado)
+            extracted[key] = extract_structured_data(client, page["page_url"], page["url_type"], page["html_content"],
+                                                     page["gym_name"], page["lastmod"], page["freq"]) or empty_extraction()
+            continue
+        record_extraction(page["gym_name"], final_model[key], problems.get(key, []), accepted=key not in pending and key not in held)
+    return [extracted[key] for key in page_keys]
@@ -0,0 +1,204 @@
+import logging
+import os
+from collections import Counter
+from contextlib import contextmanager
+
+from playwright.sync_api import Browser, BrowserContext, Page, Playwright
+
+from src.telemetry import count, gauge
+
+BROWSER_PAGES_PER_CONTEXT = int(os.getenv("BROWSER_PAGES_PER_CONTEXT", 25))
+BROWSER_PAGES_PER_BROWSER = int(os.getenv("BROWSER_PAGES_PER_BROWSER", 200))
+BROWSER_MAX_RSS_MB = int(os.getenv("BROWSER_MAX_RSS_MB", 1_500))  # 0 desactiva el reciclaje por memoria
+BROWSER_CONTEXT_POOL = int(os.getenv("BROWSER_CONTEXT_POOL", 2))  # contextos libres que se conservan
+
+
+def _descendants(root_pid: int) -> list[int]:
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "rb") as f:
+                ppid = int(f.read().rsplit(b")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    pids, pending = [], [root_pid]
+    while pending:
+        for child in children.get(pending.pop(), []):
+            pids.append(child)
+            pending.append(child)
+    return pids
+
+
+def browser_rss_mb() -> float | None:
+    """RSS of the Chromium processes started by this process (read from /proc); None where there is no /proc."""
+    if not os.path.isdir("/proc"):
+        return None
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    total = 0
+    for pid in _descendants(os.getpid()):
+        try:
+            with open(f"/proc/{pid}/cmdline", "rb") as f:
+                if b"chrom" not in f.read():
+                    continue
+            with open(f"/proc/{pid}/statm") as f:
+                total += int(f.read().split()[1]) * page_size
+        except (OSError, IndexError, ValueError):
+            continue
+    return total / 1e6
+
+
+class ManagedContext:
+    """
+    A pooled BrowserContext handed out by BrowserManager. Exposes `new_page()` like a Browser or a
+    BrowserContext, so it can be passed to collect_gym_pages; every new page goes through the manager,
+    which may recycle the context or the whole browser (or relaunch a crashed one) first.
+    """
+
+    def __init__(self, manager: "BrowserManager"):
+        self.manager = manager
+        self.context: BrowserContext | None = None
+        self.pages = 0  # páginas abiertas en el contexto actual
+
+    def new_page(self) -> Page:
+        return self.manager.new_page(self)
+
+    def close(self):
+        if self.context is not None:
+            try:
+                self.context.close()
+            except Exception as e:
+                logging.warning(f"⚠️ Could not close browser context: {e}")
+        self.context, self.pages = None, 0
+
+
+class BrowserManager:
+    """
+    Owns the Chromium of a run. Contexts are isolated per checkout and pooled: a released context is
+    reused until it has opened BROWSER_PAGES_PER_CONTEXT pages, then closed and replaced. The browser
+    itself is relaunched after BROWSER_PAGES_PER_BROWSER pages or when its processes go over
+    BROWSER_MAX_RSS_MB, always between pages (never with a page open), and transparently when it crashes.
+    Launches, recycles, restarts and RSS go to telemetry and `report()`.
+    """
+
+    def __init__(self, playwright: Playwright, headless: bool = True, pages_per_context: int = BROWSER_PAGES_PER_CONTEXT,
+                 pages_per_browser: int = BROWSER_PAGES_PER_BROWSER, max_rss_mb: int = BROWSER_MAX_RSS_MB,
+                 pool_size: int = BROWSER_CONTEXT_POOL):
+        self.playwright = playwright
+        self.headless = headless
+        self.pages_per_context = pages_per_context
+        self.pages_per_browser = pages_per_browser
+        self.max_rss_mb = max_rss_mb
+        self.pool_size = pool_size
+        self.browser: Browser | None = None
+        self.idle: list[ManagedContext] = []
+        self.contexts: set[ManagedContext] = set()  # todos los entregados por el manager, libres o en uso
+        self.open_pages = 0
+        self.browser_pages = 0  # páginas abiertas desde el último lanzamiento
+        self.peak_rss_mb = 0.0
+        self.stats = Counter()
+        self._closing = False
+
+    def _launch(self, reason: str):
+        self.browser = self.playwright.chromium.launch(headless=self.headless)
+        self.browser.on("disconnected", self._on_disconnected)
+        self.browser_pages = 0
+        self.stats["launches"] += 1
+        if reason != "start":
+            self.stats[f"restarts_{reason}"] += 1
+            count("browser_restarts_total", reason=reason)
+            logging.warning(f"♻️ Browser relaunched ({reason})")
+
+    def _on_disconnected(self, _browser):
+        if not self._closing:
+            self.stats["crashes"] += 1
+            logging.error("💥 Browser disconnected unexpectedly")
+
+    def _close_browser(self):
+        for managed in self.contexts:
+            managed.context, managed.pages = None, 0  # los contextos mueren con el navegador
+        if self.browser is not None:
+            self._closing = True
+            try:
+                self.browser.close()
+            except Exception as e:
+                logging.warning(f"⚠️ Could not close browser: {e}")
+            finally:
+                self._closing = False
+        self.browser = None
+        self.open_pages = 0
+
+    def _ensure_browser(self):
+        """Launches, relaunches after a crash, or recycles the browser if it is due and no page is open."""
+        if self.browser is None:
+            self._launch("start")
+            return
+        if not self.browser.is_connected():
+            self._close_browser()
+            self._launch("crash")
+            return
+        rss = browser_rss_mb() if self.max_rss_mb else None
+        if rss is not None:
+            self.peak_rss_mb = max(self.peak_rss_mb, rss)
+            gauge("browser_rss_mb", round(rss, 1))
+        if self.open_pages:
+            return
+        if self.pages_per_browser and self.browser_pages >= self.pages_per_browser:
+            self._close_browser()
+            self._launch("pages")
+        elif rss is not None and rss > self.max_rss_mb:
+            logging.info(f"🧠 Browser RSS {rss:.0f} MB over {self.max_rss_mb} MB")
+            self._close_browser()
+            self._launch("rss")
+
+    def new_page(self, managed: ManagedContext) -> Page:
+        self._ensure_browser()
+        if managed.context is not None and managed.pages >= self.pages_per_context and not self.open_pages:
+            managed.close()
+            self.stats["contexts_recycled"] += 1
+            count("browser_contexts_recycled_total")
+        if managed.context is None:
+            managed.context = self.browser.new_context()
+            self.stats["contexts"] += 1
+        page = managed.context.new_page()
+        managed.pages += 1
+        self.browser_pages += 1
+        self.open_pages += 1
+        self.stats["pages"] += 1
+        count("browser_pages_total")
+        page.on("close", self._on_page_close)
+        return page
+
+    def _on_page_close(self, _page):
+        self.open_pages = max(self.open_pages - 1, 0)
+
+    @contextmanager
+    def context(self):
+        """`with manager.context() as context:` an isolated context from the pool, returned to it afterwards."""
+        managed = self.idle.pop() if self.idle else ManagedContext(self)
+        self.contexts.add(managed)
+        try:
+            yield managed
+        finally:
+            if len(self.idle) < self.pool_size:
+                self.idle.append(managed)
+            else:
+                managed.close()
+                self.contexts.discard(managed)
+
+    def report(self) -> dict[str, float]:
+        return {**self.stats, "peak_rss_mb": round(self.peak_rss_mb, 1)}
+
+    def close(self) -> dict[str, float]:
+        for managed in list(self.contexts):
+            managed.close()
+        self.idle.clear()
+        self.contexts.clear()
+        self._close_browser()
+        report = self.report()
+        logging.info(f"🌐 Browser: {report.get('pages', 0)} pages in {report.get('contexts', 0)} contexts, "
+                     f"{report.get('launches', 0)} launches ({report.get('crashes', 0)} crashes), "
+                     f"peak RSS {report['peak_rss_mb']:.0f} MB")
+        return report
@@ -0,0 +1,118 @@
+import logging
+import os
+import time
+from collections import Counter
+
+from src.db_utils import FACT_TABLES, key_hash
+from src.ledger import DEGRADED, EXHAUSTED, get_ledger
+from src.telemetry import count
+
+# Categorías de categorize_urls_with_llm, de la que más hechos aporta a la que menos; el resto va al final.
+# El homepage va primero: es la única página que todo gimnasio tiene y suele resumir sedes y precios
+CRAWL_CATEGORY_ORDER = [c.strip() for c in os.getenv("CRAWL_CATEGORY_ORDER",
+                                                     "homepage,schedules,pricing,locations,disciplines").split(",") if c.strip()]
+GYM_MAX_PAGES = int(os.getenv("GYM_MAX_PAGES", 60))  # URLs por gimnasio; 0 sin límite
+GYM_MAX_SECONDS = float(os.getenv("GYM_MAX_SECONDS", 0))  # segundos de crawl por gimnasio; 0 sin límite
+SATURATION_PATIENCE = int(os.getenv("SATURATION_PATIENCE", 4))  # URLs seguidas sin hechos nuevos que cierran una categoría
+SATURATION_WINDOW = int(os.getenv("SATURATION_WINDOW", 4))  # URLs descargadas entre extracciones
+
+
+def _priority(url: dict) -> float:
+    try:
+        return float(url.get("priority") or 0.5)  # 0.5 es el valor por defecto del protocolo sitemap
+    except (TypeError, ValueError):
+        return 0.5
+
+
+def order_gym_urls(categorized: dict[str, list[dict]]) -> list[tuple[str, dict]]:
+    """
+    (category, url) pairs in crawl order: categories by CRAWL_CATEGORY_ORDER, then sitemap `priority`
+    (highest first) and `lastmod` (newest first) within a category. A URL listed under several categories
+    is crawled once, under the most relevant one.
+    """
+    rank = {category: n for n, category in enumerate(CRAWL_CATEGORY_ORDER)}
+    seen, ordered = set(), []
+    for category in sorted(categorized, key=lambda c: rank.get(c, len(rank))):
+        urls = sorted(categorized[category], key=lambda u: str(u.get("lastmod") or ""), reverse=True)
+        urls = sorted(urls, key=lambda u: -_priority(u))  # estable: a igual prioridad queda lo más reciente primero
+        for url in urls:
+            if url["loc"] not in seen:
+                seen.add(url["loc"])
+                ordered.append((category, url))
+    return ordered
+
+
+class CrawlBudget:
+    """
+    Pages and seconds a gym may spend crawling (GYM_MAX_PAGES, GYM_MAX_SECONDS). With `gym`, the token
+    ledger's budgets apply too: half the pages once the gym is degraded, none once it is exhausted.
+    """
+
+    def __init__(self, max_pages: int = GYM_MAX_PAGES, max_seconds: float = GYM_MAX_SECONDS, gym: str | None = None):
+        self.max_pages = max_pages
+        self.gym = gym
+        self.max_seconds = max_seconds
+        self.started = time.monotonic()
+        self.pages = 0
+        self.exhausted = False
+
+    def spend(self) -> bool:
+        """Takes one page from the budget; False once it is exhausted."""
+        max_pages, tokens = self.max_pages, get_ledger().level(self.gym) if self.gym is not None else None
+        if tokens == DEGRADED and max_pages:
+            max_pages = max(max_pages // 2, 1)
+        if tokens == EXHAUSTED or (max_pages and self.pages >= max_pages) or \
+                (self.max_seconds and time.monotonic() - self.started >= self.max_seconds):
+            if not self.exhausted:
+                logging.info(f"💸 Crawl budget exhausted after {self.pages} pages "
+                             f"({time.monotonic() - self.started:.0f}s)" + (f", token budget {tokens}" if tokens in (DEGRADED, EXHAUSTED) else ""))
+                count("crawl_budget_exhausted_total")
+                if tokens in (DEGRADED, EXHAUSTED):
+                    get_ledger().degrade(self.gym, f"crawl:{self.pages}_pages")
+            self.exhausted = True
+            return False
+        self.pages += 1
+        return True
+
+
+class FactSaturation:
+    """
+    New-unique-fact yield per crawled URL. Facts are identified by their natural key (db_utils.key_hash),
+    across all categories of the gym; a category is saturated once SATURATION_PATIENCE consecutive URLs
+    in it brought nothing new.
+    """
+
+    def __init__(self, patience: int = SATURATION_PATIENCE):
+        self.patience = patience
+        self.seen = set()
+        self.dry_streak = Counter()  # categoría -> URLs seguidas sin hechos nuevos
+        self.stats = Counter()
+
+    def observe(self, category: str, extracted_pages: list[dict | None]) -> int:
+        """Records the extraction of one URL (all its frames); returns how many new facts it brought."""
+        new = 0
+        for extracted in extracted_pages:
+            for table, facts in (extracted or {}).items():
+                if table not in FACT_TABLES:
+                    continue
+                for fact in facts:
+                    key = (table, key_hash(table, fact))
+                    if key not in self.seen:
+                        self.seen.add(key)
+                        new += 1
+        self.dry_streak[category] = 0 if new else self.dry_streak[category] + 1
+        self.stats["urls"] += 1
+        self.stats["new_facts"] += new
+        self.stats["dry_urls"] += not new
+        return new
+
+    def saturated(self, category: str) -> bool:
+        return bool(self.patience) and self.dry_streak[category] >= self.patience
+
+    def close(self, category: str, skipped: int):
+        """Logs a category stopped early, with the URLs it leaves uncrawled."""
+        self.stats["saturated_categories"] += 1
+        self.stats["skipped_urls"] += skipped
+        count("saturation_skipped_urls_total", skipped, category=category)
+        logging.info(f"🧮 {category}: {self.dry_streak[category]} URLs in a row without new facts, "
+                     f"skipping the remaining {skipped}")
@@ -1,107 +1,137 @@
+import json
+import os
+import tempfile
 from datetime import datetime
-from io import BytesIO
 
 import pandas as pd
 from dotenv import load_dotenv
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Alignment
 from openpyxl.utils import get_column_letter
 
 from src.drive_uploader import upload_file
+from src.telemetry import count, span
 
+# category -> (sheet name, base columns). Sheet order follows this dict.
+SHEETS = {
+    "disciplinas": ("Disciplinas", ["nombre_gym", "nombre", "disciplina_id", "sede", "descripcion", "fuente"]),
+    "ubicaciones": ("Sedes", ["nombre_gym", "direccion_completa", "distrito", "horario_atencion", "fuente"]),
+    "horarios": ("Horarios", ["nombre_gym", "sede", "nombre_clase", "disciplina_id", "instructor", "fecha", "dia_semana", "hora_inicio", "hora_fin",
+                             "recurrencia", "fecha_inicio", "fecha_fin", "excepciones", "fuente"]),
+    "precios": ("Precios", ["nombre_gym", "sede", "descripcion_plan", "valor", "moneda", "recurrencia", "fuente"]),
+}
+MAX_COLUMN_WIDTH = 50
+XLSX_MIMETYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
 
-def init_dataframes():
-    """Initialize empty dataframes for all sheets."""
-    df_disciplines = pd.DataFrame(columns=["nombre_gym", "nombre", "sede", "descripcion", "fuente"])
-    df_places = pd.DataFrame(columns=["nombre_gym", "direccion_completa", "distrito", "horario_atencion", "fuente"])
-    df_schedules = pd.DataFrame(columns=["nombre_gym", "sede", "nombre_clase", "instructor", "fecha", "dia_semana", "hora_inicio", "hora_fin", "fuente"])
-    df_prices = pd.DataFrame(columns=["nombre_gym", "sede", "descripcion_plan", "valor", "moneda", "recurrencia", "fuente"])
-    return df_disciplines, df_places, df_schedules, df_prices
 
+def init_row_buffers() -> dict[str, list[dict]]:
+    """Initialize empty append-only row buffers, one per sheet category."""
+    return {category: [] for category in SHEETS}
 
-def append_scraped_data(df_disciplines, df_places, df_schedules, df_prices, gym_name, scraped):
+
+def append_scraped_data(buffers: dict[str, list[dict]], gym_name: str, scraped: dict) -> dict[str, list[dict]]:
     """
-    Append scraped dict data for one gym into the master dataframes.
-    scraped = { "horarios": [...], "precios": [...], "disciplinas": [...] }
+    Append scraped dict data for one gym into the row buffers.
+    scraped = { "ubicaciones": [...], "horarios": [...], "precios": [...], "disciplinas": [...] }
+    Rows are only copied once here; sheets are built once at export time.
     """
-    # Sedes
-    if "ubicaciones" in scraped:
-        temp = pd.DataFrame(scraped["ubicaciones"])
-        temp["nombre_gym"] = gym_name
-        df_places = pd.concat([df_places, temp], ignore_index=True)
-
-    # Disciplines
-    if "disciplinas" in scraped:
-        temp = pd.DataFrame(scraped["disciplinas"])
-        temp["nombre_gym"] = gym_name
-        df_disciplines = pd.concat([df_disciplines, temp], ignore_index=True)
-
-    # Schedules (horarios)
-    if "horarios" in scraped:
-        temp = pd.DataFrame(scraped["horarios"])
-        temp["nombre_gym"] = gym_name
-        df_schedules = pd.concat([df_schedules, temp], ignore_index=True)
-
-    # Prices (precios)
-    if "precios" in scraped:
-        temp = pd.DataFrame(scraped["precios"])
-        temp["nombre_gym"] = gym_name
-        df_prices = pd.concat([df_prices, temp], ignore_index=True)
-
-    return df_disciplines, df_places, df_schedules, df_prices
-
+    for category, rows in buffers.items():
+        for fact in scraped.get(category) or []:
+            if isinstance(fact, dict):
+                rows.append({**fact, "nombre_gym": gym_name})
+    return buffers
+
+
+def sheet_columns(category: str, rows: list[dict]) -> list[str]:
+    """Base columns of the sheet followed by any extra keys found in the rows (in first-seen order)."""
+    columns = list(SHEETS[category][1])
+    seen = set(columns)
+    for row in rows:
+        for key in row:
+            if key not in seen:
+                seen.add(key)
+                columns.append(key)
+    return columns
+
+
+def build_dataframes(buffers: dict[str, list[dict]]) -> dict[str, pd.DataFrame]:
+    """Build each category DataFrame once from its buffered rows."""
+    return {
+        category: pd.DataFrame(rows, columns=sheet_columns(category, rows))
+        for category, rows in buffers.items()
+    }
 
-def create_excel_in_memory(df_disciplines, df_places, df_schedules, df_prices):
-    output = BytesIO()
 
-    with pd.ExcelWriter(output, engine="openpyxl") as writer:
-        df_disciplines.to_excel(writer, sheet_name="Disciplinas", index=False)
-        df_places.to_excel(writer, sheet_name="Sedes", index=False)
-        df_schedules.to_excel(writer, sheet_name="Horarios", index=False)
-        df_prices.to_excel(writer, sheet_name="Precios", index=False)
+def _cell_value(value):
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
 
-        autofit_excel(writer, ["Disciplinas", "Sedes", "Horarios", "Precios"])
 
-    output.seek(0)  # rewind file pointer
-    return output.getvalue()
+def column_widths(columns: list[str], rows: list[list]) -> list[int]:
+    """Compute column widths from the buffered values instead of walking worksheet cells."""
+    widths = [len(str(column)) for column in columns]
+    for row in rows:
+        for idx, value in enumerate(row):
+            if value is not None and value != "":
+                length = len(str(value))
+                if length > widths[idx]:
+                    widths[idx] = length
+    return [min(width + 2, MAX_COLUMN_WIDTH) for width in widths]  # cap at 50 for safety
 
 
-def export_and_upload(df_disciplines, df_places, df_schedules, df_prices, folder_id):
+def write_excel(buffers: dict[str, list[dict]], output) -> None:
+    """
+    Write all sheets to `output` (path or binary file object) using openpyxl write-only mode.
+    Only cells longer than their column width get a wrap-text style, the rest are streamed as plain values.
+    """
+    wb = Workbook(write_only=True)
+    wrap = Alignment(wrap_text=True)
+
+    for category, (sheet_name, _) in SHEETS.items():
+        rows = buffers.get(category, [])
+        columns = sheet_columns(category, rows)
+        values = [[_cell_value(row.get(column)) for column in columns] for row in rows]
+        widths = column_widths(columns, values)
+
+        ws = wb.create_sheet(sheet_name)
+        for col_idx, width in enumerate(widths, 1):
+            ws.column_dimensions[get_column_letter(col_idx)].width = width
+
+        ws.append(columns)
+        for row in values:
+            cells = []
+            for idx, value in enumerate(row):
+                if isinstance(value, str) and len(value) + 2 > widths[idx]:
+                    cell = WriteOnlyCell(ws, value=value)
+                    cell.alignment = wrap
+                    cells.append(cell)
+                else:
+                    cells.append(value)
+            ws.append(cells)
+
+    wb.save(output)
+
+
+def export_and_upload(buffers: dict[str, list[dict]], folder_id):
     # 1. Filename with today's date
     filename = f"gyms-data-{datetime.now().strftime('%Y-%m-%d')}.xlsx"
 
-    # 2. Create Excel in memory
-    excel_bytes = create_excel_in_memory(df_disciplines, df_places, df_schedules, df_prices)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # 2. Stream Excel to a temporary file
+        path = os.path.join(tmp_dir, filename)
+        with span("export", rows=sum(len(rows) for rows in buffers.values())):
+            write_excel(buffers, path)
 
-    # 3. Upload
-    mimetype = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-    response = upload_file(excel_bytes, filename, mimetype, folder_id)
+        # 3. Upload, streamed from disk
+        with span("upload", bytes=os.path.getsize(path)):
+            response = upload_file(path, filename, XLSX_MIMETYPE, folder_id)
+        count("bytes_uploaded_total", os.path.getsize(path))
 
     return response
 
 
-def autofit_excel(writer, sheet_names):
-    """Auto-fit columns & wrap text in all sheets."""
-    for sheet_name in sheet_names:
-        ws = writer.book[sheet_name]
-
-        # Auto-fit column widths
-        for col_idx, col in enumerate(ws.columns, 1):
-            max_length = 0
-            for cell in col:
-                try:
-                    if cell.value:
-                        max_length = max(max_length, len(str(cell.value)))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)  # cap at 50 for safety
-            ws.column_dimensions[get_column_letter(col_idx)].width = adjusted_width
-
-        # Enable wrap text for all cells
-        for row in ws.iter_rows():
-            for cell in row:
-                cell.alignment = Alignment(wrap_text=True)
-
-
 if __name__ == "__main__":
     load_dotenv("../.env")
     data = {
@@ -110,9 +140,9 @@ if __name__ == "__main__":
                       "fuente": "https://gym.com/clases/yoga-1"}],
         "precios": [{"sede": "Todas", "descripcion_plan": "plan 1", "valor": 1000, "moneda": "PEN", "recurrencia": "anual", "fuente": "https://gym.com/precios/1"}]
     }
-    df_disciplines, df_places, df_schedules, df_prices = init_dataframes()
-    df_disciplines, df_places, df_schedules, df_prices = append_scraped_data(df_disciplines, df_places, df_schedules, df_prices, "gym1", data)
-    df_disciplines, df_places, df_schedules, df_prices = append_scraped_data(df_disciplines, df_places, df_schedules, df_prices, "gym2", data)
-    excel_bytes = create_excel_in_memory(df_disciplines, df_places, df_schedules, df_prices)
-    exported_file = export_and_upload(df_disciplines, df_places, df_schedules, df_prices, "1M10yylyExJjh8hbtJt7iKGxVo1CkdB2H")
+    buffers = init_row_buffers()
+    append_scraped_data(buffers, "gym1", data)
+    append_scraped_data(buffers, "gym2", data)
+    write_excel(buffers, "../gyms-data-example.xlsx")
+    exported_file = export_and_upload(buffers, "1M10yylyExJjh8hbtJt7iKGxVo1CkdB2H")
     print(exported_file)
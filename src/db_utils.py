@@ -1,13 +1,46 @@
+import hashlib
+import json
 import os
+from contextlib import contextmanager
+from datetime import date
 
 import psycopg2
-from psycopg2.extras import execute_batch
+from psycopg2.pool import ThreadedConnectionPool
 from dotenv import load_dotenv
 
+from src.telemetry import count, span
+
 load_dotenv()
 
-def get_connection():
-    return psycopg2.connect(
+# Columns loaded per fact table and the natural key used to upsert them.
+FACT_TABLES = {
+    "ubicaciones": {
+        "columns": ["content_para_busqueda", "direccion_completa", "distrito", "horario_atencion"],
+        "key": ["direccion_completa"],
+    },
+    "precios": {
+        "columns": ["content_para_busqueda", "sede", "descripcion_plan", "valor", "moneda", "recurrencia"],
+        "key": ["sede", "descripcion_plan", "recurrencia"],
+    },
+    "horarios": {
+        "columns": ["content_para_busqueda", "sede", "nombre_clase", "instructor", "fecha", "dia_semana", "hora_inicio", "hora_fin",
+                    "recurrencia", "fecha_inicio", "fecha_fin", "excepciones", "disciplina_id"],
+        "key": ["sede", "nombre_clase", "instructor", "fecha", "dia_semana", "hora_inicio"],
+    },
+    "disciplinas": {
+        "columns": ["content_para_busqueda", "sede", "nombre", "descripcion", "disciplina_id"],
+        "key": ["sede", "nombre"],
+    },
+}
+# Channel notified after every committed ingest, so readers can drop cached results
+INGEST_CHANNEL = "facts_ingested"
+
+_pool = None
+_ingest_generation = 0
+
+
+def _connection_params() -> dict:
+    return dict(
         dbname=os.getenv("PGDATABASE"),
         user=os.getenv("PGUSER"),
         password=os.getenv("PGPASSWORD"),
@@ -16,6 +49,51 @@ def get_connection():
     )
 
 
+def get_connection():
+    return psycopg2.connect(**_connection_params())
+
+
+def get_pool() -> ThreadedConnectionPool:
+    """Process-wide connection pool, created on first use (PGPOOL_MIN / PGPOOL_MAX connections)."""
+    global _pool
+    if _pool is None or _pool.closed:
+        _pool = ThreadedConnectionPool(
+            int(os.getenv("PGPOOL_MIN", 1)), int(os.getenv("PGPOOL_MAX", 5)), **_connection_params()
+        )
+    return _pool
+
+
+@contextmanager
+def pooled_connection():
+    """Borrow a connection from the pool; uncommitted work is rolled back before it is returned."""
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        yield conn
+    finally:
+        if not conn.closed:
+            conn.rollback()
+        pool.putconn(conn, close=bool(conn.closed))
+
+
+def notify_ingest(cur, payload: str):
+    """Signals readers that facts changed: in-process immediately, other processes via NOTIFY on commit."""
+    global _ingest_generation
+    _ingest_generation += 1
+    cur.execute("SELECT pg_notify(%s, %s);", (INGEST_CHANNEL, payload))
+
+
+def ingest_generation() -> int:
+    return _ingest_generation
+
+
+def close_pool():
+    global _pool
+    if _pool is not None and not _pool.closed:
+        _pool.closeall()
+    _pool = None
+
+
 def init_db(conn):
     """
     Creates the required tables if they don't exist.
@@ -82,6 +160,55 @@ def init_db(conn):
         ON UPDATE NO ACTION
         ON DELETE NO ACTION
     );
+    ALTER TABLE disciplinas ADD COLUMN IF NOT EXISTS sede TEXT;
+    ALTER TABLE horarios ADD COLUMN IF NOT EXISTS recurrencia TEXT;
+    ALTER TABLE horarios ADD COLUMN IF NOT EXISTS fecha_inicio TEXT;
+    ALTER TABLE horarios ADD COLUMN IF NOT EXISTS fecha_fin TEXT;
+    ALTER TABLE horarios ADD COLUMN IF NOT EXISTS excepciones TEXT;
+    ALTER TABLE horarios ADD COLUMN IF NOT EXISTS disciplina_id TEXT;
+    ALTER TABLE disciplinas ADD COLUMN IF NOT EXISTS disciplina_id TEXT;
+    CREATE TABLE IF NOT EXISTS scrape_runs
+    (
+        id SERIAL PRIMARY KEY,
+        run_date DATE NOT NULL DEFAULT CURRENT_DATE,
+        started_at TIMESTAMP DEFAULT NOW(),
+        finished_at TIMESTAMP,
+        stats JSONB
+    );
+    """
+    # Natural-key hash per row, so reruns update facts instead of duplicating them
+    for table in FACT_TABLES:
+        create_tables += f"""
+    ALTER TABLE {table} ADD COLUMN IF NOT EXISTS content_para_busqueda TEXT;
+    ALTER TABLE {table} ADD COLUMN IF NOT EXISTS key_hash TEXT;
+    ALTER TABLE {table} ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT NOW();
+    CREATE UNIQUE INDEX IF NOT EXISTS {table}_gym_key_idx ON {table} (gym_id, key_hash);
+    """
+    # Fact tables hold the latest snapshot; every insert/change/removal is logged per run in
+    # {table}_history, range-partitioned by scrape date (monthly partitions created on demand).
+    for table, spec in FACT_TABLES.items():
+        latest_columns = ", ".join(f"t.{c}" for c in spec["columns"])
+        create_tables += f"""
+    ALTER TABLE {table} ADD COLUMN IF NOT EXISTS row_hash TEXT;
+    ALTER TABLE {table} ADD COLUMN IF NOT EXISTS run_id INTEGER;
+    CREATE TABLE IF NOT EXISTS {table}_history
+    (
+        run_id INTEGER NOT NULL,
+        run_date DATE NOT NULL,
+        gym_id INTEGER NOT NULL,
+        key_hash TEXT NOT NULL,
+        change_type TEXT NOT NULL,
+        row_hash TEXT,
+        data JSONB,
+        previous JSONB
+    ) PARTITION BY RANGE (run_date);
+    CREATE INDEX IF NOT EXISTS {table}_history_gym_date_idx ON {table}_history (gym_id, run_date);
+    DROP VIEW IF EXISTS latest_{table};
+    CREATE VIEW latest_{table} AS
+    SELECT g.gym_name, {latest_columns}, t.key_hash, t.row_hash, r.run_date AS last_changed_run_date, t.updated_at
+    FROM {table} t
+    JOIN gimnasios g ON g.id = t.gym_id
+    LEFT JOIN scrape_runs r ON r.id = t.run_id;
     """
 
     with conn.cursor() as cur:
@@ -108,57 +235,206 @@ def get_or_create_gym_id(conn, gym_name: str) -> int:
         return cur.fetchone()[0]
 
 
-def bulk_insert(conn, gym_name: str, merged_data: dict):
+def _to_float(value):
+    if value is None or isinstance(value, float):
+        return value
+    try:
+        return float(str(value).replace(",", "").strip())
+    except ValueError:
+        return None
+
+
+def key_hash(table: str, fact: dict) -> str:
+    """md5 over the normalized natural-key fields of a fact."""
+    parts = [str(fact.get(column) or "").strip().lower() for column in FACT_TABLES[table]["key"]]
+    return hashlib.md5("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+def _copy_field(value) -> str:
+    if value is None:
+        return r"\N"
+    return (str(value).replace("\\", "\\\\").replace("\t", "\\t")
+            .replace("\n", "\\n").replace("\r", "\\r"))
+
+
+class CopyStream:
+    """Read-only file object that renders rows to COPY text format lazily, as psycopg2 pulls them."""
+
+    def __init__(self, rows):
+        self.rows = iter(rows)
+        self.buffer = ""
+
+    def read(self, size: int = -1) -> str:
+        while size < 0 or len(self.buffer) < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            self.buffer += "\t".join(_copy_field(v) for v in row) + "\n"
+        if size < 0:
+            size = len(self.buffer)
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+
+def row_hash(values: list) -> str:
+    """md5 over every stored column of a fact, used to detect changed rows between runs."""
+    return hashlib.md5("\x1f".join("" if v is None else str(v) for v in values).encode("utf-8")).hexdigest()
+
+
+def _fact_rows(table: str, facts: list[dict]):
+    """Rows for the staging table, deduplicated by natural key (last occurrence wins)."""
+    columns = FACT_TABLES[table]["columns"]
+    rows = {}
+    for fact in facts:
+        if not isinstance(fact, dict):
+            continue
+        values = [_to_float(fact.get(c)) if c == "valor" else fact.get(c) for c in columns]
+        rows[key_hash(table, fact)] = values
+    return [[*values, h, row_hash(values)] for h, values in rows.items()]
+
+
+def start_run(conn, run_date: date | None = None) -> int:
+    """Registers a scrape run; facts loaded with its id are versioned under its date."""
+    with conn, conn.cursor() as cur:
+        cur.execute("INSERT INTO scrape_runs (run_date) VALUES (COALESCE(%s, CURRENT_DATE)) RETURNING id;", (run_date,))
+        return cur.fetchone()[0]
+
+
+def finish_run(conn, run_id: int, stats: dict | None = None):
+    with conn, conn.cursor() as cur:
+        cur.execute("UPDATE scrape_runs SET finished_at = NOW(), stats = %s WHERE id = %s;",
+                    (json.dumps(stats) if stats is not None else None, run_id))
+
+
+def _ensure_history_partition(cur, table: str, run_date: date):
+    start = run_date.replace(day=1)
+    end = date(start.year + start.month // 12, start.month % 12 + 1, 1)
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {table}_history_{start:%Y_%m} PARTITION OF {table}_history
+        FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}');
+    """)
+
+
+def bulk_insert(conn, gym_name: str, merged_data: dict, run_id: int | None = None) -> dict[str, dict[str, int]]:
     """
-    Inserts all categories (ubicaciones, precios, horarios, disciplinas) for a gym.
+    Loads all categories (ubicaciones, precios, horarios, disciplinas) for a gym in one transaction.
+    Rows are streamed with COPY into temporary staging tables and hash-joined against the gym's current
+    snapshot on key_hash; only inserted, changed (different row_hash) or removed rows are written,
+    and each of them is logged in {table}_history under the run's date. The join is skipped when the
+    staged (key_hash, row_hash) set matches the snapshot (nothing changed) or the gym has no rows yet
+    (everything is inserted).
+    A category with no rows in the new data is left untouched (treated as not scraped, not as removed).
     """
-    gym_id = get_or_create_gym_id(conn, gym_name)
+    stats = {}
+    if run_id is None:
+        run_id = start_run(conn)
+    with span("db_load", gym=gym_name):
+        with conn:
+            gym_id = get_or_create_gym_id(conn, gym_name)
+            with conn.cursor() as cur:
+                cur.execute("SELECT run_date FROM scrape_runs WHERE id = %s;", (run_id,))
+                run_date = cur.fetchone()[0]
+                params = {"gym_id": gym_id, "run_id": run_id, "run_date": run_date}
+                for table, spec in FACT_TABLES.items():
+                    rows = _fact_rows(table, merged_data.get(table) or [])
+                    if not rows:
+                        continue
+                    _ensure_history_partition(cur, table, run_date)
+                    columns = spec["columns"] + ["key_hash", "row_hash"]
+                    column_list = ", ".join(columns)
+                    stage = f"stage_{table}"
+                    cur.execute(f"""
+                        CREATE TEMP TABLE IF NOT EXISTS {stage} ON COMMIT DELETE ROWS AS
+                        SELECT {column_list} FROM {table} WITH NO DATA;
+                    """)
+                    cur.copy_expert(f"COPY {stage} ({column_list}) FROM STDIN", CopyStream(rows))
 
+                    # Huella de (key_hash, row_hash) de lo cargado y de lo actual: si coinciden no hay nada que diffear
+                    fingerprint = "md5(string_agg(key_hash || ':' || COALESCE(row_hash, ''), ',' ORDER BY key_hash, row_hash))"
+                    cur.execute(f"""
+                        SELECT count(*), {fingerprint}, (SELECT {fingerprint} FROM {stage})
+                        FROM {table} WHERE gym_id = %(gym_id)s AND key_hash IS NOT NULL;
+                    """, params)
+                    current_rows, current_print, staged_print = cur.fetchone()
+                    if current_print == staged_print:
+                        stats[table] = {"inserted": 0, "changed": 0, "removed": 0, "unchanged": len(rows)}
+                        count("db_rows_total", len(rows), table=table, change="unchanged")
+                        continue
+                    new_json = ", ".join(f"'{c}', s.{c}" for c in spec["columns"])
+                    if not current_rows:
+                        # Primera carga del gimnasio: todo es inserción, sin join ni UPDATE/DELETE
+                        cur.execute(f"""
+                            INSERT INTO {table}_history (run_id, run_date, gym_id, key_hash, change_type, row_hash, data)
+                            SELECT %(run_id)s, %(run_date)s, %(gym_id)s, s.key_hash, 'inserted', s.row_hash,
+                                   jsonb_build_object({new_json})
+                            FROM {stage} s;
+                        """, params)
+                        cur.execute(f"""
+                            INSERT INTO {table} (gym_id, run_id, {column_list})
+                            SELECT %(gym_id)s, %(run_id)s, {column_list} FROM {stage};
+                        """, params)
+                        stats[table] = {"inserted": cur.rowcount, "changed": 0, "removed": 0, "unchanged": 0}
+                        count("db_rows_total", cur.rowcount, table=table, change="inserted")
+                        continue
+
+                    # Diff: full hash join of the staged run against the current snapshot of this gym
+                    old_json = ", ".join(f"'{c}', t.{c}" for c in spec["columns"])
+                    cur.execute(f"""
+                        INSERT INTO {table}_history (run_id, run_date, gym_id, key_hash, change_type, row_hash, data, previous)
+                        SELECT %(run_id)s, %(run_date)s, %(gym_id)s, COALESCE(s.key_hash, t.key_hash),
+                               CASE WHEN t.key_hash IS NULL THEN 'inserted' WHEN s.key_hash IS NULL THEN 'removed' ELSE 'changed' END,
+                               s.row_hash,
+                               CASE WHEN s.key_hash IS NOT NULL THEN jsonb_build_object({new_json}) END,
+                               CASE WHEN t.key_hash IS NOT NULL THEN jsonb_build_object({old_json}) END
+                        FROM {stage} s
+                        FULL JOIN (SELECT * FROM {table} WHERE gym_id = %(gym_id)s AND key_hash IS NOT NULL) t
+                          ON t.key_hash = s.key_hash
+                        WHERE s.key_hash IS NULL OR t.key_hash IS NULL OR t.row_hash IS DISTINCT FROM s.row_hash;
+                    """, params)
+
+                    cur.execute(f"""
+                        DELETE FROM {table} t
+                        WHERE t.gym_id = %(gym_id)s AND t.key_hash IS NOT NULL
+                          AND NOT EXISTS (SELECT 1 FROM {stage} s WHERE s.key_hash = t.key_hash);
+                    """, params)
+                    removed = cur.rowcount
+                    updates = ", ".join(f"{c} = s.{c}" for c in spec["columns"])
+                    cur.execute(f"""
+                        UPDATE {table} t SET {updates}, row_hash = s.row_hash, run_id = %(run_id)s, updated_at = NOW()
+                        FROM {stage} s
+                        WHERE t.gym_id = %(gym_id)s AND t.key_hash = s.key_hash AND t.row_hash IS DISTINCT FROM s.row_hash;
+                    """, params)
+                    updated = cur.rowcount
+                    cur.execute(f"""
+                        INSERT INTO {table} (gym_id, run_id, {column_list})
+                        SELECT %(gym_id)s, %(run_id)s, {column_list} FROM {stage} s
+                        WHERE NOT EXISTS (SELECT 1 FROM {table} t WHERE t.gym_id = %(gym_id)s AND t.key_hash = s.key_hash);
+                    """, params)
+                    inserted = cur.rowcount
+                    stats[table] = {"inserted": inserted, "changed": updated, "removed": removed,
+                                    "unchanged": len(rows) - inserted - updated}
+                    for change, n in stats[table].items():
+                        count("db_rows_total", n, table=table, change=change)
+                if any(t["inserted"] or t["changed"] or t["removed"] for t in stats.values()):
+                    notify_ingest(cur, gym_name)
+    print(f"✅ Loaded data for gym: {gym_name} (id={gym_id}, run={run_id}): {stats}")
+    return stats
+
+
+def changes_between(conn, table: str, start: date, end: date, gym_name: str | None = None) -> list[dict]:
+    """
+    Changes logged for `table` between two scrape dates (inclusive), e.g. "what changed in prices this week".
+    Only the history partitions covering the range are scanned.
+    """
+    if table not in FACT_TABLES:
+        raise ValueError(f"Unknown table: {table}")
     with conn.cursor() as cur:
-        # Ubicaciones
-        ubicaciones_data = [
-            (gym_id, u.get("content_para_busqueda"), u.get("direccion_completa"), u.get("distrito"), u.get("horario_atencion"))
-            for u in merged_data.get("ubicaciones", [])
-        ]
-        execute_batch(cur, """
-            INSERT INTO ubicaciones (gym_id, content_para_busqueda, direccion_completa, distrito, horario_atencion)
-            VALUES (%s, %s, %s, %s, %s)
-            ON CONFLICT DO NOTHING;
-        """, ubicaciones_data)
-
-        # Precios
-        precios_data = [
-            (gym_id, p.get("content_para_busqueda"), p.get("sede"), p.get("descripcion_plan"),
-             p.get("valor"), p.get("moneda"), p.get("recurrencia"))
-            for p in merged_data.get("precios", [])
-        ]
-        execute_batch(cur, """
-            INSERT INTO precios (gym_id, content_para_busqueda, sede, descripcion_plan, valor, moneda, recurrencia)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-            ON CONFLICT DO NOTHING;
-        """, precios_data)
-
-        # Horarios
-        horarios_data = [
-            (gym_id, h.get("sede"), h.get("nombre_clase"), h.get("instructor"), h.get("fecha"), h.get("dia_semana"), h.get("hora_inicio"), h.get("hora_fin"))
-            for h in merged_data.get("horarios", [])
-        ]
-        execute_batch(cur, """
-            INSERT INTO horarios (gym_id, sede, nombre_clase, instructor, fecha, dia_semana, hora_inicio, hora_fin)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            ON CONFLICT DO NOTHING;
-        """, horarios_data)
-
-        # Disciplinas
-        disciplinas_data = [
-            (gym_id, d.get("nombre"), d.get("descripcion"))
-            for d in merged_data.get("disciplinas", [])
-        ]
-        execute_batch(cur, """
-            INSERT INTO disciplinas (gym_id, nombre, descripcion)
-            VALUES (%s, %s, %s)
-            ON CONFLICT DO NOTHING;
-        """, disciplinas_data)
-
-    conn.commit()
-    print(f"✅ Bulk inserted all data for gym: {gym_name} (id={gym_id})")
+        cur.execute(f"""
+            SELECT h.run_date, g.gym_name, h.change_type, h.data, h.previous
+            FROM {table}_history h
+            JOIN gimnasios g ON g.id = h.gym_id
+            WHERE h.run_date BETWEEN %s AND %s AND (%s::text IS NULL OR g.gym_name = %s)
+            ORDER BY h.run_date, g.gym_name, h.change_type;
+        """, (start, end, gym_name, gym_name))
+        columns = [d[0] for d in cur.description]
+        return [dict(zip(columns, row)) for row in cur.fetchall()]
@@ -1,58 +1,194 @@
+import json
+import logging
 import os
+import time
+from typing import BinaryIO, Iterable
+
 import requests
 from dotenv import load_dotenv
 from google.oauth2.credentials import Credentials
 from google.auth.transport.requests import Request
 
 GOOGLE_TOKEN_URI = "https://oauth2.googleapis.com/token"
-DRIVE_UPLOAD_URL = "https://www.googleapis.com/upload/drive/v3/files?uploadType=multipart"
+DRIVE_UPLOAD_URL = "https://www.googleapis.com/upload/drive/v3/files?uploadType=resumable"
+CHUNK_SIZE = 8 * 1024 * 1024  # must be a multiple of 256 KiB
+MAX_RETRIES = 5
+RETRY_BACKOFF = 1.0  # seconds, doubled on every retry
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+_credentials = None
+
+
+def get_credentials(force_refresh: bool = False):
+    """Load OAuth creds using refresh token. The access token is cached and only refreshed once expired."""
+    global _credentials
+    if _credentials is None:
+        _credentials = Credentials(
+            None,
+            refresh_token=os.environ["GOOGLE_REFRESH_TOKEN"],
+            client_id=os.environ["GOOGLE_CLIENT_ID"],
+            client_secret=os.environ["GOOGLE_CLIENT_SECRET"],
+            token_uri=GOOGLE_TOKEN_URI,
+            scopes=["https://www.googleapis.com/auth/drive.file"],
+        )
+    if force_refresh or not _credentials.valid:
+        _credentials.refresh(Request())
+    return _credentials
+
+
+def _iter_source(source, chunk_size: int) -> tuple[Iterable[bytes], int | None, BinaryIO | None]:
+    """
+    Normalizes the upload source into an iterator of byte blocks and its total size (None if unknown).
+    Accepts bytes, a file path, a binary file object or any iterable of bytes.
+    Returns the opened file (if any) so the caller can close it.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        data = memoryview(source)
+        return (bytes(data[i:i + chunk_size]) for i in range(0, len(data), chunk_size)), len(data), None
+    if isinstance(source, (str, os.PathLike)):
+        f = open(source, "rb")
+        return iter(lambda: f.read(chunk_size), b""), os.fstat(f.fileno()).st_size, f
+    if hasattr(source, "read"):
+        size = None
+        try:
+            size = os.fstat(source.fileno()).st_size - source.tell()
+        except (AttributeError, OSError, ValueError):
+            pass
+        return iter(lambda: source.read(chunk_size), b""), size, None
+    return iter(source), None, None
+
+
+class _ChunkReader:
+    """Re-chunks a stream of byte blocks into fixed-size chunks, keeping at most one chunk plus one block in memory."""
+
+    def __init__(self, blocks: Iterable[bytes], chunk_size: int):
+        self.blocks = iter(blocks)
+        self.chunk_size = chunk_size
+        self.pending = bytearray()
+        self.exhausted = False
+
+    def next_chunk(self) -> tuple[bytes, bool]:
+        """Returns (chunk, is_last). Reads one block ahead so the last chunk can be flagged."""
+        while not self.exhausted and len(self.pending) <= self.chunk_size:
+            block = next(self.blocks, None)
+            if block is None:
+                self.exhausted = True
+            elif block:
+                self.pending += block
+        chunk = bytes(self.pending[:self.chunk_size])
+        del self.pending[:self.chunk_size]
+        return chunk, self.exhausted and not self.pending
+
+    def push_back(self, data: bytes) -> None:
+        """Returns unacknowledged bytes so they are sent again with the next chunk."""
+        self.pending[:0] = data
+
 
+def _received_offset(response: requests.Response) -> int:
+    """Next byte to send according to the Range header of a 308 response."""
+    received = response.headers.get("Range")
+    if not received:
+        return 0
+    return int(received.rsplit("-", 1)[1]) + 1
 
-def get_credentials():
-    """Load OAuth creds using refresh token and auto-refresh."""
-    creds = Credentials(
-        None,
-        refresh_token=os.environ["GOOGLE_REFRESH_TOKEN"],
-        client_id=os.environ["GOOGLE_CLIENT_ID"],
-        client_secret=os.environ["GOOGLE_CLIENT_SECRET"],
-        token_uri=GOOGLE_TOKEN_URI,
-        scopes=["https://www.googleapis.com/auth/drive.file"],
-    )
-    creds.refresh(Request())
-    return creds
 
+def _rewind(reader: _ChunkReader, chunk: bytes, offset: int, acknowledged: int) -> int:
+    """Pushes back the part of `chunk` the server did not persist and returns the new offset."""
+    if acknowledged < offset:
+        raise Exception(f"Upload server lost acknowledged bytes (offset {offset}, server has {acknowledged})")
+    reader.push_back(chunk[acknowledged - offset:])
+    return acknowledged
 
-def upload_file(file_bytes, filename, mimetype, folder_id):
-    """Upload a file to Google Drive using OAuth automatically refreshed creds."""
-    creds = get_credentials()
 
+def _start_session(session: requests.Session, upload_url: str, token: str, metadata: dict, mimetype: str,
+                   size: int | None) -> str:
+    headers = {
+        "Authorization": f"Bearer {token}",
+        "Content-Type": "application/json; charset=UTF-8",
+        "X-Upload-Content-Type": mimetype,
+    }
+    if size is not None:
+        headers["X-Upload-Content-Length"] = str(size)
+    response = session.post(upload_url, headers=headers, data=json.dumps(metadata))
+    if not response.ok:
+        raise Exception(f"Upload session failed: {response.text}")
+    return response.headers["Location"]
+
+
+def _query_offset(session: requests.Session, session_uri: str, token: str, total: int | None) -> requests.Response:
+    """Asks the server how many bytes of the session it has persisted."""
+    headers = {"Authorization": f"Bearer {token}", "Content-Range": f"bytes */{total if total is not None else '*'}"}
+    return session.put(session_uri, headers=headers)
+
+
+def upload_file(source, filename, mimetype, folder_id, chunk_size: int = CHUNK_SIZE, upload_url: str = DRIVE_UPLOAD_URL,
+                creds=None, session: requests.Session | None = None):
+    """
+    Upload a file to Google Drive with the resumable protocol.
+    `source` may be bytes, a path, a binary file object or an iterable of bytes; it is streamed in
+    `chunk_size` chunks, so memory stays flat regardless of the file size.
+    Interrupted chunks are retried from the last offset acknowledged by the server.
+    """
+    if chunk_size % (256 * 1024):
+        raise ValueError("chunk_size must be a multiple of 256 KiB")
+    creds = creds or get_credentials()
+    session = session or requests.Session()
     metadata = {
         "name": filename,
         "parents": [folder_id],
         "mimeType": mimetype
     }
 
-    # Multipart upload
-    boundary = "====BOUNDARY===="
-    multipart_body = (
-        f"--{boundary}\r\n"
-        "Content-Type: application/json; charset=UTF-8\r\n\r\n"
-        f"{metadata}\r\n"
-        f"--{boundary}\r\n"
-        f"Content-Type: {mimetype}\r\n\r\n"
-    ).encode("utf-8") + file_bytes + f"\r\n--{boundary}--".encode("utf-8")
+    blocks, total, opened = _iter_source(source, chunk_size)
+    try:
+        session_uri = _start_session(session, upload_url, creds.token, metadata, mimetype, total)
+        reader = _ChunkReader(blocks, chunk_size)
+        offset = 0
+        retries = 0
+        chunk, is_last = reader.next_chunk()
+        while True:
+            end_total = offset + len(chunk) if is_last else total
+            content_range = (f"bytes {offset}-{offset + len(chunk) - 1}/{end_total if end_total is not None else '*'}"
+                             if chunk else f"bytes */{end_total}")
+            headers = {"Authorization": f"Bearer {creds.token}", "Content-Range": content_range}
+            try:
+                response = session.put(session_uri, headers=headers, data=chunk)
+            except requests.RequestException as e:
+                logging.warning(f"⚠️ Chunk at offset {offset} interrupted: {e}")
+                response = None
 
-    headers = {
-        "Authorization": f"Bearer {creds.token}",
-        "Content-Type": f"multipart/related; boundary={boundary}",
-    }
+            if response is not None and response.status_code in (200, 201):
+                return response.json()
 
-    response = requests.post(DRIVE_UPLOAD_URL, headers=headers, data=multipart_body)
+            if response is not None and response.status_code == 308:
+                offset = _rewind(reader, chunk, offset, _received_offset(response))
+                retries = 0
+                chunk, is_last = reader.next_chunk()
+                continue
 
-    if not response.ok:
-        raise Exception(f"Upload failed: {response.text}")
+            if response is not None and response.status_code == 401 and creds is _credentials:
+                creds = get_credentials(force_refresh=True)
+            elif response is not None and response.status_code not in RETRYABLE_STATUS:
+                raise Exception(f"Upload failed: {response.text}")
+
+            retries += 1
+            if retries > MAX_RETRIES:
+                raise Exception(f"Upload failed after {MAX_RETRIES} retries at offset {offset}")
+            time.sleep(min(RETRY_BACKOFF * 2 ** retries, 30))
 
-    return response.json()
+            # Resume from whatever the server actually persisted
+            try:
+                status = _query_offset(session, session_uri, creds.token, end_total)
+            except requests.RequestException:
+                continue
+            if status.status_code in (200, 201):
+                return status.json()
+            if status.status_code == 308:
+                offset = _rewind(reader, chunk, offset, _received_offset(status))
+                chunk, is_last = reader.next_chunk()
+    finally:
+        if opened:
+            opened.close()
 
 
 if __name__ == "__main__":
@@ -61,9 +197,5 @@ if __name__ == "__main__":
     folder_id = "1M10yylyExJjh8hbtJt7iKGxVo1CkdB2H"  # The folder you shared with your Google account
     filepath = "../example.xlsx"
     mimetype = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-    # Example: load file into memory
-    with open(filepath, "rb") as f:
-        contents = f.read()
-
-    res = upload_file(contents, "example.xlsx", mimetype, folder_id)
+    res = upload_file(filepath, "example.xlsx", mimetype, folder_id)
     print("Uploaded:", res)
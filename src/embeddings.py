@@ -0,0 +1,165 @@
+import hashlib
+import logging
+import math
+import os
+import re
+
+import openai
+
+from src.db_utils import FACT_TABLES, CopyStream, notify_ingest
+from src.text import normalize_text
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", 1536))
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", 256))
+
+
+class OpenAIEmbedder:
+    """Embeds texts with the OpenAI embeddings endpoint, one request per batch."""
+
+    def __init__(self, client: openai.OpenAI, model: str = EMBEDDING_MODEL, dimensions: int = EMBEDDING_DIMENSIONS):
+        self.client = client
+        self.model = model
+        self.dimensions = dimensions
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        response = self.client.embeddings.create(model=self.model, input=texts, dimensions=self.dimensions)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+
+class HashingEmbedder:
+    """
+    Deterministic offline stand-in: hashes words and character trigrams into a signed, L2-normalized vector.
+    No network access, same output for the same text on every machine.
+    """
+
+    def __init__(self, dimensions: int = EMBEDDING_DIMENSIONS):
+        self.model = f"local-hashing-{dimensions}"
+        self.dimensions = dimensions
+
+    def _features(self, text: str) -> list[str]:
+        text = normalize_text(text)
+        words = re.findall(r"\w+", text)
+        padded = f" {text} "
+        return words + [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+    def embed_one(self, text: str) -> list[float]:
+        vector = [0.0] * self.dimensions
+        for feature in self._features(text):
+            digest = hashlib.md5(feature.encode("utf-8")).digest()
+            idx = int.from_bytes(digest[:4], "little") % self.dimensions
+            vector[idx] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        return [self.embed_one(text) for text in texts]
+
+
+def get_embedder(client: openai.OpenAI | None = None):
+    """
+    EMBEDDER=openai (default) or EMBEDDER=local for the offline hashing embedder. Without `client` a new
+    OpenAI client is created, so ingest and search always pick the same embedder.
+    """
+    if os.getenv("EMBEDDER", "openai").lower() == "local":
+        return HashingEmbedder()
+    return OpenAIEmbedder(client or openai.OpenAI())
+
+
+def init_vector_schema(conn, dimensions: int = EMBEDDING_DIMENSIONS):
+    """
+    Adds embedding columns and HNSW indexes to the fact tables, plus a cache of vectors
+    keyed by (model, md5(content_para_busqueda)) shared across tables and runs.
+    """
+    sql = f"""
+    CREATE EXTENSION IF NOT EXISTS vector;
+    CREATE TABLE IF NOT EXISTS embeddings_cache
+    (
+        model TEXT NOT NULL,
+        content_hash TEXT NOT NULL,
+        embedding vector({dimensions}) NOT NULL,
+        created_at TIMESTAMP DEFAULT NOW(),
+        PRIMARY KEY (model, content_hash)
+    );
+    """
+    for table in FACT_TABLES:
+        sql += f"""
+    ALTER TABLE {table} ADD COLUMN IF NOT EXISTS content_hash TEXT GENERATED ALWAYS AS (md5(content_para_busqueda)) STORED;
+    ALTER TABLE {table} ADD COLUMN IF NOT EXISTS embedding vector({dimensions});
+    ALTER TABLE {table} ADD COLUMN IF NOT EXISTS embedding_model TEXT;
+    ALTER TABLE {table} ADD COLUMN IF NOT EXISTS embedded_hash TEXT;
+    CREATE INDEX IF NOT EXISTS {table}_embedding_hnsw_idx ON {table} USING hnsw (embedding vector_cosine_ops);
+    """
+    with conn.cursor() as cur:
+        cur.execute(sql)
+        conn.commit()
+    print("✅ Vector columns and HNSW indexes ensured successfully")
+
+
+def _pending_condition(table: str) -> str:
+    return (f"{table}.content_hash IS NOT NULL AND ({table}.embedded_hash IS DISTINCT FROM {table}.content_hash "
+            f"OR {table}.embedding_model IS DISTINCT FROM %(model)s)")
+
+
+def vector_literal(vector: list[float]) -> str:
+    return "[" + ",".join(f"{v:.7g}" for v in vector) + "]"
+
+
+def embed_pending(conn, embedder, gym_id: int | None = None, batch_size: int = EMBEDDING_BATCH_SIZE) -> dict[str, int]:
+    """
+    Embedding stage: finds facts whose content changed since they were last embedded, embeds only the
+    texts missing from embeddings_cache (batched, deduplicated by content hash), bulk loads the new vectors
+    with COPY and copies them onto the fact rows. Returns how many texts were embedded and rows updated.
+    """
+    params = {"model": embedder.model, "gym_id": gym_id}
+    gym_filter = " AND gym_id = %(gym_id)s" if gym_id is not None else ""
+    stats = {"embedded": 0, "updated": 0}
+
+    with conn:
+        with conn.cursor() as cur:
+            pending = " UNION ".join(
+                f"SELECT content_hash, content_para_busqueda FROM {table} WHERE {_pending_condition(table)}{gym_filter}"
+                for table in FACT_TABLES
+            )
+            cur.execute(f"""
+                SELECT DISTINCT ON (p.content_hash) p.content_hash, p.content_para_busqueda
+                FROM ({pending}) p
+                LEFT JOIN embeddings_cache c ON c.model = %(model)s AND c.content_hash = p.content_hash
+                WHERE c.content_hash IS NULL;
+            """, params)
+            missing = cur.fetchall()
+
+            if missing:
+                cur.execute("""
+                    CREATE TEMP TABLE IF NOT EXISTS stage_embeddings ON COMMIT DELETE ROWS AS
+                    SELECT model, content_hash, embedding FROM embeddings_cache WITH NO DATA;
+                """)
+            for start in range(0, len(missing), batch_size):
+                batch = missing[start:start + batch_size]
+                vectors = embedder.embed([text for _, text in batch])
+                rows = ((embedder.model, content_hash, vector_literal(vector))
+                        for (content_hash, _), vector in zip(batch, vectors))
+                cur.copy_expert("COPY stage_embeddings (model, content_hash, embedding) FROM STDIN", CopyStream(rows))
+                stats["embedded"] += len(batch)
+                logging.info(f"🧮 Embedded {stats['embedded']}/{len(missing)} new texts with {embedder.model}")
+            if missing:
+                cur.execute("""
+                    INSERT INTO embeddings_cache (model, content_hash, embedding)
+                    SELECT model, content_hash, embedding FROM stage_embeddings
+                    ON CONFLICT DO NOTHING;
+                """)
+
+            for table in FACT_TABLES:
+                cur.execute(f"""
+                    UPDATE {table}
+                    SET embedding = c.embedding, embedding_model = c.model, embedded_hash = c.content_hash
+                    FROM embeddings_cache c
+                    WHERE c.model = %(model)s AND c.content_hash = {table}.content_hash
+                      AND {_pending_condition(table)}{gym_filter};
+                """, params)
+                stats["updated"] += cur.rowcount
+            if stats["updated"]:
+                notify_ingest(cur, "embeddings")
+
+    print(f"✅ Embedding stage done: {stats}")
+    return stats
@@ -0,0 +1,171 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+from urllib.parse import urlparse
+
+from src.telemetry import count, gauge
+
+HOST_BREAKER_FAILURES = int(os.getenv("HOST_BREAKER_FAILURES", 3))  # fallos seguidos que abren el circuito
+HOST_BREAKER_COOLDOWN_S = float(os.getenv("HOST_BREAKER_COOLDOWN_S", 300))  # luego se deja pasar una prueba
+HOST_TIMEOUT_MULTIPLIER = float(os.getenv("HOST_TIMEOUT_MULTIPLIER", 3))  # timeout = p95 observado x multiplicador
+HOST_TIMEOUT_FLOOR_MS = int(os.getenv("HOST_TIMEOUT_FLOOR_MS", 15_000))
+HOST_MIN_SAMPLES = 3  # navegaciones exitosas antes de adaptar el timeout
+HOST_LATENCY_WINDOW = 50
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+def host_of(url: str) -> str:
+    return urlparse(url).netloc.lower()
+
+
+class HostHealth:
+    def __init__(self):
+        self.latencies = deque(maxlen=HOST_LATENCY_WINDOW)  # segundos de las navegaciones exitosas
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.ok = self.failures = self.timeouts = self.skipped = self.trips = 0
+
+    def percentile(self, q: float) -> float | None:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+class HostTracker:
+    """
+    Health of every host the crawler navigates to. Navigation timeouts adapt to each host's observed
+    latency (p95 x HOST_TIMEOUT_MULTIPLIER, between HOST_TIMEOUT_FLOOR_MS and the caller's default), and a
+    circuit breaker stops navigating to a host after HOST_BREAKER_FAILURES consecutive failures. After
+    HOST_BREAKER_COOLDOWN_S one probe is let through (half-open): success closes the circuit, failure
+    reopens it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hosts: dict[str, HostHealth] = {}
+
+    def _health(self, url: str) -> tuple[str, HostHealth]:
+        host = host_of(url)
+        if host not in self.hosts:
+            self.hosts[host] = HostHealth()
+        return host, self.hosts[host]
+
+    def allow(self, url: str) -> bool:
+        """False while the host's circuit is open; the caller skips the URL."""
+        with self._lock:
+            host, health = self._health(url)
+            if health.state == OPEN and time.monotonic() - health.opened_at >= HOST_BREAKER_COOLDOWN_S:
+                health.state = HALF_OPEN
+                logging.info(f"🔌 {host}: circuit half-open, probing with {url}")
+                return True
+            if health.state == CLOSED:
+                return True
+            health.skipped += 1  # abierto, o semiabierto con la prueba en curso
+        count("host_skipped_total", host=host)
+        return False
+
+    def timeout_ms(self, url: str, default_ms: int) -> int:
+        """Navigation timeout for `url`: the default until the host has HOST_MIN_SAMPLES successful loads."""
+        with self._lock:
+            _, health = self._health(url)
+            adaptive_ms = self._adaptive_ms(health)
+        return default_ms if adaptive_ms is None else min(adaptive_ms, default_ms)
+
+    @staticmethod
+    def _adaptive_ms(health: HostHealth) -> int | None:
+        if len(health.latencies) < HOST_MIN_SAMPLES:
+            return None
+        return int(max(health.percentile(0.95) * 1000 * HOST_TIMEOUT_MULTIPLIER, HOST_TIMEOUT_FLOOR_MS))
+
+    def record(self, url: str, seconds: float, error: Exception | None = None):
+        """Outcome of one navigation to `url`."""
+        with self._lock:
+            host, health = self._health(url)
+            if error is None:
+                health.ok += 1
+                health.latencies.append(seconds)
+                health.consecutive_failures = 0
+                if health.state != CLOSED:
+                    logging.info(f"🔌 {host}: circuit closed")
+                health.state = CLOSED
+                tripped = False
+            else:
+                health.failures += 1
+                health.timeouts += "Timeout" in type(error).__name__
+                health.consecutive_failures += 1
+                tripped = health.state == HALF_OPEN or (
+                    health.state == CLOSED and health.consecutive_failures >= HOST_BREAKER_FAILURES)
+                if tripped:
+                    health.state, health.opened_at = OPEN, time.monotonic()
+                    health.trips += 1
+        count("host_navigations_total", host=host, outcome="ok" if error is None else "error")
+        if tripped:
+            count("host_breaker_trips_total", host=host)
+            logging.warning(f"🔌 {host}: circuit open after {health.consecutive_failures} consecutive failures "
+                            f"({type(error).__name__}); skipping it for {HOST_BREAKER_COOLDOWN_S:.0f}s")
+        gauge("host_breaker_open", int(health.state == OPEN), host=host)
+
+    def report(self) -> dict[str, dict]:
+        """Per host: breaker state, navigations, failures, skipped URLs, trips, latency percentiles and adaptive timeout."""
+        with self._lock:
+            hosts = dict(self.hosts)
+        report = {}
+        for host, health in sorted(hosts.items()):
+            p50, p95, adaptive_ms = health.percentile(0.5), health.percentile(0.95), self._adaptive_ms(health)
+            report[host] = {
+                "state": health.state, "ok": health.ok, "failures": health.failures, "timeouts": health.timeouts,
+                "skipped": health.skipped, "trips": health.trips,
+                "p50_s": round(p50, 2) if p50 is not None else None,
+                "p95_s": round(p95, 2) if p95 is not None else None,
+                "timeout_s": round(adaptive_ms / 1000, 1) if adaptive_ms is not None else None,
+            }
+        return report
+
+
+_tracker = HostTracker()
+
+
+def get_host_tracker() -> HostTracker:
+    return _tracker
+
+
+def reset_host_tracker() -> HostTracker:
+    global _tracker
+    _tracker = HostTracker()
+    return _tracker
+
+
+def goto(page, url: str, wait_until: str, default_timeout_ms: int, fallback_wait_until: str | None = None):
+    """
+    page.goto with the host's adaptive timeout, recording the outcome for its circuit breaker.
+    With `fallback_wait_until`, a failed load is retried once with that (laxer) condition before counting
+    as a failure. Raises like page.goto; callers check `get_host_tracker().allow(url)` first.
+    """
+    timeout = _tracker.timeout_ms(url, default_timeout_ms)
+    for attempt, condition in enumerate(filter(None, [wait_until, fallback_wait_until])):
+        start = time.perf_counter()
+        try:
+            response = page.goto(url, wait_until=condition, timeout=timeout)
+        except Exception as e:
+            if attempt == 0 and fallback_wait_until:
+                continue
+            _tracker.record(url, time.perf_counter() - start, e)
+            raise
+        _tracker.record(url, time.perf_counter() - start)
+        return response
+
+
+def host_report() -> dict[str, dict]:
+    """Breaker summary of the run; logs the hosts that failed or were cut off."""
+    report = _tracker.report()
+    for host, stats in report.items():
+        if stats["failures"] or stats["skipped"]:
+            logging.info(f"🔌 {host}: {stats['state']}, {stats['ok']} ok / {stats['failures']} failed "
+                         f"({stats['timeouts']} timeouts), {stats['skipped']} skipped, {stats['trips']} trips, "
+                         f"p95 {stats['p95_s']}s")
+    return report
@@ -0,0 +1,167 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import date
+
+RUN_TOKEN_BUDGET = int(os.getenv("RUN_TOKEN_BUDGET", 0))  # tokens (prompt + completion) por corrida; 0 sin límite
+GYM_TOKEN_BUDGET = int(os.getenv("GYM_TOKEN_BUDGET", 0))  # tokens por gimnasio; 0 sin límite
+TOKEN_BUDGET_DEGRADE_AT = float(os.getenv("TOKEN_BUDGET_DEGRADE_AT", 0.8))  # fracción del presupuesto que degrada
+DEGRADED_MODEL = os.getenv("DEGRADED_MODEL", "gpt-5-nano")
+
+OK, DEGRADED, EXHAUSTED = "ok", "degraded", "exhausted"
+_LEVELS = [OK, DEGRADED, EXHAUSTED]
+
+
+class TokenLedger:
+    """
+    Prompt, completion and cached tokens of every LLM call of a run, by gym, stage and model. Telemetry's
+    record_usage feeds it, attributing each call to the enclosing gym and stage spans.
+
+    Spending is checked against RUN_TOKEN_BUDGET and GYM_TOKEN_BUDGET. Past TOKEN_BUDGET_DEGRADE_AT of
+    either, a gym is degraded: extraction no longer escalates, the merge runs on DEGRADED_MODEL and the
+    crawl takes half its pages. Once a budget is spent the gym is exhausted and crawls nothing more.
+    """
+
+    def __init__(self, run_budget: int = RUN_TOKEN_BUDGET, gym_budget: int = GYM_TOKEN_BUDGET,
+                 degrade_at: float = TOKEN_BUDGET_DEGRADE_AT):
+        self.run_budget = run_budget
+        self.gym_budget = gym_budget
+        self.degrade_at = degrade_at
+        self._lock = threading.Lock()
+        self.calls = []
+        self.run_tokens = 0
+        self.gym_tokens = Counter()
+        self.totals = defaultdict(Counter)  # (gym, stage, model) -> calls y tokens
+        self.levels = {}  # gym -> último nivel informado
+        self.degradations = Counter()  # (gym, qué se degradó) -> veces
+
+    def record(self, model: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0,
+               gym: str | None = None, stage: str | None = None, prompt: str | None = None):
+        """One call's usage, attributed to `gym` and `stage` ("" when the call is outside a gym)."""
+        gym, stage = gym or "", stage or ""
+        with self._lock:
+            self.calls.append({"ts": round(time.time(), 3), "gym": gym, "stage": stage, "model": model,
+                               "prompt": prompt, "prompt_tokens": prompt_tokens,
+                               "completion_tokens": completion_tokens, "cached_tokens": cached_tokens})
+            totals = self.totals[(gym, stage, model)]
+            totals["calls"] += 1
+            totals["prompt_tokens"] += prompt_tokens
+            totals["completion_tokens"] += completion_tokens
+            totals["cached_tokens"] += cached_tokens
+            self.run_tokens += prompt_tokens + completion_tokens
+            self.gym_tokens[gym] += prompt_tokens + completion_tokens
+        self._check(gym)
+
+    def _fraction(self, gym: str) -> float:
+        """Share spent of the tighter of the run and gym budgets."""
+        fractions = [0.0]
+        if self.run_budget:
+            fractions.append(self.run_tokens / self.run_budget)
+        if self.gym_budget and gym:
+            fractions.append(self.gym_tokens[gym] / self.gym_budget)
+        return max(fractions)
+
+    def level(self, gym: str) -> str:
+        fraction = self._fraction(gym)
+        return EXHAUSTED if fraction >= 1 else DEGRADED if fraction >= self.degrade_at else OK
+
+    def _check(self, gym: str):
+        level = self.level(gym)
+        previous = self.levels.get(gym, OK)
+        if _LEVELS.index(level) > _LEVELS.index(previous):
+            self.levels[gym] = level
+            logging.warning(f"🧾 {gym or 'run'}: token budget {level} ({self.gym_tokens[gym]:,} tokens for the gym, "
+                            f"{self.run_tokens:,} for the run)")
+
+    def degrade(self, gym: str, what: str):
+        """Counts one degradation applied to the gym (reported per gym)."""
+        with self._lock:
+            self.degradations[(gym, what)] += 1
+
+    def model_for(self, gym: str, model: str, stage: str) -> str:
+        """`model`, or DEGRADED_MODEL once the gym is over its degrade threshold."""
+        if model == DEGRADED_MODEL or self.level(gym) == OK:
+            return model
+        self.degrade(gym, f"{stage}:{model}->{DEGRADED_MODEL}")
+        return DEGRADED_MODEL
+
+    def allow_escalation(self, gym: str) -> bool:
+        """False once the gym is degraded: extraction stays on the model it started with."""
+        if self.level(gym) == OK:
+            return True
+        self.degrade(gym, "extract:no_escalation")
+        return False
+
+    def report(self) -> dict:
+        """Totals for the run and by gym, stage and model, budgets and the degradations applied."""
+        with self._lock:
+            totals = dict(self.totals)
+            degradations = Counter(self.degradations)
+
+        def rollup(index: int) -> dict:
+            grouped = defaultdict(Counter)
+            for key, counter in totals.items():
+                grouped[key[index] or "-"].update(counter)
+            return {name: dict(counter) for name, counter in sorted(grouped.items())}
+
+        run = Counter()
+        for counter in totals.values():
+            run.update(counter)
+        by_gym = rollup(0)
+        for gym, stats in by_gym.items():
+            gym = "" if gym == "-" else gym
+            stats["level"] = self.level(gym) if gym else None
+            stats["degradations"] = {what: n for (g, what), n in degradations.items() if g == gym}
+        return {
+            "run": dict(run),
+            "budgets": {"run": self.run_budget or None, "gym": self.gym_budget or None, "degrade_at": self.degrade_at},
+            "by_gym": by_gym,
+            "by_stage": rollup(1),
+            "by_model": rollup(2),
+            "breakdown": [{"gym": gym, "stage": stage, "model": model, **counter}
+                          for (gym, stage, model), counter in sorted(totals.items())],
+        }
+
+    def export(self, base_dir: str, run_date: date | None = None) -> str:
+        """
+        Writes the summary (summary.json) and one line per call (calls.jsonl) under
+        base_dir/token_ledger/run_date=YYYY-MM-DD/, next to the exported datasets; returns the directory.
+        """
+        directory = os.path.join(base_dir, "token_ledger", f"run_date={(run_date or date.today()).isoformat()}")
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, "summary.json"), "w", encoding="utf-8") as f:
+            json.dump(self.report(), f, ensure_ascii=False, indent=2)
+        with self._lock:
+            calls = list(self.calls)
+        with open(os.path.join(directory, "calls.jsonl"), "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(call, ensure_ascii=False) + "\n" for call in calls)
+        return directory
+
+
+_ledger = TokenLedger()
+
+
+def get_ledger() -> TokenLedger:
+    return _ledger
+
+
+def reset_ledger(run_budget: int = RUN_TOKEN_BUDGET, gym_budget: int = GYM_TOKEN_BUDGET) -> TokenLedger:
+    global _ledger
+    _ledger = TokenLedger(run_budget, gym_budget)
+    return _ledger
+
+
+def ledger_summary() -> dict:
+    """Ledger report of the run; logs the totals and every gym's spend, level and degradations."""
+    report = _ledger.report()
+    run = report["run"]
+    logging.info(f"🧾 Tokens: {run.get('calls', 0)} calls, {run.get('prompt_tokens', 0):,} prompt "
+                 f"({run.get('cached_tokens', 0):,} cached) + {run.get('completion_tokens', 0):,} completion")
+    for gym, stats in report["by_gym"].items():
+        logging.info(f"🧾 {gym}: {stats.get('prompt_tokens', 0) + stats.get('completion_tokens', 0):,} tokens "
+                     f"in {stats.get('calls', 0)} calls" + (f", {stats['level']}" if stats["level"] not in (None, OK) else "")
+                     + (f", degraded {stats['degradations']}" if stats["degradations"] else ""))
+    return report
@@ -1,15 +1,22 @@
 import datetime
 import logging
-from collections import defaultdict
+import os
+from collections import Counter, defaultdict
 
 import openai
 import json
-from typing import Any
+from typing import Any, Callable
 
-import tiktoken
 from dotenv import load_dotenv
 from openai import OpenAI
 
+from src.ledger import get_ledger
+from src.prompts import PROMPTS, PromptTemplate, encoding, register_prompt
+from src.streaming import stream_completion
+from src.telemetry import record_usage, span
+from src.validation import extraction_problems, fact_problems, looks_like_schedule
+from src.workers import get_pool
+
 
 def _sanitize_and_generate_content(facts: list[dict], category: str) -> list[dict]:
     """
@@ -52,63 +59,11 @@ def _sanitize_and_generate_content(facts: list[dict], category: str) -> list[dic
     return sanitized_facts
 
 
-def detect_schedule(client: OpenAI, html_text: str) -> bool:
-    prompt = f"""
-    Eres un clasificador de contenido HTML. 
-    Tu tarea es determinar si el siguiente HTML contiene una **tabla de horarios de clases de entrenamiento o ejercicios**, NO un horario de atención general.
-
-    Reglas:
-    1. **Responde únicamente con "SI" o "NO"** (sin explicación).
-    2. Solo responde "SI" si ves **múltiples repeticiones de horas o días junto con nombres de clases o instructores** (por ejemplo: yoga 7am, spinning 8am, pilates 9am, etc).
-    3. Responde "NO" si:
-       - El texto solo menciona "horario de atención", "lunes a viernes 8am–10pm", o similares.
-       - Solo hay direcciones, teléfonos o información general del gimnasio.
-       - No aparecen nombres de clases, actividades o instructores.
-    4. Ignora palabras sueltas como "horario", "entrenamiento" o "gimnasio"; no implican una tabla de clases por sí mismas.
-
-    Ejemplos:
-    ---
-    HTML: "<p>Horarios de entrenamiento: Lunes a Viernes 5am a 11pm</p>"
-    Respuesta: NO
-
-    HTML: "<div>Yoga - 7:00am<br>Spinning - 8:00am<br>Pilates - 9:00am</div>"
-    Respuesta: SI
-
-    HTML: "<p>Elige tu plan. Lunes a jueves 5am a 11pm</p>"
-    Respuesta: NO
-
-    HTML: "<div><p>Clase: CrossFit</p><p>Hora: 6am</p><p>Instructor: Juan</p></div>"
-    Respuesta: SI
-    ---
-
-    Ahora clasifica el siguiente HTML:
-    {html_text}
-    """
-    completion = client.chat.completions.create(
-        model="gpt-5-nano",
-        messages=[{"role": "user", "content": prompt}],
-    )
-    response = completion.choices[0].message.content
-    return "si" in response.lower()
-
+EXTRACTION_CATEGORIES = ["ubicaciones", "precios", "horarios", "disciplinas"]
 
-def extract_structured_data(
-        client: openai.OpenAI,
-        page_url: str,
-        url_type: str,
-        html_content: str,
-        gym_name: str,
-        lastmod: str,
-        freq: str
-) -> dict[str, list[dict[str, Any]]]:
-    """
-    Uses an OpenAI model to parse HTML and extract a list of structured "fact documents".
-    """
-    # Using .format() requires escaping the JSON braces with {{ and }}
-    # But for the placeholder {html_content}, we use single braces.
-    # The prompt is already formatted this way.
-    # Si hay tablas, las agregamos en formato legible
-    prompt_template = """
+# Using .format() requires escaping the JSON braces with {{ and }}
+# But for the placeholder {html_content}, we use single braces.
+EXTRACTION_INSTRUCTIONS = """
 Eres un agente de extracción de datos de clase mundial para la industria del fitness, especializado en convertir contenido web en registros estructurados para una base de datos PostgreSQL que utiliza pgvector.
 
 **Tu Objetivo:**
@@ -156,9 +111,8 @@ Distingue **horarios de atención del establecimiento** (por ejemplo, "Lunes a V
 
 - Si el horario aplica a toda la sede (no a una clase específica), debe ir en `"ubicaciones"` dentro de un campo adicional `"horario_atencion"`.
 - Si el horario corresponde a una clase o sesión de entrenamiento, debe ir en `"horarios"` con `"nombre_clase"`, `"dia_semana"`, `"hora_inicio"`, etc.
-- Colocar horarios siempre en formato de 24 horas
-- Si se tiene la información disponible, colocar el campo `fecha` en formato DD-MM-YYYY. Puede aceptarse DD-MM. Si no es posible obtener una fecha exacta, dejar vacío.
-- Usa los campos **lastmod** y **changefreq** que se brindarán al final del contenido HTML, así como la fecha actual (formato DD-MM-YYYY), para poder inferir la fecha, de ser necesario.
+- Copia horas y fechas tal como aparecen en la página. Si no es posible obtener una fecha exacta, dejar `fecha` vacío.
+- Usa los campos **lastmod** y **changefreq** que se brindarán al final del contenido HTML, así como la fecha actual, para poder inferir la fecha, de ser necesario.
 - Obtener la hora de fin a partir de la duración de la sesión si está disponible.
 - Evitar bajo cualquier concepto colocar solo la disciplina sin horarios
 ---
@@ -312,7 +266,9 @@ Distingue **horarios de atención del establecimiento** (por ejemplo, "Lunes a V
 ### Ejemplo 4: Texto con horario complejo (tabla organizada semanalmente)
 
 ---
+"""
 
+EXTRACTION_TASK_TEMPLATE = """
 **Tarea Final:**  
 Analiza las siguientes entradas y genera el objeto JSON estructurado.
 
@@ -335,12 +291,92 @@ Analiza las siguientes entradas y genera el objeto JSON estructurado.
 ...
 ```
 """
-    has_schedule_info = detect_schedule(client, html_content)
-    enc = tiktoken.encoding_for_model("gpt-5-mini" if has_schedule_info else "gpt-5-nano")
-    tokens = enc.encode(html_content)
-    if len(tokens) > 6_000 and has_schedule_info:  # avoids reaching token limit if schedule data too large
+
+# Las instrucciones son el prefijo estático (cacheable); la página va después
+EXTRACTION_PROMPT = register_prompt(PromptTemplate("extraction", 1, EXTRACTION_INSTRUCTIONS, EXTRACTION_TASK_TEMPLATE))
+
+
+def count_tokens(text: str, model: str | None = None) -> int:
+    """Tokens of `text` for `model` (the first of EXTRACTION_CASCADE by default); runs fine in a worker process."""
+    return len(encoding(model or EXTRACTION_CASCADE[0]).encode(text))
+
+
+def count_prompt_tokens(prompt_name: str, prompt: str, model: str) -> int:
+    """Tokens of a prompt rendered from PROMPTS[prompt_name]; the static prefix is only encoded once per process."""
+    return PROMPTS[prompt_name].count_tokens(prompt, model)
+
+
+def empty_extraction() -> dict[str, list]:
+    return {category: [] for category in EXTRACTION_CATEGORIES}
+
+
+def extraction_model(has_schedule_info: bool) -> str:
+    return "gpt-5-mini" if has_schedule_info else "gpt-5-nano"
+
+
+# Modelos de extracción, del más barato al más capaz; se escala solo si la validación falla
+EXTRACTION_CASCADE = [m.strip() for m in os.getenv("EXTRACTION_CASCADE", "gpt-5-nano,gpt-5-mini").split(",") if m.strip()]
+_cascade_stats: dict[str, Counter] = defaultdict(Counter)
+
+
+def record_extraction(gym_name: str, model: str, problems: list[str], accepted: bool) -> None:
+    """
+    Records how one page finished the cascade: the final model, whether it had to escalate
+    (`problems` holds the validation failures of the cheaper attempts) and whether it passed in the end.
+    """
+    stats = _cascade_stats[gym_name]
+    stats["pages"] += 1
+    stats[f"model:{model}"] += 1
+    if problems:
+        stats["escalated"] += 1
+    if not accepted:
+        stats["failed_validation"] += 1
+    for problem in set(p.split(":")[0] for p in problems):
+        stats[f"reason:{problem}"] += 1
+
+
+def cascade_report() -> dict[str, dict]:
+    """Per-site escalation rate, final model counts and escalation reasons for this run."""
+    report = {}
+    for gym_name, stats in _cascade_stats.items():
+        report[gym_name] = {
+            "pages": stats["pages"],
+            "escalated": stats["escalated"],
+            "escalation_rate": round(stats["escalated"] / stats["pages"], 3) if stats["pages"] else 0.0,
+            "failed_validation": stats["failed_validation"],
+            "models": {k.split(":", 1)[1]: v for k, v in stats.items() if k.startswith("model:")},
+            "reasons": {k.split(":", 1)[1]: v for k, v in stats.items() if k.startswith("reason:")},
+        }
+    return report
+
+
+def reset_cascade_stats() -> None:
+    _cascade_stats.clear()
+
+
+def extraction_request(
+        page_url: str,
+        url_type: str,
+        html_content: str,
+        gym_name: str,
+        lastmod: str,
+        freq: str,
+        has_schedule_info: bool,
+        model: str | None = None,
+        html_tokens: int | None = None
+) -> dict:
+    """
+    Builds the chat.completions request body for one page, usable both for a synchronous call
+    and as the body of a Batch API line. `model` overrides the choice made from `has_schedule_info`.
+    `html_tokens` is the token count of `html_content` if the caller already has it (counted in the worker pool).
+    """
+    model = model or extraction_model(has_schedule_info)
+    if html_tokens is None:
+        html_tokens = count_tokens(html_content, model)
+    if html_tokens > 6_000 and has_schedule_info:  # avoids reaching token limit if schedule data too large
         html_content = html_content[:8_000] + "..."  # heuristic not to pass too big of a schedule info
-    full_prompt = prompt_template.format(
+    request = EXTRACTION_PROMPT.request(
+        model,
         gym_name=gym_name,
         page_url=page_url,
         url_type=url_type,
@@ -349,61 +385,122 @@ Analiza las siguientes entradas y genera el objeto JSON estructurado.
         changefreq=freq,
         date=datetime.date.today().strftime("%A, %d-%m-%Y").capitalize()
     )
-    if has_schedule_info:
-        logging.info("Detected schedule info, calling larger model for extraction ...")
-    try:
-        tokens = enc.encode(full_prompt)
-        logging.info(f"Processing {len(tokens)} tokens with {'gpt-5-mini' if has_schedule_info else 'gpt-5-nano'}...")
-        logging.info(f"Calling OpenAI to extract data from {page_url}...")
-        completion = client.chat.completions.create(
-            model="gpt-5-mini" if has_schedule_info else "gpt-5-nano",
-            messages=[{"role": "user", "content": full_prompt}],
-            # IMPORTANT: Use JSON mode to guarantee valid JSON output
-            response_format={"type": "json_object"}
-        )
-        response_content = completion.choices[0].message.content
-
-        # The entire response is a JSON object, but the actual data is inside a list.
-        # Sometimes the model might wrap the list in a key, e.g., {"data": [...]}.
-        # We need to robustly extract the list.
-        if not response_content:
-            return {}
-
-        parsed_json = json.loads(response_content)
-
-        sanitized_output = {}
-        for category in ["ubicaciones", "precios", "horarios", "disciplinas"]:
-            if category in parsed_json and isinstance(parsed_json[category], list):
-                # Pasa la lista de hechos a través de nuestra red de seguridad
-                sanitized_facts = _sanitize_and_generate_content(parsed_json[category], category)
-                sanitized_output[category] = sanitized_facts
-            else:
-                # Asegurarse de que la clave siempre exista, incluso si está vacía
-                sanitized_output[category] = []
-
-        logging.info("✅ Sanitization complete.")
-        return sanitized_output
-        # --- FIN DE LA NUEVA LÓGICA ---
-
-    except Exception as e:
-        logging.error(f"     ❌ An error occurred calling OpenAI: {e}")
-        return {"ubicaciones": [], "precios": [], "horarios": [], "disciplinas": []}
+    # IMPORTANT: Use JSON mode to guarantee valid JSON output
+    request["response_format"] = {"type": "json_object"}
+    return request
 
 
-def categorize_urls_with_llm(urls: list[dict[str, str]], client: openai.OpenAI) -> dict[str, list[dict[str, str]]]:
+def parse_extraction_response(response_content: str | None, page_url: str | None = None) -> dict[str, list[dict[str, Any]]]:
     """
-    Uses an OpenAI LLM to categorize URLs based on their likely content.
+    Parses the JSON answer of an extraction call and runs every category through the sanitizer.
+    If `page_url` is given, facts without a `fuente` are tagged with it.
+    """
+    # The entire response is a JSON object, but the actual data is inside a list.
+    # Sometimes the model might wrap the list in a key, e.g., {"data": [...]}.
+    # We need to robustly extract the list.
+    if not response_content:
+        return {}
+
+    parsed_json = json.loads(response_content)
+    return sanitize_extraction(parsed_json, page_url)
+
+
+def sanitize_extraction(parsed_json: dict, page_url: str | None = None) -> dict[str, list[dict[str, Any]]]:
+    sanitized_output = {}
+    for category in EXTRACTION_CATEGORIES:
+        if category in parsed_json and isinstance(parsed_json[category], list):
+            # Pasa la lista de hechos a través de nuestra red de seguridad
+            sanitized_facts = _sanitize_and_generate_content(parsed_json[category], category)
+            if page_url:
+                for fact in sanitized_facts:
+                    fact.setdefault("fuente", page_url)
+            sanitized_output[category] = sanitized_facts
+        else:
+            # Asegurarse de que la clave siempre exista, incluso si está vacía
+            sanitized_output[category] = []
 
-    Args:
-        urls: A list of URL dict (url, lastmod, changefreq, priority)  to categorize.
-        client: An initialized OpenAI client instance.
+    logging.info("✅ Sanitization complete.")
+    return sanitized_output
 
-    Returns:
-        A dictionary categorizing the URLs.
-    """
 
-    # This is the prompt template from above
-    prompt_template = """
+def extract_structured_data(
+        client: openai.OpenAI,
+        page_url: str,
+        url_type: str,
+        html_content: str,
+        gym_name: str,
+        lastmod: str,
+        freq: str,
+        start_level: int = 0,
+        problems: list[str] | None = None,
+        html_tokens: int | None = None
+) -> dict[str, list[dict[str, Any]]]:
+    """
+    Uses an OpenAI model to parse HTML and extract a list of structured "fact documents".
+    Starts with the cheapest model in EXTRACTION_CASCADE (or `start_level`) and moves up only when the
+    output fails validation, unless the gym is over its token budget (one attempt on the smaller model). `problems` carries failures of an earlier attempt made elsewhere (packed call, batch).
+    The answer is streamed and each fact is validated as it completes, so a failing attempt is cut short
+    instead of waiting for the whole completion. `html_tokens` is passed on to extraction_request.
+    """
+    reasons = list(problems or [])
+    has_schedule_info = looks_like_schedule(html_content)
+    extracted = empty_extraction()
+    attempt_problems = []
+    models = EXTRACTION_CASCADE[start_level:]
+    if not get_ledger().allow_escalation(gym_name):
+        models = [get_ledger().model_for(gym_name, models[0], "extract")]  # presupuesto de tokens: un solo intento
+    model = models[0]
+    with span("extract", url=page_url) as attrs:
+        for level, model in enumerate(models):
+            if attempt_problems:
+                logging.info(f"⬆️ Escalating {page_url} to {model}")
+                reasons.extend(attempt_problems)
+            request = extraction_request(page_url, url_type, html_content, gym_name, lastmod, freq, has_schedule_info,
+                                         model, html_tokens)
+            try:
+                # El conteo del prompt corre en un worker mientras llega la respuesta
+                prompt_tokens = get_pool().submit(count_prompt_tokens, EXTRACTION_PROMPT.name,
+                                                  request["messages"][-1]["content"], request["model"])
+                logging.info(f"Calling OpenAI to extract data from {page_url}...")
+                fact_failures = []
+                can_escalate = level + 1 < len(models)
+
+                def check_fact(path, fact):
+                    if path and path[-1] in EXTRACTION_CATEGORIES:
+                        fact_failures.extend(fact_problems(path[-1], fact))
+                    return can_escalate and bool(fact_failures)
+
+                stream = stream_completion(client, request, on_fact=check_fact)
+                prompt_tokens = get_pool().result(prompt_tokens)
+                logging.info(f"Processed {prompt_tokens} tokens with {request['model']}")
+                if stream.stopped:
+                    # Cortado antes del chunk final con `usage`: se registra una estimación (prompt + lo recibido)
+                    record_usage(request["model"], {"prompt_tokens": prompt_tokens,
+                                                    "completion_tokens": count_tokens(stream.text, request["model"])},
+                                 request.get("prompt_cache_key"))
+                    extracted, attempt_problems = empty_extraction(), fact_failures
+                else:
+                    if stream.complete:
+                        extracted = parse_extraction_response(stream.document(), page_url)
+                    else:
+                        logging.warning(f"⚠️ Extraction for {page_url} did not close, keeping {len(stream.facts)} complete facts")
+                        extracted = sanitize_extraction(stream.partial(), page_url)
+                    attempt_problems = extraction_problems(extracted, html_content)
+            except Exception as e:
+                logging.error(f"     ❌ An error occurred calling OpenAI: {e}")
+                extracted = empty_extraction()
+                attempt_problems = [f"error: {e}"]
+            if not attempt_problems:
+                break
+            logging.warning(f"⚠️ {model} output for {page_url} failed validation: {attempt_problems[:3]}")
+        attrs["model"] = model
+    record_extraction(gym_name, model, reasons, accepted=not attempt_problems)
+    return extracted
+
+
+URL_CATEGORIES = ["locations", "pricing", "schedules", "disciplines"]
+
+CATEGORIZATION_PROMPT = register_prompt(PromptTemplate("categorization", 1, prefix="""
 You are an expert data architect and SEO analyst specializing in the fitness industry. Your task is to analyze a list of URLs from a gym's website sitemap and categorize them based on their likely content.
 
 You will be given a JSON list of URLs. Your goal is to determine which URLs are most likely to contain information about:
@@ -446,77 +543,74 @@ Analyze the URL path carefully. Prioritize Spanish keywords such as 'sedes', 'pr
 **Task: Categorize the following URLs.**
 
 **Input URLs:**
-{urls_json}
+""", suffix="""{urls_json}
 
 **Your Output:**
-"""
-    urls_list = [url["loc"] for url in urls]
-    # Format the list of URLs as a JSON string for the prompt
-    urls_as_json_string = json.dumps(urls_list)
+"""))
 
-    # Inject the URLs into the prompt
-    full_prompt = prompt_template.format(urls_json=urls_as_json_string)
 
-    try:
-        logging.info("🤖 Calling OpenAI to categorize URLs...")
+def categorize_locs(locs: list[str], client: openai.OpenAI) -> dict[str, list[str]]:
+    """
+    Asks the LLM for the categories of each URL (loc -> categories; [] if it fits none).
+    Raises on API or parsing errors, so callers can tell a failed call from an uncategorized URL.
+    """
+    # Inject the URLs into the prompt, formatted as a JSON list
+    request = CATEGORIZATION_PROMPT.request("gpt-4o-mini", urls_json=json.dumps(locs))  # Use a fast, affordable model
+    logging.info(f"🤖 Calling OpenAI to categorize {len(locs)} URLs...")
+    with span("llm", model="gpt-4o-mini"):
         completion = client.chat.completions.create(
-            model="gpt-4o-mini",  # Use a fast, affordable model
-            messages=[
-                {"role": "user", "content": full_prompt}
-            ],
+            **request,
             temperature=0.0,  # Set to 0 for deterministic, factual tasks
             response_format={"type": "json_object"}  # Enable JSON mode
         )
+        record_usage("gpt-4o-mini", completion.usage, prompt=CATEGORIZATION_PROMPT.key)
+    logging.info("✅ OpenAI response received.")
 
-        response_content = completion.choices[0].message.content
-        logging.info("✅ OpenAI response received.")
-
-        # Parse the response safely
-        categorized_urls = json.loads(response_content)
-
-        # Create final mapping with metadata included
-        url_lookup = {u["loc"]: u for u in urls}
-        final_result = defaultdict(list)
+    categories = {loc: [] for loc in locs}
+    for key, values in json.loads(completion.choices[0].message.content).items():
+        for loc in values:
+            categories.setdefault(loc, [])
+            if key not in categories[loc]:
+                categories[loc].append(key)
+    return categories
 
-        for key, values in categorized_urls.items():
-            for url in values:
-                if url in url_lookup:
-                    final_result[key].append(url_lookup[url])
-                else:
-                    # If URL not found (e.g., model output error), still include it
-                    final_result[key].append({"loc": url, "lastmod": None, "changefreq": None, "priority": None})
 
-        # Ensure all expected categories exist
-        for k in ["locations", "pricing", "schedules", "disciplines"]:
-            final_result.setdefault(k, [])
+def categorize_urls_with_llm(urls: list[dict[str, str]], client: openai.OpenAI) -> dict[str, list[dict[str, str]]]:
+    """
+    Uses an OpenAI LLM to categorize URLs based on their likely content.
 
-        return dict(final_result)
+    Args:
+        urls: A list of URL dict (url, lastmod, changefreq, priority)  to categorize.
+        client: An initialized OpenAI client instance.
 
+    Returns:
+        A dictionary categorizing the URLs.
+    """
+    try:
+        categories = categorize_locs([url["loc"] for url in urls], client)
     except Exception as e:
         logging.error(f"❌ An error occurred while calling OpenAI: {e}")
-        return {"locations": [], "pricing": [], "schedules": [], "disciplines": []}
+        return {k: [] for k in URL_CATEGORIES}
 
+    # Create final mapping with metadata included
+    url_lookup = {u["loc"]: u for u in urls}
+    final_result = defaultdict(list)
+    for loc, keys in categories.items():
+        for key in keys:
+            # If URL not found (e.g., model output error), still include it
+            final_result[key].append(url_lookup.get(loc) or {"loc": loc, "lastmod": None, "changefreq": None, "priority": None})
 
-def merge_gym_data_with_llm(gym_name: str, url_to_json_map: dict[str, dict | str], client: openai.OpenAI) -> dict:
-    """
-    Usa un LLM para combinar múltiples outputs JSON (uno por URL)
-    en un único JSON con las claves 'ubicaciones', 'precios', 'horarios' y 'disciplinas'.
-    """
-
-    serialized_sections = []
-    for url, content in url_to_json_map.items():
-        if isinstance(content, dict):
-            content_str = json.dumps(content, ensure_ascii=False, indent=2)
-        else:
-            content_str = str(content)
-        serialized_sections.append(f"📄 **URL:** {url}\n```json\n{content_str}\n```")
+    # Ensure all expected categories exist
+    for k in URL_CATEGORIES:
+        final_result.setdefault(k, [])
+    return dict(final_result)
 
-    joined_inputs = "\n\n---\n\n".join(serialized_sections)
 
-    prompt = f"""
+MERGE_PROMPT = register_prompt(PromptTemplate(
+    "merge", 1, system="Eres un asistente experto en fusión y deduplicación de datos JSON.", prefix="""
 Eres un experto en integración y limpieza de datos para gimnasios y centros fitness.
 
-Tu tarea es combinar y deduplicar información estructurada extraída desde **múltiples páginas del gimnasio "{gym_name}"**.
+Tu tarea es combinar y deduplicar información estructurada extraída desde **múltiples páginas de un mismo gimnasio**, cuyo nombre se indica junto a los datos de entrada.
 
 Cada página contiene datos parciales en formato JSON, con las claves:
 `"ubicaciones"`, `"precios"`, `"disciplinas"`.
@@ -527,11 +621,10 @@ Cada página contiene datos parciales en formato JSON, con las claves:
 Fusiona todas las entradas de distintas URLs en **un solo objeto JSON unificado**, asegurando:
 
 1. **Integridad:** No pierdas información relevante de ningún fragmento.
-2. **Consistencia:** Unifica formato, tipos de datos y nombres de sedes. CONSIDERA EL CASO ESPECIFICO DE LIMA, PERU, Y SUS DISTRITOS DE SECTOR A-B. COMO SAN ISIDRO, SURCO, MIRAFLORES, 
-LA MOLINA. UNIFICA LAS SEDES EN BASE A ELLO. SI UNA DISCIPLINA SE REPITE EN TODAS LAS SEDES USAR "Todas" EN VEZ DE CREAR DOS RECORDS POR SEDE.
+2. **Consistencia:** Unifica las sedes por distrito. SI UNA DISCIPLINA SE REPITE EN TODAS LAS SEDES USAR "Todas" EN VEZ DE CREAR DOS RECORDS POR SEDE.
 COLOCA LAS REFERENCIAS A TODAS LAS SEDES (campo "sede" en horarios, precios, disciplinas) COMO DISTRITO, NO COMO CALLE.
 3. **Deduplicación:** Si varias URLs repiten la misma sede o dirección, mantenla solo una vez. IMPORTANTE: Múltiples urls pueden hablar de la misma disciplina, unificar 
-en una sola disciplina, creando una descripción unida de todos los duplicados encontrados.
+en una sola disciplina, creando una descripción unida de todos los duplicados encontrados. Las disciplinas con el mismo `"disciplina_id"` son la misma disciplina; conserva ese campo.
 4. **Vinculación:** Asegura que cada precio tenga un campo `"sede"` coherente.
 5. **Idioma:** Devuelve todos los textos en español natural.
 6. **Trazabilidad:** DEBES incluir la URL de referencia en cada elemento JSON, en el campo "fuente". En caso haya más de una URL que haga referencia a un mismo precio, sede u disciplina agrégalas como 
@@ -545,7 +638,7 @@ lo más precisa posible (calle, número, distrito, ciudad). Asumir que no es pro
 
 ```json
 {{
-  "gym": "{gym_name}",
+  "gym": str,
   "ubicaciones": [
     {{
       "content_para_busqueda": str,
@@ -571,12 +664,15 @@ lo más precisa posible (calle, número, distrito, ciudad). Asumir que no es pro
       "content_para_busqueda": str,
       "sede": str,
       "nombre": str,
+      "disciplina_id": str,
       "descripcion": str,
       "fuente": str
     }}
   ]
 }}
 ```  
+""", suffix="""    🏋️ Gimnasio: "{gym_name}"
+
     📦 Datos de entrada:
 
     {joined_inputs}
@@ -585,26 +681,47 @@ lo más precisa posible (calle, número, distrito, ciudad). Asumir que no es pro
 
     Devuelve solo el JSON final. No incluyas explicaciones ni comentarios.
     🚫 Importante: No devuelvas el JSON dentro de bloques de código ni uses comillas triples. Solo devuelve el objeto JSON plano.
+    """))
+
+
+def merge_gym_data_with_llm(gym_name: str, url_to_json_map: dict[str, dict | str], client: openai.OpenAI,
+                            on_fact: Callable[[tuple[str, ...], dict], None] | None = None) -> dict:
     """
-    enc = tiktoken.encoding_for_model("gpt-5-mini")
-    tokens = enc.encode(prompt)
-    logging.info(f"Processing {len(tokens)} tokens with gpt-5-mini...")
+    Usa un LLM para combinar múltiples outputs JSON (uno por URL)
+    en un único JSON con las claves 'ubicaciones', 'precios', 'horarios' y 'disciplinas'.
+    La respuesta llega en streaming: `on_fact(path, fact)` recibe cada registro apenas se completa,
+    y una salida cortada por longitud se continúa y se une con la anterior.
+    """
+
+    serialized_sections = []
+    for url, content in url_to_json_map.items():
+        if isinstance(content, dict):
+            content_str = json.dumps(content, ensure_ascii=False, indent=2)
+        else:
+            content_str = str(content)
+        serialized_sections.append(f"📄 **URL:** {url}\n```json\n{content_str}\n```")
+
+    joined_inputs = "\n\n---\n\n".join(serialized_sections)
+
+    model = get_ledger().model_for(gym_name, "gpt-5-mini", "merge")
+    request = MERGE_PROMPT.request(model, gym_name=gym_name, joined_inputs=joined_inputs)
+    request["response_format"] = {"type": "json_object"}
+    prompt_tokens = get_pool().submit(count_prompt_tokens, MERGE_PROMPT.name, request["messages"][-1]["content"], model)
     logging.info("Merging all gym scraped information ...")
-    response = client.chat.completions.create(
-        model="gpt-5-mini",
-        messages=[
-            {"role": "system", "content": "Eres un asistente experto en fusión y deduplicación de datos JSON."},
-            {"role": "user", "content": prompt},
-        ],
-        response_format={"type": "json_object"}
-    )
+    def emit(path, fact):
+        if on_fact:
+            on_fact(path, fact)  # el merge nunca se corta antes de tiempo
+
+    stream = stream_completion(client, request, on_fact=emit)
+    logging.info(f"Processed {get_pool().result(prompt_tokens)} tokens with {model}")
 
-    text_output = response.choices[0].message.content.strip()
-    if not text_output.strip().endswith(']') and not text_output.strip().endswith('}'):
-        logging.warning("⚠️ Output truncated, requesting continuation...")
+    text_output = stream.text.strip()
     try:
-        return json.loads(text_output)
+        return json.loads(stream.document() or text_output)
     except json.JSONDecodeError:
+        if stream.facts:
+            logging.warning(f"⚠️ El JSON no se cerró; se conservan {len(stream.facts)} registros completos.")
+            return stream.partial()
         logging.warning("⚠️ El modelo devolvió texto no válido. Retornando texto crudo.")
         return {"raw_output": text_output}
 
@@ -0,0 +1,166 @@
+import logging
+import re
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+# Formas en que las páginas escriben horas: "7am", "7:30 p.m.", "19:00", "7.30pm", "19h30", "19 hrs"
+HORA_PATTERN = re.compile(
+    r"^\s*(?P<hour>\d{1,2})(?:\s*[:.h]\s*(?P<minute>\d{2}))?(?::\d{2})?\s*"
+    r"(?P<ampm>a\.?\s?m\.?|p\.?\s?m\.?)?\s*(?:hrs?\.?|horas)?\s*$",
+    re.IGNORECASE,
+)
+# Fechas aceptadas: DD-MM-YYYY, DD/MM/YYYY, DD-MM (año de la corrida) o ISO YYYY-MM-DD
+FECHA_PATTERN = re.compile(r"^\s*(?:\d{4}-\d{1,2}-\d{1,2}|\d{1,2}[-/]\d{1,2}(?:[-/]\d{2,4})?)\s*$")
+USD_PATTERN = re.compile(r"US\$|USD|\$|d[oó]lar", re.IGNORECASE)
+PEN_PATTERN = re.compile(r"S/|PEN|sol(?:es)?\b", re.IGNORECASE)
+
+DIAS_SEMANA = ["Lunes", "Martes", "Miércoles", "Jueves", "Viernes", "Sábado", "Domingo"]
+
+# Distritos de Lima Metropolitana y Callao, con las formas cortas que usan las páginas
+LIMA_DISTRICTS = {
+    "Ancón": [], "Ate": ["ate vitarte"], "Barranco": [], "Breña": [], "Carabayllo": [], "Chaclacayo": [],
+    "Chorrillos": [], "Cieneguilla": [], "Comas": [], "El Agustino": [], "Independencia": [],
+    "Jesús María": [], "La Molina": [], "La Victoria": [], "Lima": ["cercado de lima", "cercado", "lima cercado"],
+    "Lince": [], "Los Olivos": [], "Lurigancho": ["chosica"], "Lurín": [], "Magdalena del Mar": ["magdalena"],
+    "Miraflores": [], "Pachacámac": [], "Pucusana": [], "Pueblo Libre": [], "Puente Piedra": [],
+    "Punta Hermosa": [], "Punta Negra": [], "Rímac": [], "San Bartolo": [], "San Borja": [], "San Isidro": [],
+    "San Juan de Lurigancho": ["sjl"], "San Juan de Miraflores": ["sjm"], "San Luis": [],
+    "San Martín de Porres": ["smp"], "San Miguel": [], "Santa Anita": [], "Santa María del Mar": [],
+    "Santa Rosa": [], "Santiago de Surco": ["surco"], "Surquillo": [], "Villa El Salvador": ["ves"],
+    "Villa María del Triunfo": ["vmt"], "Callao": [], "Bellavista": [], "Carmen de la Legua": [],
+    "La Perla": [], "La Punta": [], "Ventanilla": [], "Mi Perú": [],
+}
+
+
+def _fold(series: pd.Series) -> pd.Series:
+    """Lowercase, accent-free text for matching."""
+    return (series.fillna("").astype(str).str.normalize("NFKD")
+            .str.encode("ascii", "ignore").str.decode("ascii").str.lower())
+
+
+def _fold_text(text: str) -> str:
+    return _fold(pd.Series([text])).iloc[0]
+
+
+DISTRICT_ALIASES = {_fold_text(alias): name for name, aliases in LIMA_DISTRICTS.items() for alias in [name, *aliases]}
+# Las formas largas primero, para que "san juan de miraflores" gane a "miraflores"
+DISTRICT_PATTERN = r"\b(" + "|".join(re.escape(a) for a in sorted(DISTRICT_ALIASES, key=len, reverse=True)) + r")\b"
+DIAS_ALIASES = {_fold_text(dia): dia for dia in DIAS_SEMANA}
+
+
+def _blank(series: pd.Series) -> pd.Series:
+    return series.isna() | series.astype(str).str.strip().eq("")
+
+
+def normalize_times(series: pd.Series) -> pd.Series:
+    """Any hour notation -> "HH:MM" (24h). Values that cannot be read are kept as they came."""
+    parts = series.astype("string").str.extract(HORA_PATTERN.pattern, flags=re.IGNORECASE)
+    hour = pd.to_numeric(parts["hour"], errors="coerce")
+    minute = pd.to_numeric(parts["minute"], errors="coerce").fillna(0)
+    ampm = parts["ampm"].str[0].str.lower().fillna("")
+    hour = np.where(ampm.eq("p") & (hour < 12), hour + 12, hour)
+    hour = np.where(ampm.eq("a") & (hour == 12), 0, hour)
+    valid = (hour >= 0) & (hour <= 23) & (minute <= 59)
+    formatted = pd.Series(hour, index=series.index).fillna(0).astype(int).map("{:02d}".format) + ":" + \
+        minute.astype(int).map("{:02d}".format)
+    return formatted.where(valid, series)
+
+
+def normalize_dates(series: pd.Series, run_date: date | None = None) -> pd.Series:
+    """DD-MM-YYYY, DD/MM/YY, DD-MM (año de la corrida) or ISO -> "YYYY-MM-DD"; unreadable values are kept."""
+    year = (run_date or date.today()).year
+    values = series.astype("string").str.strip().str.replace("/", "-", regex=False)
+    parsed = pd.to_datetime(values, format="%Y-%m-%d", errors="coerce")
+    for fmt, suffix in [("%d-%m-%Y", ""), ("%d-%m-%y", ""), ("%d-%m-%Y", f"-{year}")]:
+        parsed = parsed.fillna(pd.to_datetime(values + suffix, format=fmt, errors="coerce"))
+    return parsed.dt.strftime("%Y-%m-%d").where(parsed.notna(), series)
+
+
+def normalize_weekdays(series: pd.Series) -> pd.Series:
+    """"miercoles", "MIÉRCOLES" -> "Miércoles"."""
+    return _fold(series).str.strip().map(DIAS_ALIASES).where(lambda s: s.notna(), series)
+
+
+def parse_valor(series: pd.Series) -> pd.Series:
+    """"S/ 1,500.00", "1.500", "99,90" or numbers -> float. Thousands separators are told apart from decimals by position."""
+    is_number = series.map(lambda v: isinstance(v, (int, float)) and not isinstance(v, bool))
+    numeric = pd.to_numeric(series.where(is_number), errors="coerce")
+    digits = series.astype("string").str.replace(r"[^\d.,]", "", regex=True).str.strip(".,")
+    comma_thousands = digits.str.fullmatch(r"\d{1,3}(,\d{3})+(\.\d+)?")
+    dot_thousands = digits.str.fullmatch(r"\d{1,3}(\.\d{3})+(,\d+)?")
+    cleaned = digits.where(~comma_thousands.fillna(False), digits.str.replace(",", "", regex=False))
+    cleaned = cleaned.where(~dot_thousands.fillna(False), digits.str.replace(".", "", regex=False))
+    cleaned = cleaned.str.replace(",", ".", regex=False)
+    return numeric.fillna(pd.to_numeric(cleaned, errors="coerce"))
+
+
+def normalize_currency(moneda: pd.Series, valor: pd.Series) -> pd.Series:
+    """PEN or USD, from the moneda field or else the symbol written next to the price; PEN by default."""
+    text = moneda.fillna("").astype(str) + " " + valor.fillna("").astype(str)
+    return pd.Series(np.where(text.str.contains(USD_PATTERN) & ~text.str.contains(PEN_PATTERN), "USD", "PEN"),
+                     index=moneda.index)
+
+
+def canonical_districts(series: pd.Series) -> pd.Series:
+    """
+    Canonical Lima district found in the text ("Av. Larco 123, Miraflores, Lima" -> "Miraflores"), else NaN.
+    Addresses end with the district, so the last match wins ("Av. Independencia 123, Miraflores" -> "Miraflores").
+    """
+    matches = _fold(series).str.findall(DISTRICT_PATTERN)
+    # "Lima" aparece en casi todas las direcciones: solo cuenta si no hay otro distrito
+    best = matches.map(lambda found: ([m for m in found if m != "lima"] or found or [None])[-1])
+    return best.map(DISTRICT_ALIASES)
+
+
+def _normalize_category(category: str, df: pd.DataFrame, run_date: date | None) -> pd.DataFrame:
+    if category == "horarios":
+        for column in ("hora_inicio", "hora_fin"):
+            if column in df:
+                df[column] = normalize_times(df[column])
+        if "fecha" in df:
+            df["fecha"] = normalize_dates(df["fecha"], run_date)
+            if "dia_semana" in df:
+                # Día de la semana desde la fecha cuando el modelo no lo dio
+                dias = pd.to_datetime(df["fecha"], format="%Y-%m-%d", errors="coerce").dt.dayofweek
+                from_fecha = dias.map(lambda d: DIAS_SEMANA[int(d)] if d == d else None)
+                df["dia_semana"] = df["dia_semana"].where(~_blank(df["dia_semana"]), from_fecha)
+        if "dia_semana" in df:
+            df["dia_semana"] = normalize_weekdays(df["dia_semana"])
+    elif category == "precios" and "valor" in df:
+        moneda = df["moneda"] if "moneda" in df else pd.Series("", index=df.index)
+        df["moneda"] = normalize_currency(moneda, df["valor"])
+        df["valor"] = parse_valor(df["valor"])
+    elif category == "ubicaciones":
+        distrito = df["distrito"] if "distrito" in df else pd.Series(None, index=df.index, dtype=object)
+        found = canonical_districts(distrito)
+        if "direccion_completa" in df:
+            found = found.fillna(canonical_districts(df["direccion_completa"]))
+        df["distrito"] = found.fillna(distrito)
+    if "sede" in df:
+        # Las sedes se nombran por distrito; "Todas" u otros nombres quedan igual
+        df["sede"] = canonical_districts(df["sede"]).fillna(df["sede"])
+    return df
+
+
+def normalize_facts(extractions: list[dict], run_date: date | None = None) -> list[dict]:
+    """
+    Normalizes every fact of a list of extraction dicts (category -> list of facts) in one pass per category:
+    hora_inicio/hora_fin to 24h "HH:MM", fecha to ISO, valor to float with moneda PEN/USD, distrito (and sede)
+    to the canonical Lima district. Facts are updated in place and the same list is returned.
+    """
+    by_category = {}
+    for extraction in extractions:
+        for category, facts in (extraction or {}).items():
+            if isinstance(facts, list):
+                by_category.setdefault(category, []).extend(f for f in facts if isinstance(f, dict))
+    for category, facts in by_category.items():
+        if not facts:
+            continue
+        df = _normalize_category(category, pd.DataFrame.from_records(facts), run_date)
+        df = df.astype(object).where(df.notna(), None)
+        for fact, row in zip(facts, df.to_dict("records")):
+            fact.update({k: v for k, v in row.items() if k in fact or v is not None})
+    logging.info(f"🧹 Normalized {sum(len(f) for f in by_category.values())} facts")
+    return extractions
@@ -0,0 +1,189 @@
+import datetime
+import json
+import logging
+import os
+
+import openai
+
+from src.ledger import get_ledger
+from src.llm import (
+    EXTRACTION_CASCADE,
+    EXTRACTION_CATEGORIES,
+    EXTRACTION_INSTRUCTIONS,
+    count_tokens,
+    extract_structured_data,
+    record_extraction,
+    sanitize_extraction,
+)
+from src.prompts import PromptTemplate, register_prompt
+from src.streaming import stream_completion
+from src.telemetry import span
+from src.validation import extraction_problems, looks_like_schedule
+from src.workers import get_pool
+
+PACK_PAGE_MAX_TOKENS = int(os.getenv("PACK_PAGE_MAX_TOKENS", 1_500))  # pages above this go alone
+PACK_TOKEN_BUDGET = int(os.getenv("PACK_TOKEN_BUDGET", 6_000))  # html tokens per packed call
+PACK_MAX_PAGES = int(os.getenv("PACK_MAX_PAGES", 8))
+
+PACKED_PAGE_TEMPLATE = """=== PÁGINA {page_id} ===
+**page_url:** "{page_url}"
+**url_type:** "{url_type}"
+**lastmod**
+{last_mod}
+**changefreq**
+{changefreq}
+**html_content:**
+'''
+{html_content}
+'''
+=== FIN PÁGINA {page_id} ==="""
+
+PACKED_TASK_TEMPLATE = """
+**Tarea Final:**
+Las siguientes entradas contienen {page_count} páginas del gimnasio "{gym_name}", cada una delimitada por `=== PÁGINA <id> ===` y `=== FIN PÁGINA <id> ===`.
+Analiza cada página de forma independiente aplicando todas las reglas anteriores. El campo "fuente" de cada elemento es la page_url de la página donde aparece el dato.
+
+**gym_name:** "{gym_name}"
+**date**
+{date}
+
+{pages}
+
+**Tu Salida:**
+Un único objeto JSON cuyas claves son los identificadores de página ({page_ids}). El valor de cada clave es el objeto estructurado de esa página, con las claves "ubicaciones", "precios", "horarios" y "disciplinas" (listas vacías si no hay datos).
+```json
+{{"P1": {{"ubicaciones": [], "precios": [], "horarios": [], "disciplinas": []}}, "P2": ...}}
+```
+"""
+
+# Mismo prefijo estático que la extracción de una página
+PACKED_PROMPT = register_prompt(PromptTemplate("packed_extraction", 1, EXTRACTION_INSTRUCTIONS, PACKED_TASK_TEMPLATE))
+
+
+def page_token_counts(pages: list[dict]) -> list[int]:
+    """html tokens of every page, counted in the worker pool."""
+    return get_pool().map(count_tokens, [page["html_content"] for page in pages])
+
+
+def plan_packs(pages: list[dict], token_budget: int | None = None, max_pages: int | None = None,
+               page_tokens: list[int] | None = None) -> tuple[list[list[int]], list[int]]:
+    """
+    Groups small, schedule-free pages of the same gym into packs (greedily, in order) under `token_budget`
+    html tokens and `max_pages` pages. Returns (packs, singles) as indices into `pages`;
+    packs of one page are returned as singles since packing them saves nothing.
+    `page_tokens` are the html token counts of the pages (page_token_counts) if already known.
+    """
+    if page_tokens is None:
+        page_tokens = page_token_counts(pages)
+    token_budget = token_budget or PACK_TOKEN_BUDGET
+    max_pages = max_pages or PACK_MAX_PAGES
+    packs, singles = [], []
+    open_packs = {}  # gym_name -> (indices, tokens)
+    for i, page in enumerate(pages):
+        tokens = page_tokens[i]
+        if tokens > PACK_PAGE_MAX_TOKENS or looks_like_schedule(page["html_content"]):
+            singles.append(i)
+            continue
+        indices, used = open_packs.get(page["gym_name"], ([], 0))
+        if indices and (used + tokens > token_budget or len(indices) >= max_pages):
+            packs.append(indices)
+            indices, used = [], 0
+        open_packs[page["gym_name"]] = (indices + [i], used + tokens)
+    packs.extend(indices for indices, _ in open_packs.values())
+    singles.extend(pack[0] for pack in packs if len(pack) == 1)
+    return [pack for pack in packs if len(pack) > 1], sorted(singles)
+
+
+def packed_extraction_request(pages: list[dict]) -> dict:
+    """chat.completions body extracting several pages (of one gym) in a single call; pages are P1..Pn."""
+    blocks = [
+        PACKED_PAGE_TEMPLATE.format(
+            page_id=f"P{n}",
+            page_url=page["page_url"],
+            url_type=page["url_type"],
+            last_mod=page["lastmod"],
+            changefreq=page["freq"],
+            html_content=page["html_content"],
+        )
+        for n, page in enumerate(pages, start=1)
+    ]
+    request = PACKED_PROMPT.request(
+        EXTRACTION_CASCADE[0],
+        page_count=len(pages),
+        gym_name=pages[0]["gym_name"],
+        date=datetime.date.today().strftime("%A, %d-%m-%Y").capitalize(),
+        pages="\n\n".join(blocks),
+        page_ids=", ".join(f"P{n}" for n in range(1, len(pages) + 1)),
+    )
+    request["response_format"] = {"type": "json_object"}
+    return request
+
+
+def split_packed_response(response_content: str | None, pages: list[dict]) -> list[dict | None]:
+    """
+    Splits a packed answer back into one extraction per page, with `fuente` set to the page's own URL.
+    Pages the model skipped (or answered with something that is not an object) come back as None.
+    """
+    if not response_content:
+        return [None] * len(pages)
+    parsed_json = json.loads(response_content)
+    results = []
+    for n, page in enumerate(pages, start=1):
+        page_json = parsed_json.get(f"P{n}")
+        if not isinstance(page_json, dict) or not any(category in page_json for category in EXTRACTION_CATEGORIES):
+            results.append(None)
+            continue
+        extracted = sanitize_extraction(page_json)
+        for facts in extracted.values():
+            for fact in facts:
+                fact["fuente"] = page["page_url"]
+        results.append(extracted)
+    return results
+
+
+def extract_pages(client: openai.OpenAI, pages: list[dict]) -> list[dict]:
+    """
+    Synchronous extraction of a list of pages (dicts with gym_name, page_url, url_type, html_content,
+    lastmod and freq). Small pages are packed into shared calls on the cheapest model; the rest, and any
+    page a packed answer missed, go through extract_structured_data. Packed pages that fail validation
+    are re-extracted alone one level up the cascade. Returns the extracted data per page, in order.
+    """
+    page_tokens = page_token_counts(pages)
+    packs, singles = plan_packs(pages, page_tokens=page_tokens)
+    results: list[dict | None] = [None] * len(pages)
+    if packs:
+        logging.info(f"📦 Packing {sum(len(pack) for pack in packs)} small pages into {len(packs)} extraction calls")
+    for pack in packs:
+        pack_pages = [pages[i] for i in pack]
+        try:
+            with span("extract", pages=len(pack_pages)):
+                stream = stream_completion(client, packed_extraction_request(pack_pages))
+            # Si la respuesta no cerró, las páginas con hechos completos se conservan y el resto se extrae aparte
+            extracted = split_packed_response(stream.document() or json.dumps(stream.partial()), pack_pages)
+        except Exception as e:
+            logging.error(f"     ❌ Packed extraction failed, extracting {len(pack)} pages one by one: {e}")
+            extracted = [None] * len(pack)
+        for i, page_data in zip(pack, extracted):
+            results[i] = page_data
+    for i, page in enumerate(pages):
+        if i in singles:
+            results[i] = extract_structured_data(client, page["page_url"], page["url_type"], page["html_content"],
+                                                 page["gym_name"], page["lastmod"], page["freq"],
+                                                 html_tokens=page_tokens[i])
+            continue
+        if results[i] is None:
+            logging.warning(f"⚠️ Packed answer missed {page['page_url']}, extracting it alone")
+            results[i] = extract_structured_data(client, page["page_url"], page["url_type"], page["html_content"],
+                                                 page["gym_name"], page["lastmod"], page["freq"],
+                                                 html_tokens=page_tokens[i])
+            continue
+        problems = extraction_problems(results[i], page["html_content"])
+        # Sin escalar si pasó, si no hay modelo mayor o si el gimnasio ya gastó su presupuesto de tokens
+        if not problems or len(EXTRACTION_CASCADE) < 2 or not get_ledger().allow_escalation(page["gym_name"]):
+            record_extraction(page["gym_name"], EXTRACTION_CASCADE[0], [], accepted=not problems)
+            continue
+        logging.warning(f"⚠️ Packed output for {page['page_url']} failed validation: {problems[:3]}")
+        results[i] = extract_structured_data(client, page["page_url"], page["url_type"], page["html_content"],
+                                             page["gym_name"], page["lastmod"], page["freq"],
+                                             start_level=1, problems=problems, html_tokens=page_tokens[i])
+    return results
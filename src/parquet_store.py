@@ -0,0 +1,177 @@
+import json
+import logging
+import os
+from datetime import date
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from src.dataframes import SHEETS
+
+# Typed columns per category. `run_date` and `nombre_gym` are not stored in the files, they are hive partitions.
+SCHEMAS = {
+    "disciplinas": pa.schema([
+        ("nombre", pa.string()),
+        ("disciplina_id", pa.string()),
+        ("sede", pa.string()),
+        ("descripcion", pa.string()),
+        ("content_para_busqueda", pa.string()),
+        ("fuente", pa.string()),
+    ]),
+    "ubicaciones": pa.schema([
+        ("direccion_completa", pa.string()),
+        ("distrito", pa.string()),
+        ("horario_atencion", pa.string()),
+        ("content_para_busqueda", pa.string()),
+        ("fuente", pa.string()),
+    ]),
+    "horarios": pa.schema([
+        ("sede", pa.string()),
+        ("nombre_clase", pa.string()),
+        ("disciplina_id", pa.string()),
+        ("instructor", pa.string()),
+        ("fecha", pa.date32()),
+        ("dia_semana", pa.string()),
+        ("hora_inicio", pa.time32("s")),
+        ("hora_fin", pa.time32("s")),
+        ("recurrencia", pa.string()),
+        ("fecha_inicio", pa.date32()),
+        ("fecha_fin", pa.date32()),
+        ("excepciones", pa.string()),
+        ("content_para_busqueda", pa.string()),
+        ("fuente", pa.string()),
+    ]),
+    "precios": pa.schema([
+        ("sede", pa.string()),
+        ("descripcion_plan", pa.string()),
+        ("valor", pa.float64()),
+        ("moneda", pa.string()),
+        ("recurrencia", pa.string()),
+        ("content_para_busqueda", pa.string()),
+        ("fuente", pa.string()),
+    ]),
+}
+PARTITIONING = ds.partitioning(
+    pa.schema([("run_date", pa.date32()), ("nombre_gym", pa.string())]), flavor="hive"
+)
+FORMATS = {"parquet": "parquet", "csv": "csv"}
+
+
+def _parse_times(series: pd.Series) -> pd.Series:
+    values = series.astype("string").str.strip()
+    parsed = pd.to_datetime(values, format="%H:%M", errors="coerce")
+    parsed = parsed.fillna(pd.to_datetime(values, format="%H:%M:%S", errors="coerce"))
+    return parsed.dt.time.where(parsed.notna(), None)
+
+
+def _parse_dates(series: pd.Series) -> pd.Series:
+    values = series.astype("string").str.strip()
+    parsed = pd.to_datetime(values, format="%d-%m-%Y", errors="coerce")
+    parsed = parsed.fillna(pd.to_datetime(values, format="%Y-%m-%d", errors="coerce"))
+    return parsed.dt.date.where(parsed.notna(), None)
+
+
+def _string_value(value) -> str | None:
+    """Lists and dicts as JSON, like the Excel export; everything else as text."""
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False)
+    return None if value is None or value != value else str(value)
+
+
+def typed_table(category: str, df: pd.DataFrame) -> pa.Table:
+    """Cast one category DataFrame to its typed Arrow schema (plus the `nombre_gym` partition column)."""
+    schema = SCHEMAS[category]
+    columns = {}
+    for field in schema:
+        series = df[field.name] if field.name in df else pd.Series([None] * len(df), dtype="object")
+        if pa.types.is_floating(field.type):
+            series = pd.to_numeric(series, errors="coerce")
+        elif pa.types.is_date(field.type):
+            series = _parse_dates(series)
+        elif pa.types.is_time(field.type):
+            series = _parse_times(series)
+        else:
+            series = series.map(_string_value)
+        columns[field.name] = pa.Array.from_pandas(series.reset_index(drop=True), type=field.type)
+    columns["nombre_gym"] = pa.array(df["nombre_gym"].astype(str).tolist(), type=pa.string())
+    return pa.table(columns)
+
+
+def write_run(dataframes: dict[str, pd.DataFrame], base_dir: str, run_date: date | None = None,
+              file_format: str = "parquet") -> dict[str, int]:
+    """
+    Writes each category as a dataset under base_dir/<category>/run_date=YYYY-MM-DD/nombre_gym=<gym>/.
+    Re-running the same day replaces that day's partitions for the gyms present in the run.
+    Returns the number of rows written per category.
+    """
+    if file_format not in FORMATS:
+        raise ValueError(f"Unsupported format: {file_format}")
+    run_date = run_date or date.today()
+    written = {}
+    for category in SHEETS:
+        df = dataframes.get(category)
+        if df is None or df.empty:
+            written[category] = 0
+            continue
+        table = typed_table(category, df)
+        table = table.append_column("run_date", pa.array([run_date] * table.num_rows, type=pa.date32()))
+        ds.write_dataset(
+            table,
+            os.path.join(base_dir, category),
+            format=FORMATS[file_format],
+            partitioning=PARTITIONING,
+            basename_template="part-{i}." + file_format,
+            existing_data_behavior="delete_matching",
+        )
+        written[category] = table.num_rows
+    logging.info(f"🗃️ Wrote {file_format} run {run_date.isoformat()} to {base_dir}: {written}")
+    return written
+
+
+def open_category(base_dir: str, category: str, file_format: str = "parquet") -> ds.Dataset:
+    """Open a category dataset lazily; no data file is read until the dataset is scanned."""
+    schema = SCHEMAS[category].append(pa.field("run_date", pa.date32())).append(pa.field("nombre_gym", pa.string()))
+    return ds.dataset(os.path.join(base_dir, category), format=FORMATS[file_format], schema=schema,
+                      partitioning=PARTITIONING)
+
+
+def _filter(start: date, end: date, gyms: list[str] | None):
+    expression = (pc.field("run_date") >= start) & (pc.field("run_date") <= end)
+    if gyms:
+        expression = expression & pc.field("nombre_gym").isin(gyms)
+    return expression
+
+
+def load_date_range(base_dir: str, category: str, start: date, end: date, gyms: list[str] | None = None,
+                    columns: list[str] | None = None, file_format: str = "parquet") -> pd.DataFrame:
+    """
+    Load a category for all runs between start and end (inclusive).
+    Filters are applied on the partitions, so only files from matching runs/gyms are opened.
+    """
+    if not os.path.isdir(os.path.join(base_dir, category)):
+        return pd.DataFrame(columns=columns or SCHEMAS[category].names + ["run_date", "nombre_gym"])
+    dataset = open_category(base_dir, category, file_format)
+    return dataset.to_table(columns=columns, filter=_filter(start, end, gyms)).to_pandas()
+
+
+def load_run(base_dir: str, category: str, run_date: date, gyms: list[str] | None = None,
+             columns: list[str] | None = None, file_format: str = "parquet") -> pd.DataFrame:
+    """Load a category for a single run date."""
+    return load_date_range(base_dir, category, run_date, run_date, gyms, columns, file_format)
+
+
+if __name__ == "__main__":
+    from src.dataframes import init_row_buffers, append_scraped_data, build_dataframes
+
+    data = {
+        "horarios": [{"sede": "Miraflores", "nombre_clase": "Yoga Flow", "instructor": "Mariana", "fecha": "18-01-2025",
+                      "dia_semana": "Martes", "hora_inicio": "09:00", "hora_fin": "10:00", "fuente": "https://gym.com/horarios"}],
+        "precios": [{"sede": "Todas", "descripcion_plan": "Plan anual", "valor": "1500", "moneda": "PEN", "recurrencia": "anual",
+                     "fuente": "https://gym.com/precios"}],
+    }
+    buffers = init_row_buffers()
+    append_scraped_data(buffers, "gym1", data)
+    write_run(build_dataframes(buffers), "../data/parquet")
+    print(load_run("../data/parquet", "horarios", date.today()))
@@ -0,0 +1,85 @@
+import functools
+import hashlib
+import os
+import string
+
+import tiktoken
+
+# prompt_cache_key en cada request: el proveedor enruta los prompts con el mismo prefijo a la misma caché
+PROMPT_CACHE_KEYS = os.getenv("PROMPT_CACHE_KEYS", "1").lower() not in ("0", "false", "no")
+
+
+@functools.lru_cache(maxsize=None)
+def encoding(model: str) -> tiktoken.Encoding:
+    """tiktoken encoding of `model`, looked up once per model; o200k_base for models tiktoken does not know."""
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+class PromptTemplate:
+    """
+    A versioned prompt: a static prefix (instructions and examples, identical for every call) followed by
+    the per-call part. The prefix is rendered once at import and always comes first, so every call with
+    the same template shares it byte for byte and the provider's prompt cache can serve it; the per-call
+    part is parsed once and only its fields are filled on each call. Both use `str.format` syntax, so a
+    literal brace in either is written `{{` / `}}`.
+    """
+
+    def __init__(self, name: str, version: int, prefix: str, suffix: str, system: str | None = None):
+        self.name = name
+        self.version = version
+        self.system = system
+        self.prefix = prefix.format()
+        self._parts = [(literal, field) for literal, field, _, _ in string.Formatter().parse(suffix)]
+        self.fields = {field for _, field in self._parts if field}
+        self.fingerprint = hashlib.sha256(f"{system}\x1f{prefix}\x1f{suffix}".encode("utf-8")).hexdigest()[:12]
+
+    @property
+    def key(self) -> str:
+        """`name-vN`: the prompt_cache_key of its requests and the label of its usage metrics."""
+        return f"{self.name}-v{self.version}"
+
+    def render(self, **values) -> str:
+        """The whole user message: the static prefix plus the per-call part."""
+        return self.prefix + "".join(literal + (str(values[field]) if field else "") for literal, field in self._parts)
+
+    def messages(self, **values) -> list[dict]:
+        messages = [{"role": "system", "content": self.system}] if self.system else []
+        return messages + [{"role": "user", "content": self.render(**values)}]
+
+    def request(self, model: str, **values) -> dict:
+        """chat.completions body (model, messages and the prompt_cache_key); callers add the rest."""
+        request = {"model": model, "messages": self.messages(**values)}
+        if PROMPT_CACHE_KEYS:
+            request["prompt_cache_key"] = self.key
+        return request
+
+    def prefix_tokens(self, model: str) -> int:
+        return _prefix_tokens(self, model)
+
+    def count_tokens(self, prompt: str, model: str) -> int:
+        """Tokens of a rendered prompt, encoding only what follows the prefix (the prefix count is cached)."""
+        if prompt.startswith(self.prefix):
+            return self.prefix_tokens(model) + len(encoding(model).encode(prompt[len(self.prefix):]))
+        return len(encoding(model).encode(prompt))
+
+
+@functools.lru_cache(maxsize=None)
+def _prefix_tokens(template: PromptTemplate, model: str) -> int:
+    return len(encoding(model).encode(template.prefix)) + (len(encoding(model).encode(template.system)) if template.system else 0)
+
+
+PROMPTS: dict[str, PromptTemplate] = {}
+
+
+def register_prompt(template: PromptTemplate) -> PromptTemplate:
+    """Adds a template to PROMPTS (by name); run reports list the versions in use."""
+    PROMPTS[template.name] = template
+    return template
+
+
+def prompt_versions() -> dict[str, str]:
+    """name -> `vN (fingerprint)` of every registered template, for the run record."""
+    return {name: f"v{template.version} ({template.fingerprint})" for name, template in sorted(PROMPTS.items())}
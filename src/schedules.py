@@ -0,0 +1,120 @@
+import logging
+from datetime import date, timedelta
+
+from src.text import normalize_text
+
+MIN_WEEKLY_OCCURRENCES = 2  # dated instances needed before a class is stored as a weekly rule
+RECURRENCE_FIELDS = ["recurrencia", "fecha_inicio", "fecha_fin", "excepciones"]
+WEEKDAYS = ["lunes", "martes", "miercoles", "jueves", "viernes", "sabado", "domingo"]  # normalize_text, por date.weekday()
+
+
+def schedule_key(fact: dict) -> tuple[str, ...]:
+    """Normalized (sede, clase, instructor, día, hora de inicio) identifying a weekly class slot."""
+    return tuple(normalize_text(str(fact.get(field) or ""))
+                 for field in ("sede", "nombre_clase", "instructor", "dia_semana", "hora_inicio"))
+
+
+def _parse_fecha(value) -> date | None:
+    try:
+        return date.fromisoformat(str(value or "").strip())
+    except ValueError:
+        return None
+
+
+def _on_slot_day(fecha: date, dia_semana) -> bool:
+    """Whether `fecha` falls on the slot's weekday (True when dia_semana is missing or unknown)."""
+    dia = normalize_text(str(dia_semana or ""))
+    return dia not in WEEKDAYS or WEEKDAYS[fecha.weekday()] == dia
+
+
+def _join_fuentes(facts: list[dict]) -> str | None:
+    fuentes = []
+    for fact in facts:
+        for fuente in str(fact.get("fuente") or "").split(","):
+            if fuente.strip() and fuente.strip() not in fuentes:
+                fuentes.append(fuente.strip())
+    return ", ".join(fuentes) or None
+
+
+def _merge_duplicates(facts: list[dict]) -> dict:
+    """First fact of a group, completed with the non-empty fields of the others and all their fuentes."""
+    merged = dict(facts[0])
+    for fact in facts[1:]:
+        for field, value in fact.items():
+            if merged.get(field) in (None, "") and value not in (None, ""):
+                merged[field] = value
+    merged["fuente"] = _join_fuentes(facts)
+    return merged
+
+
+def _weekly_rule(instances: list[dict], dates: list[date]) -> dict:
+    """One row for a class seen on several dates of the same weekday; missing weeks become exceptions."""
+    rule = _merge_duplicates(instances)
+    start, end = min(dates), max(dates)
+    seen = set(dates)
+    missing = [start + timedelta(weeks=w) for w in range((end - start).days // 7 + 1)]
+    rule.update({
+        "fecha": None,
+        "recurrencia": "semanal",
+        "fecha_inicio": start.isoformat(),
+        "fecha_fin": end.isoformat(),
+        "excepciones": ", ".join(d.isoformat() for d in missing if d not in seen) or None,
+    })
+    instructor = f" con {rule['instructor']}" if rule.get("instructor") else ""
+    hora_fin = f" a {rule['hora_fin']}" if rule.get("hora_fin") else ""
+    rule["content_para_busqueda"] = (
+        f"La clase '{rule.get('nombre_clase')}'{instructor} se dicta cada {rule.get('dia_semana')} "
+        f"de {rule.get('hora_inicio')}{hora_fin} en la sede {rule.get('sede')}, del {start.isoformat()} al {end.isoformat()}."
+    )
+    return rule
+
+
+def compact_schedules(schedules: list[dict]) -> tuple[list[dict], dict[str, float]]:
+    """
+    Deduplicates class schedules by normalized (sede, clase, instructor, día, inicio) and collapses dated
+    instances of the same weekly slot into one row with recurrencia="semanal", fecha_inicio/fecha_fin and
+    the skipped weeks in `excepciones`; dates that are not on the slot's weekday are kept as their own rows.
+    Expects normalized facts (ISO fecha, dia_semana filled from it).
+    Returns the compacted rows, in first-seen order, and the compression stats.
+    """
+    slots: dict[tuple, dict[str, list[dict]]] = {}
+    for fact in schedules:
+        if not isinstance(fact, dict):
+            continue
+        by_fecha = slots.setdefault(schedule_key(fact), {})
+        fecha = _parse_fecha(fact.get("fecha"))
+        by_fecha.setdefault(fecha.isoformat() if fecha else "", []).append(fact)
+
+    compacted = []
+    duplicates = weekly_rules = 0
+    for by_fecha in slots.values():
+        duplicates += sum(len(facts) - 1 for facts in by_fecha.values())
+        undated = by_fecha.pop("", None)
+        dated, off_day = [], []
+        for facts in by_fecha.values():
+            fact = _merge_duplicates(facts)
+            # Una fecha que no cae en el día del slot no es una ocurrencia de la clase semanal: queda aparte
+            (dated if _on_slot_day(_parse_fecha(fact["fecha"]), fact.get("dia_semana")) else off_day).append(fact)
+        if undated:
+            # Ya hay una fila semanal sin fecha: las ocurrencias con fecha solo aportan fuentes
+            weekly = _merge_duplicates(undated)
+            weekly["fuente"] = _join_fuentes(undated + dated)
+            compacted.append(weekly)
+        elif len(dated) >= MIN_WEEKLY_OCCURRENCES:
+            compacted.append(_weekly_rule(dated, [_parse_fecha(fact["fecha"]) for fact in dated]))
+            weekly_rules += 1
+        else:
+            compacted.extend(dated)
+        compacted.extend(off_day)
+
+    total = sum(1 for fact in schedules if isinstance(fact, dict))
+    stats = {
+        "input_rows": total,
+        "output_rows": len(compacted),
+        "duplicates": duplicates,
+        "weekly_rules": weekly_rules,
+        "compression_ratio": round(total / len(compacted), 2) if compacted else 1.0,
+    }
+    logging.info(f"🗓️ Compacted {total} schedule rows into {len(compacted)} "
+                 f"({duplicates} duplicates, {weekly_rules} weekly rules, x{stats['compression_ratio']})")
+    return compacted, stats
@@ -1,16 +1,35 @@
 import logging
 import os
 import re
+from concurrent.futures import Future
+from contextlib import ExitStack
 
 import openai
 from dotenv import load_dotenv
 from playwright.sync_api import sync_playwright, Page
 from bs4 import BeautifulSoup
 
-from src.dataframes import init_dataframes, append_scraped_data, export_and_upload
+from src.archive import PageArchive, open_archive
+from src.browser import BrowserManager
+from src.budget import CrawlBudget, FactSaturation, SATURATION_WINDOW, order_gym_urls
+from src.dataframes import init_row_buffers, append_scraped_data, export_and_upload, build_dataframes
+from src.parquet_store import write_run
 from src.sitemap_utils import get_filtered_sitemap_urls, get_all_links_from_homepage
-from src.db_utils import bulk_insert, get_connection, init_db
-from src.llm import categorize_urls_with_llm, extract_structured_data, merge_gym_data_with_llm
+from src.db_utils import bulk_insert, close_pool, finish_run, get_or_create_gym_id, init_db, pooled_connection, start_run
+from src.hosts import get_host_tracker, goto, host_report
+from src.embeddings import embed_pending, get_embedder, init_vector_schema
+from src.search import ensure_search_indexes
+from src.batch import batch_extract_pages
+from src.llm import cascade_report, categorize_urls_with_llm, merge_gym_data_with_llm
+from src.ledger import get_ledger, ledger_summary, reset_ledger
+from src.normalize import normalize_facts
+from src.packing import extract_pages
+from src.prompts import prompt_versions
+from src.schedules import compact_schedules
+from src.taxonomy import get_taxonomy, tag_disciplines
+from src.url_categories import close_category_store, get_category_store
+from src.telemetry import count, finish_telemetry, span, start_telemetry
+from src.workers import get_pool, shutdown_pool
 
 pages_to_scrape = {
     "bioritmo": "https://www.bioritmo.com.pe/",
@@ -34,16 +53,59 @@ pages_to_scrape = {
 }
 
 
+# Esperas del navegador; en replays locales (benchmarks) no hay nada que hidratar y se pueden acortar
+MAX_SCROLLS = int(os.getenv("MAX_SCROLLS", 30))
+SCROLL_WAIT_MS = int(os.getenv("SCROLL_WAIT_MS", 1_000))
+HYDRATION_WAIT_MS = int(os.getenv("HYDRATION_WAIT_MS", 10_000))
+# Poda dentro de la página (PRUNE_SCRIPT); prune_html_for_llm queda como respaldo
+IN_BROWSER_PRUNING = os.getenv("IN_BROWSER_PRUNING", "1").lower() not in ("0", "false", "no")
+
+# Equivalente de prune_html_for_llm sobre el DOM vivo: solo el resultado compacto cruza CDP.
+# Los elementos ocultos se descartan solo si no tienen texto: los horarios esconden los días inactivos.
+PRUNE_SCRIPT = """() => {
+    const root = document.querySelector("main") || document.querySelector('[role="main"]')
+        || document.body || document.documentElement;
+    const live = root.querySelectorAll("*");
+    const hidden = [];
+    for (let i = 0; i < live.length; i++) {
+        const el = live[i];
+        let isHidden = el.hidden || el.getAttribute("aria-hidden") === "true";
+        if (!isHidden) {
+            const style = getComputedStyle(el);
+            isHidden = style.display === "none" || style.visibility === "hidden";
+        }
+        if (isHidden && !el.textContent.trim()) hidden.push(i);
+    }
+    const clone = root.cloneNode(true);
+    const cloned = clone.querySelectorAll("*");
+    for (const i of hidden) cloned[i].remove();
+    clone.querySelectorAll("script, style, svg, nav, footer, header, noscript, template").forEach(el => el.remove());
+    const comments = document.createTreeWalker(clone, NodeFilter.SHOW_COMMENT);
+    const toRemove = [];
+    while (comments.nextNode()) toRemove.push(comments.currentNode);
+    toRemove.forEach(node => node.remove());
+    for (const el of [clone, ...clone.querySelectorAll("*")]) {
+        for (const name of el.getAttributeNames()) el.removeAttribute(name);
+    }
+    for (const div of clone.querySelectorAll("div")) {
+        const children = [...div.childNodes].filter(node => node.nodeType === 1 || node.textContent.trim());
+        if (children.length === 1 && children[0].nodeName === "DIV") div.replaceWith(children[0]);
+    }
+    return clone.outerHTML.replace(/[\\n\\r\\t]+/g, " ").replace(/\\s{2,}/g, " ").trim();
+}"""
+
+
 def should_skip_frame(frame):
     skip_domains = ["stripe.com", "facebook.com", "google.com", "analytics", "wixapps"]
     return any(domain in frame.url for domain in skip_domains)
 
 
-def scroll_until_iframes(page: Page, max_scrolls: int = 30, scroll_step: int = 1000, stable_checks: int = 3):
+def scroll_until_iframes(page: Page, max_scrolls: int | None = None, scroll_step: int = 1000, stable_checks: int = 3):
     """
     Hace scroll progresivo hasta que los iframes dejan de aumentar.
     Retorna el número final de iframes encontrados.
     """
+    max_scrolls = max_scrolls or MAX_SCROLLS
     last_count = 0
     stable_counter = 0
 
@@ -62,7 +124,7 @@ def scroll_until_iframes(page: Page, max_scrolls: int = 30, scroll_step: int = 1
             break
 
         page.mouse.wheel(0, scroll_step)
-        page.wait_for_timeout(1000)
+        page.wait_for_timeout(SCROLL_WAIT_MS)
     return last_count
 
 
@@ -153,20 +215,37 @@ def prune_html_for_llm(html_content: str, keywords: list[str] = None) -> str:
     return html_clean
 
 
-def scrape_single_url(client: openai.OpenAI, page: Page, url: dict[str, str], url_type: str, gym_name: str) -> dict[str, dict[str, list]]:
+def prune_in_browser(page: Page) -> str | None:
+    """Poda el documento actual dentro del navegador; None si el script falla (se usa prune_html_for_llm)."""
+    try:
+        return page.evaluate(PRUNE_SCRIPT)
+    except Exception as e:
+        logging.warning(f"⚠️ In-browser pruning failed, falling back to Python: {e}")
+        count("prune_fallback_total")
+        return None
+
+
+def fetch_frames(page: Page, url: dict[str, str], keep_raw: bool = False) -> list[tuple[str, str | None, str | None]]:
     """
-    Raspa una URL y cualquier iframe relevante que contenga
+    Navega a una URL y a cada iframe relevante que contenga.
+    Retorna [(frame_url, raw_html, pruned_html)]; pruned_html puede quedar vacío.
+    El HTML crudo solo se descarga con `keep_raw` o si la poda en el navegador falla; si no, es None.
+    Si la poda en el navegador falla (o está desactivada) pruned_html es None: el llamador poda raw_html
+    con prune_html_for_llm en el pool de workers.
     """
     url_str = url["loc"]
-    lastmod = url["lastmod"]
-    freq = url["changefreq"]
     logging.info(f" -> Scraping URL principal: {url_str}")
 
-    chunks_data = {}
+    frames = []
+    hosts = get_host_tracker()
+    if not hosts.allow(url_str):
+        logging.warning(f"🔌 Skipping {url_str}: circuit open for its host")
+        return []
 
     try:
-        page.goto(url_str, wait_until="domcontentloaded", timeout=180000)
-        scroll_until_iframes(page)
+        with span("browser", url=url_str):
+            goto(page, url_str, "domcontentloaded", 180000)
+            scroll_until_iframes(page)
 
         # 3. Procesar los iframes relevantes
         for frame in page.frames:
@@ -174,39 +253,235 @@ def scrape_single_url(client: openai.OpenAI, page: Page, url: dict[str, str], ur
             if frame.url == 'about:blank': continue
             if should_skip_frame(frame):
                 continue
+            if not hosts.allow(frame.url):
+                logging.warning(f"🔌 Skipping iframe {frame.url}: circuit open for its host")
+                continue
             logging.info(f"Found relevant iframe. Scraping: {frame.url}")
             try:
-                try:
-                    page.goto(frame.url, wait_until="networkidle", timeout=45000)
-                except Exception:
-                    page.goto(frame.url, wait_until="domcontentloaded", timeout=45000)
-                page.wait_for_timeout(10_000)  # wait for react / next.js hydration
-                frame_html = page.evaluate("document.documentElement.outerHTML")
-                pruned_frame_html = prune_html_for_llm(frame_html)
-
-                if pruned_frame_html.strip():
-                    logging.info(f"Extracting from iframe content...")
-                    iframe_data = extract_structured_data(client, frame.url, "iframe_content", pruned_frame_html,
-                                                          gym_name, lastmod, freq)
-                    # Fusionar datos del iframe
-                    if iframe_data:
-                        chunks_data[frame.url] = iframe_data
+                with span("browser", url=frame.url):
+                    goto(page, frame.url, "networkidle", 45000, fallback_wait_until="domcontentloaded")
+                    page.wait_for_timeout(HYDRATION_WAIT_MS)  # wait for react / next.js hydration
+                pruned_frame_html, frame_html = None, None
+                if IN_BROWSER_PRUNING:
+                    with span("prune", url=frame.url, where="browser"):
+                        pruned_frame_html = prune_in_browser(page)
+                if pruned_frame_html is None or keep_raw:
+                    with span("browser", url=frame.url):
+                        frame_html = page.evaluate("document.documentElement.outerHTML")
+                    count("bytes_fetched_total", len(frame_html.encode("utf-8")), kind="html")
+                frames.append((frame.url, frame_html, pruned_frame_html))
             except Exception as e:
                 logging.error(f"❌ Failed to scrape iframe {frame.url}: {e}")
 
-        # Convertir los diccionarios acumulados de nuevo a listas
-        return chunks_data
+        return frames
 
     except Exception as e:
         logging.error(f"❌ Failed to scrape main URL {url}: {e}")
-        return {}
+        return []
+
+
+def categorized_gym_urls(client: openai.OpenAI, browser, site_url: str) -> dict[str, list[dict]]:
+    """Sitemap (o links del homepage) categorizados por el LLM, más el homepage."""
+    logging.info(f"Scraping {site_url}")
+    urls_to_scrape = get_filtered_sitemap_urls(site_url)
+    if not urls_to_scrape:
+        urls_to_scrape = get_all_links_from_homepage(site_url, browser)
+    logging.info(f"URLs obtained: {urls_to_scrape}")
+    store = get_category_store()
+    with span("categorize", urls=len(urls_to_scrape)):
+        if store is not None:
+            filtered_urls = store.categorize(site_url, urls_to_scrape, client)
+        else:
+            filtered_urls = categorize_urls_with_llm(urls_to_scrape, client)
+    filtered_urls["homepage"] = [{"loc": site_url, "lastmod": None, "changefreq": None, "priority": None}]
+    logging.info(f"Categorized URLs: {filtered_urls}")
+    return filtered_urls
+
+
+def split_schedules(extracted_data: dict[str, dict], schedules: list) -> dict[str, dict]:
+    """Separa los horarios de cada chunk para no hacer merge de estos."""
+    for url, chunk_data in extracted_data.items():
+        if chunk_data.get("horarios"):
+            schedules.extend(chunk_data.pop("horarios"))
+    return extracted_data
+
+
+def chunk_pages(pages: list[dict], extracted_pages: list[dict], schedules: list) -> dict[str, dict]:
+    """page_url -> datos extraídos de cada página, separando los horarios."""
+    chunked_data = {}
+    for page, extracted_data in zip(pages, extracted_pages):
+        if extracted_data:
+            chunked_data = chunked_data | split_schedules({page["page_url"]: extracted_data}, schedules)
+    return chunked_data
+
+
+def finalize_gym(client: openai.OpenAI, gym_name: str, chunked_data: dict, schedules: list, row_buffers: dict,
+                 db: dict | None) -> dict[str, float]:
+    """
+    Merge de los chunks de un gimnasio, acumulación para el export y carga opcional a la base de datos.
+    Retorna las estadísticas de compactación de horarios.
+    """
+    with span("merge", pages=len(chunked_data)):
+        merged_gym_data = merge_gym_data_with_llm(gym_name, chunked_data, client)
+    with span("normalize"):
+        normalize_facts([merged_gym_data])  # el merge puede reescribir formatos; los horarios ya vienen normalizados
+        tag_disciplines([merged_gym_data], client)  # el merge puede renombrar o perder disciplina_id
+        # recuperar data de horarios, sin duplicados y con las clases semanales en una sola fila
+        merged_gym_data["horarios"], schedule_stats = compact_schedules(schedules)
+    logging.info(f"Merged data: {merged_gym_data}")
+    append_scraped_data(row_buffers, gym_name, merged_gym_data)
+    if db is not None:
+        with pooled_connection() as conn:
+            db["stats"][gym_name] = bulk_insert(conn, gym_name, merged_gym_data, db["run_id"])
+            embed_pending(conn, db["embedder"], get_or_create_gym_id(conn, gym_name))  # solo los hechos de este gimnasio
+    return schedule_stats
+
+
+def fetch_gym_urls(browser, gym_name: str, planned: list[tuple[str, dict]], archive: PageArchive | None = None,
+                   budget: CrawlBudget | None = None) -> list[list[dict]]:
+    """
+    Descarga cada (categoría, URL) planificada (con sus iframes) en el navegador.
+    `browser` puede ser un Browser, un BrowserContext o un ManagedContext: solo se usa `new_page()`.
+    Con `archive`, el HTML crudo y podado de cada frame queda guardado para `reextract`; con `budget`,
+    se detiene cuando el presupuesto del gimnasio se agota.
+    Retorna las páginas listas para extracción de cada URL descargada, en orden.
+    """
+    pool = get_pool()
+    frames = []  # (índice de URL, categoría, sub_url, frame_url, raw_html, pruned_html o Future de la poda)
+    fetched_urls = 0
+    for page_type, sub_url in planned:
+        if budget is not None and not budget.spend():
+            break
+        fetched = []
+        for attempt in range(2):  # una página por URL; se reintenta una vez si el navegador se cayó
+            page = browser.new_page()
+            try:
+                fetched = fetch_frames(page, sub_url, keep_raw=archive is not None)
+            except Exception as e:
+                logging.error(e)
+            crashed = page.is_closed()
+            if not crashed:
+                page.close()
+            if fetched or not crashed:
+                break
+            logging.warning(f"⚠️ Browser went away while scraping {sub_url['loc']}, retrying")
+        for frame_url, raw_html, pruned_html in fetched:
+            if pruned_html is None:
+                pruned_html = pool.submit(prune_html_for_llm, raw_html)  # el navegador sigue con la próxima URL
+            frames.append((fetched_urls, page_type, sub_url, frame_url, raw_html, pruned_html))
+        fetched_urls += 1
+
+    url_pages = [[] for _ in range(fetched_urls)]
+    for index, page_type, sub_url, frame_url, raw_html, pruned_html in frames:
+        if isinstance(pruned_html, Future):
+            try:
+                pruned_html = pool.result(pruned_html)
+            except Exception as e:
+                logging.error(f"❌ Failed to prune {frame_url}: {e}")
+                continue
+        count("pruned_bytes_total", len(pruned_html.encode("utf-8")))
+        if archive is not None:
+            archive.store_page(gym_name, page_type, sub_url, frame_url, raw_html, pruned_html)
+        if not pruned_html.strip():
+            continue
+        url_pages[index].append({
+            "gym_name": gym_name, "page_url": frame_url, "url_type": "iframe_content",
+            "html_content": pruned_html, "lastmod": sub_url["lastmod"], "freq": sub_url["changefreq"],
+        })
+    return url_pages
+
+
+def collect_gym_pages(client: openai.OpenAI, browser, gym_name: str, site_url: str,
+                      archive: PageArchive | None = None) -> list[dict]:
+    """
+    Categoriza las URLs del gimnasio y las descarga por relevancia dentro del presupuesto del gimnasio.
+    Sin extracción intermedia, así que no hay corte por saturación (modo batch, benchmarks).
+    Retorna las páginas listas para extracción.
+    """
+    planned = order_gym_urls(categorized_gym_urls(client, browser, site_url))
+    url_pages = fetch_gym_urls(browser, gym_name, planned, archive, CrawlBudget(gym=gym_name))
+    return [page for pages in url_pages for page in pages]
+
+
+def crawl_and_extract_gym(client: openai.OpenAI, browser, gym_name: str, site_url: str,
+                          archive: PageArchive | None = None) -> tuple[list[dict], list[dict], dict]:
+    """
+    Descarga y extrae las URLs del gimnasio por relevancia, en ventanas de SATURATION_WINDOW URLs, dentro
+    del presupuesto del gimnasio. Una categoría se deja de recorrer cuando sus últimas SATURATION_PATIENCE
+    URLs no aportaron hechos nuevos. Retorna (páginas, extracción normalizada de cada página, estadísticas).
+    """
+    planned = order_gym_urls(categorized_gym_urls(client, browser, site_url))
+    budget, saturation = CrawlBudget(gym=gym_name), FactSaturation()
+    by_category = {}
+    for category, url in planned:
+        by_category.setdefault(category, []).append((category, url))
+    gym_pages, extracted_pages = [], []
+    for category, items in by_category.items():
+        position = 0
+        while position < len(items) and not budget.exhausted:
+            if saturation.saturated(category):
+                saturation.close(category, len(items) - position)
+                break
+            window = items[position:position + (SATURATION_WINDOW if saturation.patience else len(items))]
+            position += len(window)
+            url_pages = fetch_gym_urls(browser, gym_name, window, archive, budget)
+            pages = [page for pages in url_pages for page in pages]
+            extracted = extract_pages(client, pages) if pages else []
+            with span("normalize"):
+                normalize_facts(extracted)
+            offset = 0
+            for pages_of_url in url_pages:
+                saturation.observe(category, extracted[offset:offset + len(pages_of_url)])
+                offset += len(pages_of_url)
+            gym_pages += pages
+            extracted_pages += extracted
+    stats = {**saturation.stats, "planned_urls": len(planned), "crawled_urls": budget.pages,
+             "budget_exhausted": budget.exhausted}
+    logging.info(f"🧮 {gym_name}: crawled {budget.pages}/{len(planned)} URLs, {stats.get('new_facts', 0)} unique facts, "
+                 f"{stats.get('skipped_urls', 0)} skipped by saturation" + (", budget exhausted" if budget.exhausted else ""))
+    return gym_pages, extracted_pages, stats
+
+
+def archived_gym_pages(archive: PageArchive, run_id: str, gym_name: str) -> list[dict]:
+    """
+    Las páginas de un gimnasio en un run archivado, podadas de nuevo desde el HTML crudo.
+    Reemplaza a collect_gym_pages en `reextract`: ni navegador ni categorización; la poda se reparte en el pool.
+    """
+    archived_pages = archive.load_pages(run_id, gym_name)
+    with span("prune", pages=len(archived_pages)):
+        pruned_pages = get_pool().map(prune_html_for_llm, [archived["raw_html"] for archived in archived_pages])
+    gym_pages = []
+    for archived, pruned_html in zip(archived_pages, pruned_pages):
+        count("pruned_bytes_total", len(pruned_html.encode("utf-8")))
+        if pruned_html.strip():
+            gym_pages.append({
+                "gym_name": gym_name, "page_url": archived["frame_url"], "url_type": "iframe_content",
+                "html_content": pruned_html, "lastmod": archived["lastmod"], "freq": archived["changefreq"],
+            })
+    return gym_pages
+
+
+def extract_gym(client: openai.OpenAI, gym_name: str, gym_pages: list[dict], row_buffers: dict, db: dict | None,
+                extracted_pages: list[dict] | None = None) -> dict[str, float]:
+    """
+    Extracción síncrona de las páginas de un gimnasio y finalize_gym; retorna las estadísticas de horarios.
+    `extracted_pages` (ya normalizadas) evita la extracción si el crawl ya la hizo (crawl_and_extract_gym).
+    """
+    schedules = []
+    if extracted_pages is None:
+        # Las páginas pequeñas se extraen empaquetadas en una sola llamada
+        extracted_pages = extract_pages(client, gym_pages)
+        with span("normalize"):
+            normalize_facts(extracted_pages)
+    with span("normalize"):
+        tag_disciplines(extracted_pages, client)
+    chunked_data = chunk_pages(gym_pages, extracted_pages, schedules)
+    return finalize_gym(client, gym_name, chunked_data, schedules, row_buffers, db)
 
 
 def main():
     if not os.getenv("OPENAI_API_KEY"):
         load_dotenv("../.env")  # local dev
-    # with get_connection() as conn:
-    #     init_db(conn)
     logging.basicConfig(
         level=logging.INFO,
         format='%(asctime)s - %(name)s - %(levelname)s - [%(filename)s:%(lineno)d] - %(message)s',
@@ -231,48 +506,109 @@ def main():
             pages_to_scrape_used = pages_to_scrape
     else:
         pages_to_scrape_used = pages_to_scrape
+    # SCRAPE_MODE=reextract repite poda, extracción, merge y export sobre un run archivado (ARCHIVE_RUN, por
+    # defecto el último) sin abrir el navegador
+    reextract = os.getenv("SCRAPE_MODE", "crawl").lower() == "reextract"
+    archive = open_archive()
+    if reextract:
+        archive_run = (os.getenv("ARCHIVE_RUN") or archive.latest_run()) if archive is not None else None
+        if archive_run is None:
+            logging.error("❌ Nothing to re-extract: no archived run (check ARCHIVE_DIR / ARCHIVE_RUN)")
+            return
+        archived_gyms = archive.gyms(archive_run)
+        if custom_urls_env:
+            archived_gyms = [gym_name for gym_name in archived_gyms if gym_name in pages_to_scrape_used]
+        pages_to_scrape_used = {gym_name: pages_to_scrape_used.get(gym_name, "") for gym_name in archived_gyms}
+        logging.info(f"♻️ Re-extracting run {archive_run}: {archived_gyms}")
+    elif archive is not None:
+        archive_run = archive.start_run()
+    reset_ledger()  # RUN_TOKEN_BUDGET y GYM_TOKEN_BUDGET cuentan desde aquí
+    start_telemetry()  # METRICS_PORT, TRACE_FILE y PROFILE_STAGES activan cada salida
     client = openai.Client()
-    df_disciplines, df_places, df_schedules, df_prices = init_dataframes()
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
+    batch_mode = os.getenv("EXTRACTION_MODE", "sync").lower() == "batch"
+    db = None
+    if os.getenv("STORE_IN_DB", "").lower() in ("1", "true", "yes"):
+        db = {"embedder": get_embedder(client), "stats": {}}
+        with pooled_connection() as conn:
+            init_db(conn)
+            init_vector_schema(conn, db["embedder"].dimensions)
+            ensure_search_indexes(conn)
+            db["run_id"] = start_run(conn)
+    row_buffers = init_row_buffers()
+    pending_pages = []  # batch mode: pages waiting for extraction
+    schedule_stats = {}
+    crawl_stats = {}
+    with ExitStack() as stack:
+        browser = None if reextract else BrowserManager(stack.enter_context(sync_playwright()))
         for gym_name, site_url in pages_to_scrape_used.items():
-            logging.info(f"Scraping {site_url}")
-            urls_to_scrape = get_filtered_sitemap_urls(site_url)
-            if not urls_to_scrape:
-                urls_to_scrape = get_all_links_from_homepage(site_url, browser)
-            schedules = []
-            logging.info(f"URLs obtained: {urls_to_scrape}")
-            filtered_urls = categorize_urls_with_llm(urls_to_scrape, client)
-            filtered_urls["homepage"] = [{"loc": site_url, "lastmod": None, "changefreq": None, "priority": None}]
-            logging.info(f"Categorized URLs: {filtered_urls}")
-            chunked_data = {}
-            for page_type, sub_urls in filtered_urls.items():
-                page = browser.new_page()
-                try:
-                    for sub_url in sub_urls:
-                        if "horarios-treinos/santa-cruz" in sub_url:
-                            print("Debug")
-                        extracted_data = scrape_single_url(client, page, sub_url, page_type, gym_name)
-                        for url, chunk_data in extracted_data.items():
-                            if chunk_data.get("horarios"):
-                                schedules.extend(chunk_data.pop("horarios"))  # separar datos de horarios para no hacer merge de estos
-                        chunked_data = chunked_data | extracted_data
-                except Exception as e:
-                    logging.error(e)
-                finally:
-                    page.close()
-            merged_gym_data = merge_gym_data_with_llm(gym_name, chunked_data, client)
-            merged_gym_data["horarios"] = schedules  # recuperar data de horarios
-            logging.info(f"Merged data: {merged_gym_data}")
-            df_disciplines, df_places, df_schedules, df_prices = append_scraped_data(
-                df_disciplines, df_places, df_schedules, df_prices, gym_name, merged_gym_data
-            )
-            # conn = get_connection()
-            # bulk_insert(conn, gym_name, merged_gym_data)
-        browser.close()
+            with span("gym", gym=gym_name):
+                if reextract:
+                    gym_pages = archived_gym_pages(archive, archive_run, gym_name)
+                elif batch_mode:
+                    with browser.context() as context:
+                        gym_pages = collect_gym_pages(client, context, gym_name, site_url, archive)
+                else:
+                    with browser.context() as context:
+                        gym_pages, extracted_pages, crawl_stats[gym_name] = crawl_and_extract_gym(
+                            client, context, gym_name, site_url, archive)
+                    schedule_stats[gym_name] = extract_gym(client, gym_name, gym_pages, row_buffers, db, extracted_pages)
+                    continue
+                if batch_mode:
+                    pending_pages.extend(gym_pages)
+                    continue
+                schedule_stats[gym_name] = extract_gym(client, gym_name, gym_pages, row_buffers, db)
+        browser_stats = browser.close() if browser is not None else None
+
+        if batch_mode:
+            # Todas las extracciones del run en un solo batch job; luego merge por gimnasio
+            with span("batch_extract", pages=len(pending_pages)):
+                extracted_pages = batch_extract_pages(client, pending_pages)
+            with span("normalize"):
+                tag_disciplines(normalize_facts(extracted_pages), client)
+            for gym_name in pages_to_scrape_used:
+                with span("gym", gym=gym_name):
+                    schedules = []
+                    gym_results = [(page, data) for page, data in zip(pending_pages, extracted_pages) if page["gym_name"] == gym_name]
+                    chunked_data = chunk_pages([page for page, _ in gym_results], [data for _, data in gym_results], schedules)
+                    schedule_stats[gym_name] = finalize_gym(client, gym_name, chunked_data, schedules, row_buffers, db)
+
         logging.info("Uploading data to Drive...")
-        res = export_and_upload(df_disciplines, df_places, df_schedules, df_prices, folder_id)
-        logging.info("Uploaded: ", res)
+        res = export_and_upload(row_buffers, folder_id)
+        logging.info(f"Uploaded: {res}")
+        with span("export", format=os.getenv("EXPORT_FORMAT", "parquet")):
+            write_run(build_dataframes(row_buffers), os.getenv("EXPORT_DIR", "data/exports"), file_format=os.getenv("EXPORT_FORMAT", "parquet"))
+    tokens = ledger_summary()
+    logging.info(f"🧾 Token ledger written to {get_ledger().export(os.getenv('EXPORT_DIR', 'data/exports'))}")
+    if schedule_stats:
+        rows_in = sum(stats["input_rows"] for stats in schedule_stats.values())
+        rows_out = sum(stats["output_rows"] for stats in schedule_stats.values())
+        logging.info(f"🗓️ Horarios: {rows_in} -> {rows_out} rows (x{rows_in / max(rows_out, 1):.1f})")
+    cascade = cascade_report()
+    for gym_name, gym_cascade in cascade.items():
+        logging.info(f"🪜 {gym_name}: {gym_cascade['escalated']}/{gym_cascade['pages']} pages escalated "
+                     f"({gym_cascade['escalation_rate']:.0%}), models {gym_cascade['models']}")
+    taxonomy = get_taxonomy().report()
+    logging.info(f"🏷️ Disciplinas: {taxonomy['local_match_rate']:.0%} of {taxonomy['names']} names matched locally, "
+                 f"{taxonomy.get('llm_names', 0)} sent to the LLM, {taxonomy['learned_aliases']} learned aliases")
+    archived = None
+    if archive is not None:
+        archived = {"run_id": archive_run, "reextract": reextract, **archive.report()}
+        logging.info(f"🗄️ Archive: {archived['pages']} pages in {archived['runs']} runs, "
+                     f"{archived['stored_bytes'] / 1e6:.1f} MB stored (x{archived['ratio']} vs raw HTML)")
+        archive.close()
+    hosts = host_report()
+    url_categories = close_category_store()
+    workers = shutdown_pool()
+    telemetry = finish_telemetry()
+    if db is not None:
+        with pooled_connection() as conn:
+            finish_run(conn, db["run_id"], {"facts": db["stats"], "cascade": cascade, "horarios": schedule_stats,
+                                            "disciplinas": taxonomy, "telemetry": telemetry, "archive": archived,
+                                            "workers": workers, "browser": browser_stats,
+                                            "hosts": hosts, "crawl": crawl_stats,
+                                            "url_categories": url_categories, "prompts": prompt_versions(),
+                                            "tokens": tokens})
+    close_pool()
     logging.info("Scraping complete.")
 
 
@@ -0,0 +1,175 @@
+import hashlib
+import json
+import logging
+from collections import OrderedDict
+
+import psycopg2
+
+from src.db_utils import FACT_TABLES, INGEST_CHANNEL, ingest_generation
+from src.embeddings import get_embedder, vector_literal
+
+# Filter name -> (SQL predicate with a single %s placeholder, categories it applies to).
+FILTERS = {
+    "distrito": {
+        "ubicaciones": "lower(t.distrito) = lower(%s)",
+        "precios": "lower(t.sede) IN (lower(%s), 'todas')",
+        "horarios": "lower(t.sede) IN (lower(%s), 'todas')",
+        "disciplinas": "lower(t.sede) IN (lower(%s), 'todas')",
+    },
+    "disciplina": {
+        "horarios": "t.nombre_clase ILIKE %s",
+        "disciplinas": "t.nombre ILIKE %s",
+    },
+    "disciplina_id": {
+        "horarios": "t.disciplina_id = %s",
+        "disciplinas": "t.disciplina_id = %s",
+    },
+    "precio_min": {"precios": "t.valor >= %s"},
+    "precio_max": {"precios": "t.valor <= %s"},
+    "dia_semana": {"horarios": "lower(t.dia_semana) = lower(%s)"},
+    "hora_desde": {"horarios": "t.hora_inicio >= %s"},
+    "hora_hasta": {"horarios": "t.hora_inicio <= %s"},
+    "gym_name": {category: "g.gym_name = %s" for category in FACT_TABLES},
+}
+
+
+def ensure_search_indexes(conn):
+    """B-tree indexes for the structured filters and trigram GIN indexes for discipline names."""
+    with conn.cursor() as cur:
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS ubicaciones_distrito_idx ON ubicaciones (lower(distrito));
+            CREATE INDEX IF NOT EXISTS precios_sede_valor_idx ON precios (lower(sede), valor);
+            CREATE INDEX IF NOT EXISTS precios_valor_idx ON precios (valor);
+            CREATE INDEX IF NOT EXISTS horarios_dia_hora_idx ON horarios (lower(dia_semana), hora_inicio);
+            CREATE INDEX IF NOT EXISTS horarios_sede_idx ON horarios (lower(sede));
+            CREATE INDEX IF NOT EXISTS disciplinas_sede_idx ON disciplinas (lower(sede));
+            CREATE INDEX IF NOT EXISTS horarios_disciplina_id_idx ON horarios (disciplina_id);
+            CREATE INDEX IF NOT EXISTS disciplinas_disciplina_id_idx ON disciplinas (disciplina_id);
+        """)
+        conn.commit()
+        try:
+            cur.execute("""
+                CREATE EXTENSION IF NOT EXISTS pg_trgm;
+                CREATE INDEX IF NOT EXISTS horarios_clase_trgm_idx ON horarios USING gin (nombre_clase gin_trgm_ops);
+                CREATE INDEX IF NOT EXISTS disciplinas_nombre_trgm_idx ON disciplinas USING gin (nombre gin_trgm_ops);
+            """)
+            conn.commit()
+        except psycopg2.Error as e:
+            conn.rollback()
+            logging.warning(f"⚠️ pg_trgm not available, discipline filters will not be indexed: {e}")
+    print("✅ Search indexes ensured successfully")
+
+
+class FactSearch:
+    """
+    Hybrid search over the stored facts: cosine similarity on the `content_para_busqueda` embedding,
+    restricted by structured filters (district, discipline, price range, weekday/time window). Only rows
+    embedded with the searcher's embedder model are compared; the default embedder is the one ingest uses.
+    Unfiltered queries walk the HNSW index; filtered ones rank the filtered rows exactly, since the index
+    applies filters after its scan and would drop matches. `exact=True` ranks every query exactly.
+
+    Each distinct (category, active filters, vector/no vector) query shape is PREPAREd once per connection.
+    Results are cached in an LRU that is cleared whenever an ingest commits (in-process generation counter,
+    LISTEN/NOTIFY on `facts_ingested` for other processes), so the connection should be dedicated to this service.
+    """
+
+    def __init__(self, conn, embedder=None, cache_size: int = 1024, exact: bool = False):
+        self.conn = conn
+        self.exact = exact
+        self.conn.autocommit = True
+        self.embedder = embedder or get_embedder()
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.prepared = set()
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0}
+        self.generation = ingest_generation()
+        with self.conn.cursor() as cur:
+            cur.execute(f"LISTEN {INGEST_CHANNEL};")
+
+    def invalidate(self):
+        self.cache.clear()
+        self.stats["invalidations"] += 1
+
+    def _check_ingests(self):
+        """
+        Non-blocking: drops the cache if this process ingested since the last lookup, or if another
+        process' ingest notification has arrived.
+        """
+        self.conn.poll()
+        if self.conn.notifies or self.generation != ingest_generation():
+            self.conn.notifies.clear()
+            self.generation = ingest_generation()
+            self.invalidate()
+
+    def _statement(self, category: str, active: list[str], with_vector: bool) -> str:
+        columns = ", ".join(f"t.{c}" for c in FACT_TABLES[category]["columns"])
+        where = [FILTERS[name][category].replace("%s", f"${idx}") for idx, name in enumerate(active, 2 if with_vector else 1)]
+        limit_idx = len(active) + (2 if with_vector else 1)
+        if with_vector:
+            model = self.embedder.model.replace("'", "''")
+            where += ["t.embedding IS NOT NULL", f"t.embedding_model = '{model}'"]  # nunca vectores de otro modelo
+        conditions = f"{' WHERE ' + ' AND '.join(where) if where else ''}"
+        if with_vector and (active or self.exact):
+            # HNSW aplica los filtros después del escaneo del índice y puede devolver menos filas (o ninguna):
+            # con filtros se rankea exacto el subconjunto filtrado, que los índices B-tree acotan
+            plain = ", ".join(FACT_TABLES[category]["columns"])
+            sql = (f"WITH candidates AS MATERIALIZED (SELECT {columns}, g.gym_name, t.embedding FROM {category} t "
+                   f"JOIN gimnasios g ON g.id = t.gym_id{conditions}) "
+                   f"SELECT {plain}, gym_name, embedding <=> $1::vector AS distancia FROM candidates "
+                   f"ORDER BY distancia LIMIT ${limit_idx}")
+        elif with_vector:
+            sql = (f"SELECT {columns}, g.gym_name, t.embedding <=> $1::vector AS distancia FROM {category} t "
+                   f"JOIN gimnasios g ON g.id = t.gym_id{conditions} ORDER BY t.embedding <=> $1::vector LIMIT ${limit_idx}")
+        else:
+            sql = (f"SELECT {columns}, g.gym_name, NULL::float AS distancia FROM {category} t "
+                   f"JOIN gimnasios g ON g.id = t.gym_id{conditions} ORDER BY t.id LIMIT ${limit_idx}")
+        name = f"search_{category}_{hashlib.md5(sql.encode()).hexdigest()[:10]}"
+        if name not in self.prepared:
+            with self.conn.cursor() as cur:
+                cur.execute(f"PREPARE {name} AS {sql}")
+            self.prepared.add(name)
+        return name
+
+    def search(self, category: str, query: str | None = None, limit: int = 10, **filters) -> list[dict]:
+        """
+        Returns up to `limit` facts of `category` ordered by similarity to `query` (or by id if no query).
+        Filters: distrito, disciplina, disciplina_id (canonical taxonomy id), precio_min, precio_max, dia_semana,
+        hora_desde ("HH:MM"), hora_hasta, gym_name.
+        """
+        if category not in FACT_TABLES:
+            raise ValueError(f"Unknown category: {category}")
+        unknown = [name for name, value in filters.items() if value is not None and category not in FILTERS.get(name, {})]
+        if unknown:
+            raise ValueError(f"Filters {unknown} do not apply to {category}")
+
+        self._check_ingests()
+        active = sorted(name for name, value in filters.items() if value is not None)
+        cache_key = (category, query, limit, json.dumps([(name, filters[name]) for name in active], default=str))
+        if cache_key in self.cache:
+            self.cache.move_to_end(cache_key)
+            self.stats["hits"] += 1
+            return self.cache[cache_key]
+        self.stats["misses"] += 1
+
+        values = [f"%{filters[name]}%" if name == "disciplina" else filters[name] for name in active]
+        if query:
+            values.insert(0, vector_literal(self.embedder.embed([query])[0]))
+        name = self._statement(category, active, bool(query))
+        with self.conn.cursor() as cur:
+            cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * (len(values) + 1))})", (*values, limit))
+            columns = [d[0] for d in cur.description]
+            results = [dict(zip(columns, row)) for row in cur.fetchall()]
+
+        self.cache[cache_key] = results
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return results
+
+
+if __name__ == "__main__":
+    from src.db_utils import get_connection
+
+    logging.basicConfig(level=logging.INFO)
+    search = FactSearch(get_connection())
+    for fact in search.search("horarios", "clase de yoga por la mañana", distrito="Miraflores", hora_hasta="12:00"):
+        print(fact)
@@ -6,17 +6,24 @@ from urllib.parse import urlparse, urljoin
 
 from playwright.sync_api import Browser
 
+from src.hosts import get_host_tracker, goto
+from src.telemetry import count, span
+
 
 def get_all_links_from_homepage(base_url: str, browser: Browser) -> list[dict]:
     unique_links = set()
     base_url_clean = base_url.strip().rstrip('/')
+    if not get_host_tracker().allow(base_url):
+        logging.warning(f"🔌 Skipping homepage crawl of {base_url}: circuit open for its host")
+        return []
     page = browser.new_page()
     logging.info(f"Crawling homepage direct links: {base_url}")
     try:
-        page.goto(base_url, wait_until="domcontentloaded", timeout=60000)
-        hrefs = page.evaluate("""() => {
-                    return Array.from(document.querySelectorAll('a')).map(a => a.href);
-                }""")
+        with span("browser", url=base_url):
+            goto(page, base_url, "domcontentloaded", 60000)
+            hrefs = page.evaluate("""() => {
+                        return Array.from(document.querySelectorAll('a')).map(a => a.href);
+                    }""")
         for href in hrefs:
             if not href:
                 continue
@@ -57,7 +64,9 @@ def get_filtered_sitemap_urls(base_url: str) -> list[dict]:
         with httpx.Client(follow_redirects=True, timeout=15.0) as client:
             # 1️⃣ Fetch robots.txt
             logging.info(f"🔍 Fetching {robots_url}...")
-            response = client.get(robots_url)
+            with span("sitemap", url=robots_url):
+                response = client.get(robots_url)
+            count("bytes_fetched_total", len(response.content), kind="robots")
             if response.status_code != 200:
                 logging.warning(f"⚠️ Could not fetch robots.txt (Status: {response.status_code}).")
                 return []
@@ -83,7 +92,9 @@ def get_filtered_sitemap_urls(base_url: str) -> list[dict]:
             while urls_to_process:
                 s_url = urls_to_process.pop(0)
                 logging.info(f"  -> Processing {s_url}...")
-                s_response = client.get(s_url)
+                with span("sitemap", url=s_url):
+                    s_response = client.get(s_url)
+                count("bytes_fetched_total", len(s_response.content), kind="sitemap")
                 if s_response.status_code != 200:
                     continue
 
@@ -0,0 +1,186 @@
+import json
+import logging
+import os
+import time
+from typing import Callable
+
+import openai
+
+from src.telemetry import observe, record_usage, span
+
+MAX_CONTINUATIONS = int(os.getenv("LLM_MAX_CONTINUATIONS", 3))
+CONTINUATION_PROMPT = (
+    "Tu respuesta anterior se cortó por límite de longitud. Continúa EXACTAMENTE desde el último carácter "
+    "que escribiste, sin repetir nada y sin agregar explicaciones ni bloques de código, hasta cerrar el JSON."
+)
+MAX_OVERLAP = 500  # chars checked when a continuation repeats the tail of the previous part
+MIN_OVERLAP = 20  # shorter matches are too likely to be legitimately repeated JSON
+
+
+class IncrementalJSONParser:
+    """
+    Incremental parser for a JSON object arriving in chunks. Every object that is an element of an array
+    nested only in objects is emitted as soon as its closing brace arrives, together with the keys leading
+    to that array, e.g. (("horarios",), {...}) for an extraction or (("P2", "precios"), {...}) for a packed
+    one. Objects in arrays inside a fact (e.g. horarios[i].excepciones[j]) are part of that fact, not facts.
+    Text before the first "{" (a stray code fence) is ignored.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.complete = False
+        self.facts: list[tuple[tuple[str, ...], dict]] = []
+        self.finish_reason = None  # set by stream_completion
+        self.continuations = 0
+        self.stopped = False
+        self._root = None  # (start, end) of the top-level object
+        self._pos = 0
+        self._stack = []  # [kind, key_in_parent, start, current_key]
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_string = None
+
+    def feed(self, chunk: str) -> list[tuple[tuple[str, ...], dict]]:
+        """Adds `chunk` and returns the facts it completed."""
+        self.text += chunk
+        emitted = []
+        text = self.text
+        for i in range(self._pos, len(text)):
+            char = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    self._last_string = text[self._string_start:i + 1]
+                continue
+            if self.complete:
+                continue
+            if not self._stack and char != "{":
+                continue
+            if char == '"':
+                self._in_string = True
+                self._string_start = i
+            elif char == ":" and self._stack and self._stack[-1][0] == "{":
+                self._stack[-1][3] = json.loads(self._last_string)
+            elif char in "{[":
+                parent = self._stack[-1] if self._stack else None
+                key = parent[3] if parent and parent[0] == "{" else None
+                self._stack.append([char, key, i, None])
+            elif char in "}]":
+                kind, _, start, _ = self._stack.pop()
+                if not self._stack:
+                    self.complete = True
+                    self._root = (start, i + 1)
+                elif kind == "{" and self._stack[-1][0] == "[" and all(entry[0] == "{" for entry in self._stack[:-1]):
+                    path = tuple(entry[1] for entry in self._stack if entry[1] is not None)
+                    try:
+                        fact = json.loads(text[start:i + 1])
+                    except json.JSONDecodeError:
+                        continue
+                    emitted.append((path, fact))
+        self._pos = len(text)
+        self.facts.extend(emitted)
+        return emitted
+
+    def document(self) -> str | None:
+        """The top-level JSON object once it has closed, without any surrounding text."""
+        return self.text[self._root[0]:self._root[1]] if self.complete else None
+
+    def partial(self) -> dict:
+        """The facts completed so far, nested by their key path; what is left of a response cut short."""
+        result = {}
+        for path, fact in self.facts:
+            node = result
+            for key in path[:-1]:
+                node = node.setdefault(key, {})
+            node.setdefault(path[-1] if path else "items", []).append(fact)
+        return result
+
+
+def stitch(text: str, continuation: str) -> str:
+    """Appends a continuation, dropping a leading code fence and any tail of `text` it repeats."""
+    if continuation.lstrip().startswith("```"):
+        continuation = continuation.lstrip().split("\n", 1)[1] if "\n" in continuation else ""
+    for size in range(min(len(text), len(continuation), MAX_OVERLAP), MIN_OVERLAP - 1, -1):
+        if text.endswith(continuation[:size]):
+            return continuation[size:]
+    return continuation
+
+
+def _stream_once(client: openai.OpenAI, request: dict, parser: IncrementalJSONParser,
+                 on_fact: Callable[[tuple[str, ...], dict], bool | None] | None) -> tuple[str | None, bool]:
+    """Streams one completion into `parser`; returns (finish_reason, stopped_by_callback)."""
+    finish_reason = None
+    first_part = True
+    stream = client.chat.completions.create(**request, stream=True, stream_options={"include_usage": True})
+    try:
+        for chunk in stream:
+            if getattr(chunk, "usage", None):
+                record_usage(request["model"], chunk.usage, request.get("prompt_cache_key"))
+            if not chunk.choices:
+                continue
+            choice = chunk.choices[0]
+            content = choice.delta.content if choice.delta else None
+            if content:
+                if first_part and parser.text:  # continuation: stitch onto what we already have
+                    content = stitch(parser.text, content)
+                first_part = False
+                for path, fact in parser.feed(content):
+                    if on_fact and on_fact(path, fact):
+                        return finish_reason, True
+            if choice.finish_reason:
+                finish_reason = choice.finish_reason
+    finally:
+        stream.close()
+    return finish_reason, False
+
+
+def stream_completion(
+        client: openai.OpenAI,
+        request: dict,
+        on_fact: Callable[[tuple[str, ...], dict], bool | None] | None = None,
+        max_continuations: int | None = None
+) -> IncrementalJSONParser:
+    """
+    Streams a chat completion, calling `on_fact(path, fact)` for each fact as soon as it is complete
+    (returning True from it stops the stream). A response cut off by the length limit is continued
+    with follow-up requests and stitched onto the same parser.
+    Returns the parser: `.text` is the full stitched output, `.complete` whether the JSON closed.
+    """
+    max_continuations = MAX_CONTINUATIONS if max_continuations is None else max_continuations
+    parser = IncrementalJSONParser()
+    start = time.perf_counter()
+    first_fact_at = None
+
+    def track(path, fact):
+        nonlocal first_fact_at
+        if first_fact_at is None:
+            first_fact_at = time.perf_counter() - start
+        return on_fact(path, fact) if on_fact else None
+
+    continuation_request = request
+    with span("llm", model=request["model"]) as attrs:
+        while True:
+            parser.finish_reason, parser.stopped = _stream_once(client, continuation_request, parser, track)
+            if parser.stopped or parser.finish_reason != "length" or parser.complete:
+                break
+            if parser.continuations >= max_continuations:
+                logging.warning(f"⚠️ Output still truncated after {parser.continuations} continuations")
+                break
+            parser.continuations += 1
+            logging.warning(f"⚠️ Output truncated, requesting continuation {parser.continuations}...")
+            # JSON mode would force a new complete object, so continuations ask for plain text
+            continuation_request = {k: v for k, v in request.items() if k != "response_format"}
+            continuation_request["messages"] = request["messages"] + [
+                {"role": "assistant", "content": parser.text},
+                {"role": "user", "content": CONTINUATION_PROMPT},
+            ]
+        attrs.update(facts=len(parser.facts), continuations=parser.continuations, finish_reason=parser.finish_reason)
+    if first_fact_at is not None:
+        observe("llm_first_fact_seconds", first_fact_at, model=request["model"])
+        logging.info(f"⏱️ First fact after {first_fact_at:.2f}s, {len(parser.facts)} facts in {time.perf_counter() - start:.2f}s")
+    return parser
@@ -0,0 +1,242 @@
+import json
+import logging
+import os
+import re
+import zlib
+from collections import Counter
+
+import numpy as np
+import openai
+
+from src.text import normalize_text
+from src.telemetry import record_usage, span
+
+TAXONOMY_ALIASES_PATH = os.getenv("TAXONOMY_ALIASES_PATH", "data/taxonomy_aliases.json")
+TAXONOMY_MATCH_THRESHOLD = float(os.getenv("TAXONOMY_MATCH_THRESHOLD", 0.65))  # cosine over hashed trigrams
+# Por debajo de esta similitud el alias más cercano solo cuenta si todas sus palabras están en el nombre
+TAXONOMY_CONFIDENT_MATCH = float(os.getenv("TAXONOMY_CONFIDENT_MATCH", 0.8))
+TAXONOMY_DIMENSIONS = 2048
+TAXONOMY_MODEL = "gpt-4o-mini"
+OTHER_DISCIPLINE = "otro"
+
+# id canónico -> (nombre canónico, alias con que lo nombran los estudios)
+CANONICAL_DISCIPLINES = {
+    "yoga": ("Yoga", ["clase de yoga", "yoga integral"]),
+    "yoga-vinyasa": ("Yoga Vinyasa", ["vinyasa", "vinyasa flow", "yoga flow", "flow yoga", "power yoga"]),
+    "yoga-hatha": ("Hatha Yoga", ["hatha", "yoga hatha"]),
+    "yoga-ashtanga": ("Ashtanga Yoga", ["ashtanga", "mysore", "yoga ashtanga"]),
+    "yoga-yin": ("Yin Yoga", ["yin", "yoga yin"]),
+    "yoga-restaurativo": ("Yoga Restaurativo", ["restaurativo", "restorative yoga"]),
+    "yoga-aereo": ("Yoga Aéreo", ["aerial yoga", "yoga aerial", "aeroyoga"]),
+    "yoga-caliente": ("Hot Yoga", ["yoga caliente", "bikram", "bikram yoga"]),
+    "yoga-prenatal": ("Yoga Prenatal", ["prenatal", "yoga para gestantes", "yoga gestantes"]),
+    "pilates": ("Pilates", ["clase de pilates"]),
+    "pilates-reformer": ("Pilates Reformer", ["reformer", "pilates maquina", "pilates maquinas", "pilates con maquinas",
+                                              "pilates en maquina", "reformer pilates"]),
+    "pilates-mat": ("Pilates Mat", ["mat pilates", "pilates suelo", "pilates en colchoneta"]),
+    "barre": ("Barre", ["barre fit", "barre pilates", "ballet fit"]),
+    "spinning": ("Spinning", ["cycling", "indoor cycling", "ciclismo indoor", "spin", "indoor cycle"]),
+    "funcional": ("Entrenamiento Funcional", ["funcional", "functional training", "entrenamiento funcional", "functional"]),
+    "hiit": ("HIIT", ["tabata", "entrenamiento de intervalos", "intervalos de alta intensidad"]),
+    "crossfit": ("CrossFit", ["cross training", "wod"]),
+    "trx": ("TRX", ["suspension", "entrenamiento en suspension"]),
+    "sculpt": ("Sculpt", ["body sculpt", "tonificacion", "toning"]),
+    "boxeo": ("Boxeo", ["box", "boxing", "kickboxing", "cardio box"]),
+    "baile": ("Baile", ["dance", "danza", "zumba", "dance fitness"]),
+    "stretching": ("Stretching", ["estiramiento", "estiramientos", "flexibilidad", "movilidad"]),
+    "meditacion": ("Meditación", ["mindfulness", "breathwork", "respiracion"]),
+    OTHER_DISCIPLINE: ("Otra actividad", ["clase", "clases", "masterclass", "evento", "taller", "clase de prueba"]),
+}
+
+TAXONOMY_PROMPT_TEMPLATE = """
+Eres un experto en fitness que clasifica nombres de clases y disciplinas de gimnasios de Lima en un catálogo común.
+
+**Catálogo (id: nombre):**
+{catalog}
+
+**Reglas:**
+1. Para cada nombre de la lista asigna el id del catálogo que corresponde a la misma disciplina ("Vinyasa Flow" -> "yoga-vinyasa", "Pilates Máquina" -> "pilates-reformer").
+2. Si es una disciplina real que no está en el catálogo, crea un id nuevo en minúsculas, sin tildes y con guiones (ej. "aqua-gym") y dale un nombre canónico en español.
+3. Si no es una disciplina (nombres genéricos como "Clase", eventos, talleres o productos), usa "{other}".
+
+**Nombres:**
+{names}
+
+**Tu Salida:**
+Un objeto JSON cuyas claves son los nombres exactamente como aparecen en la lista.
+```json
+{{"Vinyasa Flow": {{"id": "yoga-vinyasa", "nombre": "Yoga Vinyasa"}}, "Aqua Gym": {{"id": "aqua-gym", "nombre": "Aqua Gym"}}}}
+```
+"""
+
+# Campo con el nombre de la disciplina en cada categoría
+NAME_FIELDS = {"disciplinas": "nombre", "horarios": "nombre_clase"}
+
+
+def name_vector(text: str) -> np.ndarray:
+    """L2-normalized bag of words and character trigrams, hashed (crc32) into TAXONOMY_DIMENSIONS buckets."""
+    padded = f" {text} "
+    features = re.findall(r"\w+", text) + [padded[i:i + 3] for i in range(len(padded) - 2)]
+    buckets = [zlib.crc32(feature.encode("utf-8")) % TAXONOMY_DIMENSIONS for feature in features]
+    vector = np.bincount(buckets, minlength=TAXONOMY_DIMENSIONS).astype(np.float32)
+    return vector / (np.linalg.norm(vector) or 1.0)
+
+
+class DisciplineTaxonomy:
+    """
+    Canonical discipline catalog with an in-memory nearest-neighbour index over character-trigram vectors
+    of every known alias. Exact (normalized) aliases are a dict hit; anything else is the closest alias by
+    cosine similarity above TAXONOMY_MATCH_THRESHOLD, and below TAXONOMY_CONFIDENT_MATCH only if every word
+    of that alias is in the name. Names neither resolves go to the LLM in one call,
+    and its answers are saved as aliases so the next run matches them locally.
+    """
+
+    def __init__(self, path: str | None = TAXONOMY_ALIASES_PATH):
+        self.path = path
+        self.names = {discipline_id: name for discipline_id, (name, _) in CANONICAL_DISCIPLINES.items()}
+        self.aliases = {}  # alias normalizado -> id
+        for discipline_id, (name, aliases) in CANONICAL_DISCIPLINES.items():
+            for alias in [name, discipline_id.replace("-", " "), *aliases]:
+                self.aliases.setdefault(normalize_text(alias), discipline_id)
+        self.learned = {}
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                stored = json.load(f)
+            self.names.update(stored.get("disciplinas", {}))
+            self.learned = stored.get("aliases", {})
+            self.aliases.update(self.learned)
+        self._cache = {}
+        self.stats = Counter()
+        self._build_index()
+
+    def _build_index(self):
+        self._alias_list = list(self.aliases)
+        self._alias_ids = [self.aliases[alias] for alias in self._alias_list]
+        self._matrix = np.stack([name_vector(alias) for alias in self._alias_list])
+        self._cache.clear()
+
+    def match(self, name: str) -> tuple[str | None, float]:
+        """(id canónico, similitud) del alias más cercano; (None, similitud) por debajo del umbral."""
+        key = normalize_text(name)
+        if key in self._cache:
+            return self._cache[key]
+        if key in self.aliases:
+            result = (self.aliases[key], 1.0)
+        elif not key:
+            result = (None, 0.0)
+        else:
+            # Las horas o números en el nombre ("Reformer 7am") no identifican la disciplina
+            query = re.sub(r"[\d:]+\s*(?:am|pm|hrs?)?", " ", key).strip() or key
+            scores = self._matrix @ name_vector(query)
+            words = set(re.findall(r"\w+", query))
+            result = (None, float(scores.max()))
+            # El alias más parecido que cumple: "Yoga Mat" no es Pilates Mat aunque comparta trigramas, así que
+            # un parecido parcial exige todas las palabras del alias
+            candidates = np.flatnonzero(scores >= TAXONOMY_MATCH_THRESHOLD)
+            for best in candidates[np.argsort(-scores[candidates])]:
+                if scores[best] >= TAXONOMY_CONFIDENT_MATCH or set(self._alias_list[best].split()) <= words:
+                    result = (self._alias_ids[best], float(scores[best]))
+                    break
+        self._cache[key] = result
+        return result
+
+    def learn(self, aliases: dict[str, str], names: dict[str, str] | None = None):
+        """Adds alias -> id pairs (and new canonical names), persisting them to `path`."""
+        for discipline_id, name in (names or {}).items():
+            self.names.setdefault(discipline_id, name)
+        for alias, discipline_id in aliases.items():
+            key = normalize_text(alias)
+            if key and discipline_id in self.names:
+                self.aliases[key] = self.learned[key] = discipline_id
+        self._build_index()
+        self.save()
+
+    def save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        custom = {k: v for k, v in self.names.items() if k not in CANONICAL_DISCIPLINES}
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"disciplinas": custom, "aliases": self.learned}, f, ensure_ascii=False, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def classify_with_llm(self, client: openai.OpenAI, names: list[str]) -> dict[str, str]:
+        """One call for all the names the index could not resolve; the answers are learned as aliases."""
+        catalog = "\n".join(f"- {discipline_id}: {name}" for discipline_id, name in sorted(self.names.items()))
+        prompt = TAXONOMY_PROMPT_TEMPLATE.format(catalog=catalog, names=json.dumps(names, ensure_ascii=False),
+                                                 other=OTHER_DISCIPLINE)
+        try:
+            with span("llm", model=TAXONOMY_MODEL):
+                completion = client.chat.completions.create(
+                    model=TAXONOMY_MODEL,
+                    messages=[{"role": "user", "content": prompt}],
+                    temperature=0.0,
+                    response_format={"type": "json_object"},
+                )
+                record_usage(TAXONOMY_MODEL, completion.usage)
+            answer = json.loads(completion.choices[0].message.content or "{}")
+        except Exception as e:
+            logging.error(f"❌ Discipline classification failed: {e}")
+            return {}
+        aliases, new_names = {}, {}
+        for name in names:
+            item = answer.get(name)
+            if not isinstance(item, dict) or not item.get("id"):
+                continue
+            discipline_id = re.sub(r"[^a-z0-9]+", "-", normalize_text(str(item["id"]))).strip("-")
+            if not discipline_id:
+                continue
+            if discipline_id not in self.names:
+                new_names[discipline_id] = str(item.get("nombre") or name)
+            aliases[name] = discipline_id
+        if aliases:
+            self.learn(aliases, new_names)
+        logging.info(f"🏷️ LLM classified {len(aliases)}/{len(names)} discipline names ({len(new_names)} new disciplines)")
+        return aliases
+
+    def tag(self, extractions: list[dict], client: openai.OpenAI | None = None) -> list[dict]:
+        """
+        Sets `disciplina_id` on every discipline (by `nombre`) and class (by `nombre_clase`) of a list of
+        extraction dicts. Unmatched names are classified by the LLM when a client is given. Updates in place.
+        """
+        pending = []
+        for extraction in extractions:
+            for category, field in NAME_FIELDS.items():
+                for fact in (extraction or {}).get(category) or []:
+                    if not isinstance(fact, dict) or not str(fact.get(field) or "").strip():
+                        continue
+                    discipline_id, score = self.match(str(fact[field]))
+                    self.stats["exact" if score == 1.0 else "nearest" if discipline_id else "unmatched"] += 1
+                    fact["disciplina_id"] = discipline_id
+                    if discipline_id is None:
+                        pending.append((fact, str(fact[field]).strip()))
+        unmatched = list(dict.fromkeys(name for _, name in pending))
+        if unmatched and client is not None:
+            self.classify_with_llm(client, unmatched)
+            self.stats["llm_names"] += len(unmatched)
+            for fact, name in pending:
+                discipline_id, _ = self.match(name)
+                fact["disciplina_id"] = discipline_id
+                self.stats["llm"] += discipline_id is not None
+        return extractions
+
+    def report(self) -> dict[str, int]:
+        total = self.stats["exact"] + self.stats["nearest"] + self.stats["unmatched"]
+        return {**self.stats, "names": total, "learned_aliases": len(self.learned),
+                "local_match_rate": round((self.stats["exact"] + self.stats["nearest"]) / total, 3) if total else 1.0}
+
+
+_taxonomy = None
+
+
+def get_taxonomy() -> DisciplineTaxonomy:
+    global _taxonomy
+    if _taxonomy is None:
+        _taxonomy = DisciplineTaxonomy()
+    return _taxonomy
+
+
+def tag_disciplines(extractions: list[dict], client: openai.OpenAI | None = None) -> list[dict]:
+    """Tags disciplines and classes with canonical `disciplina_id`s using the shared taxonomy."""
+    return get_taxonomy().tag(extractions, client)
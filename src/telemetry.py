@@ -0,0 +1,349 @@
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from src.ledger import get_ledger
+
+TRACE_FILE = os.getenv("TRACE_FILE")  # trace-event JSON, opens in Perfetto or chrome://tracing
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))  # Prometheus text endpoint on 127.0.0.1, off by default
+PROFILE_STAGES = {s.strip() for s in os.getenv("PROFILE_STAGES", "").split(",") if s.strip()}  # stage names or "all"
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", 0.01))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "data/profiles")
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 900)
+# Atributos de span que pasan de un span a los anidados (el gym de un span "llm" dentro de un span "gym")
+INHERITED_ATTRS = ("gym", "url")
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Telemetry:
+    """
+    Spans, counters and latency histograms for a run. Spans nest per thread: a span's gym/url attributes
+    are inherited by the spans opened inside it, and each finished span is observed in the
+    `stage_duration_seconds{stage,gym}` histogram. Results go to a trace-event JSON file, a Prometheus
+    text endpoint and the run report; an optional sampling profiler aggregates stacks per stage.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.started = time.perf_counter()
+        self.started_wall = time.time()
+        self.counters = Counter()  # (name, labels) -> value
+        self.histograms = {}  # (name, labels) -> Histogram
+        self.gauges = {}  # (name, labels) -> last value
+        self.events = []
+        self.stage_seconds = defaultdict(list)
+        self.profiler = None
+        self.server = None
+
+    def _stack(self) -> list[dict]:
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def current(self) -> dict | None:
+        stack = self._stack()
+        return stack[-1] if stack else None
+
+    @contextmanager
+    def span(self, stage: str, **attrs):
+        stack = self._stack()
+        parent = stack[-1] if stack else {}
+        record = {"stage": stage, "attrs": {**{k: parent["attrs"][k] for k in INHERITED_ATTRS if k in parent.get("attrs", {})},
+                                            **{k: v for k, v in attrs.items() if v is not None}}}
+        stack.append(record)
+        if self.profiler:
+            self.profiler.track(stack)
+        start = time.perf_counter()
+        try:
+            yield record["attrs"]
+        except BaseException as e:
+            record["attrs"]["error"] = type(e).__name__
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            stack.pop()
+            if self.profiler:
+                self.profiler.track(stack)
+            gym = record["attrs"].get("gym", "")
+            self.observe("stage_duration_seconds", duration, stage=stage, gym=gym)
+            with self._lock:
+                self.stage_seconds[stage].append(duration)
+                self.events.append({"name": stage, "ph": "X", "ts": round((start - self.started) * 1e6),
+                                    "dur": round(duration * 1e6), "pid": os.getpid(), "tid": threading.get_ident(),
+                                    "args": record["attrs"]})
+
+    def count(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] += value
+
+    def gauge(self, name: str, value: float, **labels):
+        with self._lock:
+            self.gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+            self.histograms[key].observe(value)
+
+    def event(self, name: str, started: float, duration: float, pid: int | None = None, **args):
+        """Trace event for work timed elsewhere (e.g. a worker process); `started` is wall-clock time."""
+        with self._lock:
+            self.events.append({"name": name, "ph": "X", "ts": round((started - self.started_wall) * 1e6),
+                                "dur": round(duration * 1e6), "pid": pid or os.getpid(), "tid": pid or 0, "args": args})
+
+    def record_usage(self, model: str, usage, prompt: str | None = None, gym: str | None = None,
+                     stage: str | None = None) -> None:
+        """
+        Tokens in/out of one LLM response (`usage` object or dict), per model and on the open span.
+        Prompt tokens served from the provider's prompt cache are counted per model and per prompt
+        template (`prompt`, the request's prompt_cache_key), and the call's cached ratio is logged.
+        The call goes to the token ledger under `gym` and `stage`, by default the open span's gym and
+        the innermost enclosing stage that is not "llm".
+        """
+        if usage is None:
+            return
+        if not isinstance(usage, dict):
+            usage = usage.model_dump() if hasattr(usage, "model_dump") else vars(usage)
+        tokens_in, tokens_out = usage.get("prompt_tokens") or 0, usage.get("completion_tokens") or 0
+        cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+        self.count("llm_tokens_total", tokens_in, model=model, direction="in")
+        self.count("llm_tokens_total", tokens_out, model=model, direction="out")
+        self.count("llm_cached_tokens_total", cached, model=model, prompt=prompt or "")
+        self.count("llm_prompt_tokens_total", tokens_in, model=model, prompt=prompt or "")
+        self.count("llm_requests_total", model=model)
+        stack = self._stack()
+        if gym is None:
+            gym = stack[-1]["attrs"].get("gym") if stack else None
+        if stage is None:
+            stage = next((record["stage"] for record in reversed(stack) if record["stage"] != "llm"), None)
+        get_ledger().record(model, tokens_in, tokens_out, cached, gym=gym, stage=stage, prompt=prompt)
+        span = self.current()
+        if span is not None:
+            span["attrs"]["tokens_in"] = span["attrs"].get("tokens_in", 0) + tokens_in
+            span["attrs"]["tokens_out"] = span["attrs"].get("tokens_out", 0) + tokens_out
+            span["attrs"]["tokens_cached"] = span["attrs"].get("tokens_cached", 0) + cached
+        if tokens_in:
+            logging.info(f"🧊 {prompt or model}: {cached}/{tokens_in} prompt tokens cached ({cached / tokens_in:.0%})")
+
+    def report(self) -> dict:
+        """Per-stage latency (count, total, p50, p95), tokens per model, bytes fetched, browser vs LLM time."""
+        with self._lock:
+            stages = {}
+            for stage, durations in self.stage_seconds.items():
+                ordered = sorted(durations)
+                stages[stage] = {"count": len(ordered), "total_s": round(sum(ordered), 3),
+                                 "p50_s": round(ordered[len(ordered) // 2], 3),
+                                 "p95_s": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3)}
+            tokens = defaultdict(lambda: {"in": 0, "out": 0, "cached": 0})
+            prompt_cache = defaultdict(lambda: {"tokens_in": 0, "cached": 0})
+            fetched = Counter()
+            for (name, labels), value in self.counters.items():
+                labels = dict(labels)
+                if name == "llm_tokens_total":
+                    tokens[labels["model"]][labels["direction"]] += int(value)
+                elif name == "llm_cached_tokens_total":
+                    tokens[labels["model"]]["cached"] += int(value)
+                    prompt_cache[labels["prompt"] or "other"]["cached"] += int(value)
+                elif name == "llm_prompt_tokens_total":
+                    prompt_cache[labels["prompt"] or "other"]["tokens_in"] += int(value)
+                elif name == "bytes_fetched_total":
+                    fetched[labels.get("kind", "")] += int(value)
+        return {
+            "wall_s": round(time.perf_counter() - self.started, 3),
+            "browser_s": stages.get("browser", {}).get("total_s", 0.0),
+            "llm_s": stages.get("llm", {}).get("total_s", 0.0),
+            "stages": stages,
+            "tokens": dict(tokens),
+            "prompt_cache": {prompt: {**stats, "cached_ratio": round(stats["cached"] / stats["tokens_in"], 3) if stats["tokens_in"] else 0.0}
+                             for prompt, stats in sorted(prompt_cache.items())},
+            "bytes_fetched": dict(fetched),
+        }
+
+    def prometheus(self) -> str:
+        """Counters, gauges and histograms in the Prometheus text exposition format."""
+        def fmt(labels) -> str:
+            return "{" + ",".join(f'{k}="{str(v).replace(chr(34), "")}"' for k, v in labels) + "}" if labels else ""
+
+        lines = []
+        with self._lock:
+            for name in sorted({name for name, _ in self.counters}):
+                lines.append(f"# TYPE scraper_{name} counter")
+                lines += [f"scraper_{name}{fmt(labels)} {value}" for (n, labels), value in self.counters.items() if n == name]
+            for name in sorted({name for name, _ in self.gauges}):
+                lines.append(f"# TYPE scraper_{name} gauge")
+                lines += [f"scraper_{name}{fmt(labels)} {value}" for (n, labels), value in self.gauges.items() if n == name]
+            for name in sorted({name for name, _ in self.histograms}):
+                lines.append(f"# TYPE scraper_{name} histogram")
+                for (n, labels), hist in self.histograms.items():
+                    if n != name:
+                        continue
+                    cumulative = 0
+                    for bound, bucket_count in zip([*hist.buckets, "+Inf"], hist.counts):
+                        cumulative += bucket_count
+                        lines.append(f"scraper_{name}_bucket{fmt(labels + (('le', bound),))} {cumulative}")
+                    lines.append(f"scraper_{name}_sum{fmt(labels)} {hist.sum}")
+                    lines.append(f"scraper_{name}_count{fmt(labels)} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int) -> ThreadingHTTPServer:
+        telemetry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                body = telemetry.prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), MetricsHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        logging.info(f"📈 Prometheus metrics on http://127.0.0.1:{self.server.server_address[1]}/metrics")
+        return self.server
+
+    def write_trace(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._lock:
+            events = list(self.events)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms", "report": self.report()}, f,
+                      ensure_ascii=False, default=str)
+        logging.info(f"🧭 Trace with {len(events)} spans written to {path}")
+
+
+class StageProfiler:
+    """
+    Sampling profiler: a background thread snapshots the stack of every thread inside a profiled stage
+    every `interval` seconds and counts collapsed stacks per stage ("file:function;..." lines, the input
+    format of flamegraph.pl / speedscope). Samples are charged to the innermost profiled stage open in the thread.
+    """
+
+    def __init__(self, stages: set[str], interval: float = PROFILE_INTERVAL):
+        self.stages = stages
+        self.interval = interval
+        self.samples = defaultdict(Counter)  # stage -> collapsed stack -> samples
+        self._active = {}  # thread id -> stage
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def track(self, stack: list[dict]):
+        """Called with the thread's span stack whenever it changes."""
+        profiled = [s["stage"] for s in stack if "all" in self.stages or s["stage"] in self.stages]
+        if profiled:
+            self._active[threading.get_ident()] = profiled[-1]
+        else:
+            self._active.pop(threading.get_ident(), None)
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                stage = self._active.get(thread_id)
+                if stage is None or thread_id == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}")
+                    frame = frame.f_back
+                self.samples[stage][";".join(reversed(stack))] += 1
+
+    def stop(self, directory: str = PROFILE_DIR) -> dict[str, int]:
+        """Stops sampling and writes one `<stage>.folded` file per stage; returns samples per stage."""
+        self._stop.set()
+        self._thread.join()
+        os.makedirs(directory, exist_ok=True)
+        for stage, stacks in self.samples.items():
+            with open(os.path.join(directory, f"{stage}.folded"), "w", encoding="utf-8") as f:
+                f.writelines(f"{stack} {n}\n" for stack, n in stacks.most_common())
+        totals = {stage: sum(stacks.values()) for stage, stacks in self.samples.items()}
+        logging.info(f"🔬 Profiles written to {directory}: {totals}")
+        return totals
+
+
+_telemetry = Telemetry()
+
+
+def get_telemetry() -> Telemetry:
+    return _telemetry
+
+
+def span(stage: str, **attrs):
+    """`with span("llm", model=...):` times a stage of the run; gym/url are inherited from the enclosing span."""
+    return _telemetry.span(stage, **attrs)
+
+
+def count(name: str, value: float = 1, **labels):
+    _telemetry.count(name, value, **labels)
+
+
+def gauge(name: str, value: float, **labels):
+    _telemetry.gauge(name, value, **labels)
+
+
+def observe(name: str, value: float, **labels):
+    _telemetry.observe(name, value, **labels)
+
+
+def record_usage(model: str, usage, prompt: str | None = None, gym: str | None = None, stage: str | None = None) -> None:
+    _telemetry.record_usage(model, usage, prompt, gym, stage)
+
+
+def start_telemetry(metrics_port: int | None = None, profile_stages: set[str] | None = None) -> Telemetry:
+    """Fresh telemetry for a run: Prometheus endpoint if METRICS_PORT is set, profiler if PROFILE_STAGES is."""
+    global _telemetry
+    _telemetry = Telemetry()
+    port = METRICS_PORT if metrics_port is None else metrics_port
+    if port:
+        _telemetry.serve(port)
+    stages = PROFILE_STAGES if profile_stages is None else profile_stages
+    if stages:
+        _telemetry.profiler = StageProfiler(stages)
+    return _telemetry
+
+
+def finish_telemetry(trace_file: str | None = None) -> dict:
+    """Stops the profiler, writes the trace file (TRACE_FILE) and returns the run report."""
+    telemetry = _telemetry
+    if telemetry.profiler:
+        telemetry.profiler.stop()
+        telemetry.profiler = None
+    trace_file = trace_file or TRACE_FILE
+    if trace_file:
+        telemetry.write_trace(trace_file)
+    report = telemetry.report()
+    for stage, stats in sorted(report["stages"].items(), key=lambda item: -item[1]["total_s"]):
+        logging.info(f"⏱️ {stage}: {stats['count']} spans, {stats['total_s']:.1f}s total, "
+                     f"p50 {stats['p50_s']:.2f}s, p95 {stats['p95_s']:.2f}s")
+    logging.info(f"⏱️ browser {report['browser_s']:.1f}s vs LLM {report['llm_s']:.1f}s of {report['wall_s']:.1f}s wall; "
+                 f"tokens {report['tokens']}")
+    for prompt, stats in report["prompt_cache"].items():
+        logging.info(f"🧊 {prompt}: {stats['cached']:,}/{stats['tokens_in']:,} prompt tokens cached ({stats['cached_ratio']:.0%})")
+    return report
@@ -0,0 +1,9 @@
+import re
+import unicodedata
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase, strip accents and collapse whitespace."""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    return re.sub(r"\s+", " ", text).strip()
@@ -0,0 +1,128 @@
+import json
+import logging
+import os
+import sqlite3
+from collections import Counter, defaultdict
+from datetime import datetime
+
+import openai
+
+from src.llm import URL_CATEGORIES, categorize_locs
+from src.telemetry import count
+
+URL_CATEGORY_DB = os.getenv("URL_CATEGORY_DB", "data/url_categories.db")  # vacío recategoriza todo en cada corrida
+RECATEGORIZE_URLS = os.getenv("RECATEGORIZE_URLS", "").lower() in ("1", "true", "yes")  # tras cambiar el prompt
+
+URL_CATEGORY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS url_categories (
+    site TEXT NOT NULL,
+    loc TEXT NOT NULL,
+    categories TEXT NOT NULL,
+    lastmod TEXT,
+    categorized_at TEXT NOT NULL,
+    seen_at TEXT NOT NULL,
+    retired_at TEXT,
+    PRIMARY KEY (site, loc)
+);
+"""
+
+
+class UrlCategoryStore:
+    """
+    Categories of every sitemap URL, persisted per site. Each run only sends the LLM the URLs it has not
+    categorized yet; URLs that left the sitemap are retired (and revived if they come back). The LLM only
+    sees the URL, so a new `lastmod` is recorded without recategorizing. `full=True` (RECATEGORIZE_URLS)
+    recategorizes the whole site, for after a prompt change.
+    """
+
+    def __init__(self, path: str = URL_CATEGORY_DB):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript(URL_CATEGORY_SCHEMA)
+        self.stats = Counter()
+
+    def categorize(self, site: str, urls: list[dict], client: openai.OpenAI, full: bool = RECATEGORIZE_URLS) -> dict[str, list[dict]]:
+        """Same result as categorize_urls_with_llm, calling the LLM only for the URLs without stored categories."""
+        now = datetime.now().isoformat(timespec="seconds")
+        urls = list({url["loc"]: url for url in urls}.values())
+        stored, active = {}, set()
+        for loc, categories, retired_at in self.conn.execute(
+                "SELECT loc, categories, retired_at FROM url_categories WHERE site = ?", (site,)):
+            stored[loc] = json.loads(categories)
+            if retired_at is None:
+                active.add(loc)
+        pending = {url["loc"] for url in urls if full or url["loc"] not in stored}
+        categorized = {}
+        if pending:
+            try:
+                categorized = {loc: categories for loc, categories in categorize_locs([url["loc"] for url in urls if url["loc"] in pending], client).items()
+                               if loc in pending}  # sin URLs inventadas por el modelo
+            except Exception as e:
+                logging.error(f"❌ An error occurred while calling OpenAI: {e}")
+            self.stats["llm_calls"] += 1
+
+        # Sin URLs el sitemap probablemente falló: no se retira nada
+        retired = active - {url["loc"] for url in urls} if urls else set()
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO url_categories (site, loc, categories, lastmod, categorized_at, seen_at) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (site, loc) DO UPDATE SET categories = excluded.categories, lastmod = excluded.lastmod, "
+                "categorized_at = excluded.categorized_at, seen_at = excluded.seen_at, retired_at = NULL",
+                [(site, url["loc"], json.dumps(categorized[url["loc"]]), url.get("lastmod"), now, now)
+                 for url in urls if url["loc"] in categorized])
+            self.conn.executemany(
+                "UPDATE url_categories SET lastmod = ?, seen_at = ?, retired_at = NULL WHERE site = ? AND loc = ?",
+                [(url.get("lastmod"), now, site, url["loc"]) for url in urls if url["loc"] not in categorized and url["loc"] in stored])
+            self.conn.executemany("UPDATE url_categories SET retired_at = ? WHERE site = ? AND loc = ?",
+                                  [(now, site, loc) for loc in retired])
+
+        result = defaultdict(list)
+        reused = 0
+        for url in urls:
+            if url["loc"] in categorized:
+                categories = categorized[url["loc"]]
+            elif url["loc"] in stored:
+                categories, reused = stored[url["loc"]], reused + 1
+            else:
+                continue  # la llamada falló: se reintenta en la próxima corrida
+            for category in categories:
+                result[category].append(url)
+        for category in URL_CATEGORIES:
+            result.setdefault(category, [])
+
+        self.stats["reused"] += reused
+        self.stats["categorized"] += len(categorized)
+        self.stats["retired"] += len(retired)
+        count("url_categorizations_total", reused, source="stored")
+        count("url_categorizations_total", len(categorized), source="llm")
+        logging.info(f"🗂️ {site}: {reused} URL categories reused, {len(categorized)} categorized by the LLM, {len(retired)} retired")
+        return dict(result)
+
+    def report(self) -> dict[str, int]:
+        return dict(self.stats)
+
+    def close(self):
+        self.conn.close()
+
+
+_store = None
+
+
+def get_category_store() -> UrlCategoryStore | None:
+    """Process-wide store, opened on first use; None when URL_CATEGORY_DB is empty."""
+    global _store
+    if _store is None and URL_CATEGORY_DB:
+        _store = UrlCategoryStore()
+    return _store
+
+
+def close_category_store() -> dict[str, int] | None:
+    """Closes the store and returns its report (None if it was never opened)."""
+    global _store
+    if _store is None:
+        return None
+    report = _store.report()
+    _store.close()
+    _store = None
+    return report
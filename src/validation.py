@@ -0,0 +1,85 @@
+import re
+import unicodedata
+from typing import Any
+
+from src.normalize import FECHA_PATTERN, HORA_PATTERN
+
+SCHEDULE_HINT_MIN = 4  # this many times in a page suggests a class schedule
+TIME_PATTERN = re.compile(r"\b\d{1,2}[:.h]\d{2}\s*(?:am|pm|hrs?)?\b|\b\d{1,2}\s*(?:am|pm)\b", re.IGNORECASE)
+PRICE_PATTERN = re.compile(r"(?:S/|US\$|\$)\s?\d", re.IGNORECASE)
+DIAS_SEMANA = {"lunes", "martes", "miercoles", "jueves", "viernes", "sabado", "domingo"}
+
+
+def looks_like_schedule(html_content: str) -> bool:
+    """Local stand-in for the old SI/NO schedule classifier call: many times on a page usually mean a class timetable."""
+    return len(TIME_PATTERN.findall(html_content)) >= SCHEDULE_HINT_MIN
+
+
+def _blank(value: Any) -> bool:
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def _strip_accents(text: str) -> str:
+    return "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+
+
+def _valid_hora(value: Any) -> bool:
+    """Any notation src.normalize can turn into a real 24h time ("7pm", "19:00", "7.30 p.m.")."""
+    match = HORA_PATTERN.match(str(value))
+    if not match:
+        return False
+    hour, minute = int(match["hour"]), int(match["minute"] or 0)
+    max_hour = 12 if match["ampm"] else 23
+    return hour <= max_hour and minute <= 59
+
+
+def fact_problems(category: str, fact: dict) -> list[str]:
+    """Field-level checks for one fact of `category`; usable on facts as they stream in."""
+    problems = []
+    if category == "horarios":
+        if _blank(fact.get("nombre_clase")):
+            problems.append("horarios.nombre_clase: empty")
+        if _blank(fact.get("hora_inicio")) or not _valid_hora(fact["hora_inicio"]):
+            problems.append(f"horarios.hora_inicio: {fact.get('hora_inicio')!r} is not a time")
+        if not _blank(fact.get("hora_fin")) and not _valid_hora(fact["hora_fin"]):
+            problems.append(f"horarios.hora_fin: {fact.get('hora_fin')!r} is not a time")
+        if not _blank(fact.get("fecha")) and not FECHA_PATTERN.match(str(fact["fecha"])):
+            problems.append(f"horarios.fecha: {fact.get('fecha')!r} is not a date")
+        dia = fact.get("dia_semana")
+        if not _blank(dia) and _strip_accents(str(dia)).strip().lower() not in DIAS_SEMANA:
+            problems.append(f"horarios.dia_semana: {dia!r} is not a weekday")
+        if _blank(dia) and _blank(fact.get("fecha")):
+            problems.append("horarios.dia_semana: neither dia_semana nor fecha")
+    elif category == "precios":
+        valor = fact.get("valor")
+        if isinstance(valor, bool) or not (isinstance(valor, (int, float)) or re.search(r"\d", str(valor or ""))):
+            problems.append(f"precios.valor: {valor!r} is not a price")
+        if _blank(fact.get("descripcion_plan")):
+            problems.append("precios.descripcion_plan: empty")
+    elif category == "ubicaciones":
+        if _blank(fact.get("direccion_completa")):
+            problems.append("ubicaciones.direccion_completa: empty")
+    elif category == "disciplinas":
+        if _blank(fact.get("nombre")):
+            problems.append("disciplinas.nombre: empty")
+    return problems
+
+
+def extraction_problems(extracted: dict[str, list[dict]] | None, html_content: str) -> list[str]:
+    """
+    Strict checks on one page's extraction: field-level schema problems, plus signs that the page
+    holds data the model left out (many class times but no horarios, prices but no precios).
+    An empty list means the extraction is accepted.
+    """
+    if extracted is None:
+        return ["page: missing from the answer"]
+    problems = []
+    for category, facts in extracted.items():
+        for fact in facts:
+            problems.extend(fact_problems(category, fact))
+    opening_hours = any(not _blank(fact.get("horario_atencion")) for fact in extracted.get("ubicaciones", []))
+    if not extracted.get("horarios") and not opening_hours and looks_like_schedule(html_content):
+        problems.append("horarios: page has class times but none were extracted")
+    if not extracted.get("precios") and PRICE_PATTERN.search(html_content):
+        problems.append("precios: page has prices but none were extracted")
+    return problems
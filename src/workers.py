@@ -0,0 +1,138 @@
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Callable, Iterable
+
+from src.telemetry import count, get_telemetry, observe
+
+# Procesos para el trabajo de CPU (poda con BeautifulSoup, tiktoken); 0 lo ejecuta en el hilo principal
+WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", max((os.cpu_count() or 2) - 1, 1)))
+
+
+def _timed_call(fn: Callable, args: tuple) -> tuple[Any, float, float, int]:
+    """Runs in the worker: (result, wall-clock start, duration, pid)."""
+    started = time.time()
+    result = fn(*args)
+    return result, started, time.time() - started, os.getpid()
+
+
+class CpuPool:
+    """
+    Process pool for the CPU-bound steps between browser and network waits. `submit` returns a Future
+    right away, so the main loop keeps driving the browser and the LLM while workers parse HTML;
+    `result`/`map` are where it blocks. Each task records queue wait, busy time and a trace event on the
+    worker's pid, and `report()` gives utilization and how much of that work overlapped the main loop.
+    With no processes every task runs inline and the API stays the same.
+    """
+
+    def __init__(self, processes: int = WORKER_PROCESSES):
+        self.processes = processes
+        self._executor = None
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.tasks = 0
+        self.busy_s = 0.0
+        self.wait_s = 0.0  # tiempo del hilo principal bloqueado esperando resultados
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: el proceso principal tiene hilos (telemetría, httpx) que un fork copiaría a medias
+            self._executor = ProcessPoolExecutor(self.processes, mp_context=multiprocessing.get_context("spawn"))
+            logging.info(f"🧵 Started {self.processes} worker processes")
+        return self._executor
+
+    def _record(self, task: str, submitted: float, started: float, duration: float, pid: int):
+        with self._lock:
+            self.tasks += 1
+            self.busy_s += duration
+        count("worker_tasks_total", task=task)
+        count("worker_busy_seconds_total", duration, task=task)
+        observe("worker_queue_seconds", max(started - submitted, 0.0), task=task)
+        get_telemetry().event(f"worker:{task}", started, duration, pid=pid)
+
+    def submit(self, fn: Callable, *args) -> Future:
+        task, submitted = fn.__name__, time.time()
+        if not self.processes:
+            future = Future()
+            try:
+                result, started, duration, pid = _timed_call(fn, args)
+                self._record(task, submitted, started, duration, pid)
+                future.set_result(result)
+            except Exception as e:
+                future.set_exception(e)
+            return future
+
+        outer = Future()
+
+        def unwrap(inner: Future):
+            try:
+                result, started, duration, pid = inner.result()
+            except Exception as e:
+                count("worker_errors_total", task=task)
+                outer.set_exception(e)
+                return
+            self._record(task, submitted, started, duration, pid)
+            outer.set_result(result)
+
+        self._get_executor().submit(_timed_call, fn, args).add_done_callback(unwrap)
+        return outer
+
+    def result(self, future: Future) -> Any:
+        """future.result(), counting the time the caller spends blocked on it."""
+        start = time.perf_counter()
+        try:
+            return future.result()
+        finally:
+            waited = time.perf_counter() - start
+            with self._lock:
+                self.wait_s += waited
+            count("worker_wait_seconds_total", waited)
+
+    def map(self, fn: Callable, iterable: Iterable) -> list:
+        """Like map(fn, iterable) spread over the workers; blocks until all results are in, in order."""
+        futures = [self.submit(fn, item) for item in iterable]
+        return [self.result(future) for future in futures]
+
+    def report(self) -> dict[str, float]:
+        wall = time.time() - self.started
+        capacity = wall * max(self.processes, 1)
+        return {
+            "processes": self.processes,
+            "tasks": self.tasks,
+            "busy_s": round(self.busy_s, 2),
+            "wait_s": round(self.wait_s, 2),
+            "utilization": round(self.busy_s / capacity, 3) if capacity else 0.0,
+            # segundos de CPU de los workers que no costaron espera al hilo principal (solapados o en paralelo)
+            "overlapped_s": round(max(self.busy_s - self.wait_s, 0.0), 2) if self.processes else 0.0,
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+
+_pool = None
+
+
+def get_pool() -> CpuPool:
+    global _pool
+    if _pool is None:
+        _pool = CpuPool()
+    return _pool
+
+
+def shutdown_pool() -> dict[str, float] | None:
+    """Stops the shared pool and returns its report (None if it was never used)."""
+    global _pool
+    if _pool is None:
+        return None
+    report = _pool.report()
+    _pool.shutdown()
+    _pool = None
+    logging.info(f"🧵 Workers: {report['tasks']} tasks, {report['busy_s']:.1f}s busy over {report['processes']} processes "
+                 f"({report['utilization']:.0%} utilization), {report['overlapped_s']:.1f}s overlapped with the main loop")
+    return report